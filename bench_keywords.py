@@ -0,0 +1,117 @@
+# Microbenchmark: compiled KeywordEngine vs. one-at-a-time `in` scans
+# Usage: python bench_keywords.py [corpus.jsonl] [iterations] [rounds]
+#
+# corpus.jsonl may hold frames recorded by the bot with GATEWAY_RECORD_FILE
+# set ({"at": ..., "frame": "<json text>"}), raw gateway frames
+# ({"t": ..., "d": {...}}) or bare message payloads ({"content": ..., "embeds": [...]}),
+# one per line; only messages are kept. Without a corpus file a small,
+# hand-written set of Dank Memer style embeds is used: it checks that both
+# scans agree, but its timings say little about real traffic, so quote
+# speedups from a recording. Each side is timed over several interleaved
+# rounds and the fastest round counts, since single runs vary by +-50%.
+
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("DISCORD_TOKEN", "bench")
+os.environ.setdefault("DISCORD_CHANNEL_ID", "0")
+
+from main2 import MessageView, FULL_TEXT_ENGINE, SHORT_TEXT_ENGINE
+
+BUILTIN_CORPUS = [
+    {"content": "", "embeds": [{"title": "Space Adventure", "description": "Choose items you want to bring along! Recommended items are highlighted."}]},
+    {"content": "", "embeds": [{"title": "Space Adventure", "description": "You came across an alien who wants to probe you. What do you do?"}]},
+    {"content": "", "embeds": [{"title": "Space Adventure", "description": "You landed on a blob-like planet. The elusive blob wobbles. Grab one?"}]},
+    {"content": "", "embeds": [{"title": "Space Adventure", "description": "Nothing interesting happened. You passed a star and kept drifting."}]},
+    {"content": "", "embeds": [{"title": "Space Adventure", "description": "You found a broken telescope floating in deep space. Try and fix it?"}]},
+    {"content": "", "embeds": [{"title": "Space Adventure", "description": "An angry alien in the kitchen is cooking some shady stuff."}]},
+    {"content": "", "embeds": [{"title": "Adventure Summary", "description": "Your adventure is over! You can adventure again in 4 minutes.",
+                                "fields": [{"name": "Rewards", "value": "⏣ 12,450 coins, 1x Alien Sample"}, {"name": "Lost", "value": "nothing"}]}]},
+    {"content": "", "embeds": [{"title": "Hold on there!", "description": "You can try again in 3 minutes 12 seconds. Cooldown is 5 minutes."}]},
+    {"content": "", "embeds": [{"title": "Karen is starting a fight!", "description": "Type `frick off karen` to defeat her. Health: 100"}]},
+    {"content": "", "embeds": [{"title": "Trivia Night", "description": "Let's see how big your knowledge is! Guess the price between $1 and $1,000,000"}]},
+    {"content": "Someone posted an idea on reddit, try their game!", "embeds": []},
+    {"content": "lol this meme is so bad, anyway what are you all doing tonight", "embeds": []},
+]
+
+LEGACY_FULL = FULL_TEXT_ENGINE.categories
+LEGACY_SHORT = SHORT_TEXT_ENGINE.categories
+
+
+def load_corpus(path):
+    corpus = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "frame" in record:  # GATEWAY_RECORD_FILE line
+                record = json.loads(record["frame"]) if isinstance(record["frame"], str) else record["frame"]
+            if "d" in record and isinstance(record["d"], dict):
+                record = record["d"]
+            if "content" in record or "embeds" in record:
+                corpus.append(record)
+    return corpus
+
+
+def legacy_scan(text, categories):
+    """What every classifier used to do: one `in` check per indicator"""
+    hits = {}
+    for name, indicators in categories.items():
+        matched = [indicator for indicator in indicators if indicator in text]
+        if matched:
+            hits[name] = matched
+    return hits
+
+
+def timed(func, texts, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for full_text, short_text in texts:
+            func(full_text, short_text)
+    return time.perf_counter() - start
+
+
+def bench(scans, texts, iterations, rounds):
+    """Best µs/message of each scan over `rounds` interleaved rounds"""
+    best = {label: float("inf") for label in scans}
+    for _ in range(rounds):
+        for label, func in scans.items():
+            best[label] = min(best[label], timed(func, texts, iterations))
+    per_message = {}
+    for label, elapsed in best.items():
+        per_message[label] = elapsed / (iterations * len(texts)) * 1e6
+        print(f"{label:<10} {per_message[label]:8.2f} µs/message  (best of {rounds}: {elapsed:.3f}s)")
+    return per_message
+
+
+def main():
+    corpus = load_corpus(sys.argv[1]) if len(sys.argv) > 1 else BUILTIN_CORPUS
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 7
+    texts = []
+    for record in corpus:
+        view = MessageView(record)
+        texts.append((view.full_text, view.short_text))
+
+    mismatches = 0
+    for full_text, short_text in texts:
+        if (FULL_TEXT_ENGINE.scan(full_text).as_dict() != legacy_scan(full_text, LEGACY_FULL) or
+                SHORT_TEXT_ENGINE.scan(short_text).as_dict() != legacy_scan(short_text, LEGACY_SHORT)):
+            mismatches += 1
+
+    source = sys.argv[1] if len(sys.argv) > 1 else "built-in synthetic corpus"
+    print(f"📚 {len(texts)} messages from {source} x {iterations} iterations, {mismatches} mismatches")
+    per_message = bench({
+        "legacy": lambda f, s: (legacy_scan(f, LEGACY_FULL), legacy_scan(s, LEGACY_SHORT)),
+        "engine": lambda f, s: (FULL_TEXT_ENGINE.scan(f), SHORT_TEXT_ENGINE.scan(s)),
+    }, texts, iterations, rounds)
+    print(f"⚡ speedup: {per_message['legacy'] / per_message['engine']:.2f}x")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
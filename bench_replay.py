@@ -0,0 +1,543 @@
+# Gateway replay benchmark: feed recorded frames through on_message offline
+# Usage: python bench_replay.py [frames.jsonl] [--speed N] [--compress]
+#                               [--rest-latency MS] [--json report.json] [--compare baseline.json]
+#
+# frames.jsonl holds one gateway message per line, either as recorded by the
+# bot with GATEWAY_RECORD_FILE set ({"at": epoch seconds, "frame": "<json text>"})
+# or as a bare frame object ({"t": ..., "s": ..., "op": ..., "d": {...}}).
+# Set DISCORD_CHANNEL_ID to the channel the frames were recorded in. Without a
+# file a built-in session of adventures mixed with unrelated guild traffic is used.
+#
+# --speed 0 (default) replays at full speed. Click delays are skipped and every
+# Dank Memer message in our channel waits until the previous one has been
+# handled and its click has gone out, as it had in the recording. --speed 1
+# keeps the recorded pacing, --speed 10 runs it ten times faster.
+# REST calls (clicks, sends, fresh-message fetches, deletes, webhooks) are
+# answered in process by StubDiscord and never reach the network. Choice
+# memory starts empty, so two runs of the same file make the same decisions
+# unless the classifiers or the selection changed.
+#
+# Exits 1 if a click went to a button the handled message didn't offer, or if
+# a click that loses its session mid-request doesn't finish exactly once after
+# the next READY, or if parse_reward misreads one of REWARD_CASES.
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+os.environ.setdefault("DISCORD_TOKEN", "bench")
+os.environ.setdefault("DISCORD_CHANNEL_ID", "0")
+os.environ.pop("GATEWAY_RECORD_FILE", None)  # Never re-record the replay
+
+import main2
+
+OP_NAMES = {1: "HEARTBEAT", 7: "RECONNECT", 9: "INVALID_SESSION", 10: "HELLO", 11: "HEARTBEAT_ACK"}
+SETTLE_TIMEOUT = 5.0  # Longest wait for a message's click before moving on (seconds)
+OUR_USER_ID = "100000000000000001"
+
+
+class StubDiscord(BaseAdapter):
+    """Answers the bot's Discord REST calls in process, like discord.com would on a good day"""
+
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self.recent = deque(maxlen=10)  # Dank Memer messages replayed so far, newest first (try_fresh_click)
+        self.ids = itertools.count(900000000000000000)
+
+    def send(self, request, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        route = main2.RateLimiter.route_key(request.method, request.url)
+        self.calls[route] += 1
+        path = urlsplit(request.url).path
+        if request.method == "GET" and path.endswith("/messages"):
+            return self.respond(request, 200, list(self.recent))
+        if request.method == "POST" and path.endswith("/messages"):
+            content = json.loads(request.body or b"{}").get("content", "")
+            return self.respond(request, 200, {"id": str(next(self.ids)), "content": content})
+        return self.respond(request, 204)  # Interactions, deletes, bulk-delete, webhooks
+
+    def respond(self, request, status, body=None):
+        response = Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode() if body is not None else b""
+        response.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class FakeSocket:
+    """What on_message gets as `ws`: keeps what the bot sends back (heartbeats, IDENTIFY)"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def close(self, status=1000, **kwargs):
+        self.closed.append(status)
+
+
+def encode(frame):
+    """Serialise a frame the way Discord does: compact, "t" and "s" first"""
+    return json.dumps(frame, separators=(",", ":"), ensure_ascii=False)
+
+
+def frame_time(frame):
+    timestamp = (frame.get("d") or {}).get("edited_timestamp") or (frame.get("d") or {}).get("timestamp")
+    if isinstance(timestamp, str):
+        try:
+            return datetime.fromisoformat(timestamp).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def load_frames(path):
+    """(recorded at or None, frame text) per line"""
+    frames = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "frame" in record:
+                frame = record["frame"]
+                frames.append((record.get("at"), frame if isinstance(frame, str) else encode(frame)))
+            else:
+                frames.append((frame_time(record), encode(record)))
+    return frames
+
+
+def builtin_frames(rounds=40, noise=12, seed=7):
+    """A session of `rounds` adventures with `noise` unrelated guild events around each message"""
+    rng = random.Random(seed)
+    channel, guild, dank = str(main2.CHANNEL_ID), main2.GUILD_ID, main2.DANK_MEMER_ID
+    seq = itertools.count(1)
+    ids = itertools.count(1300000000000000000)
+    at = [1760000000.0]
+    frames = []
+
+    def add(frame, gap):
+        at[0] += gap
+        frames.append((round(at[0], 3), encode(frame)))
+
+    def dispatch(event, data, gap):
+        add({"t": event, "s": next(seq), "op": 0, "d": data}, gap)
+
+    def edit(data, gap):
+        """MESSAGE_UPDATE stamped with its own edit time, like every real edit"""
+        data["edited_timestamp"] = datetime.fromtimestamp(at[0] + gap, timezone.utc).isoformat()
+        dispatch("MESSAGE_UPDATE", data, gap)
+
+    def button(label, custom_id, style=2, disabled=False, emoji=None):
+        data = {"type": 2, "style": style, "label": label, "custom_id": custom_id, "disabled": disabled}
+        if emoji:
+            data["emoji"] = emoji
+        return data
+
+    def dank_message(message_id, title, description, buttons, fields=()):
+        embed = {"type": "rich", "title": title, "description": description, "color": 2829617}
+        if fields:
+            embed["fields"] = [{"name": name, "value": value, "inline": True} for name, value in fields]
+        return {"id": message_id, "channel_id": channel, "guild_id": guild, "type": 20,
+                "author": {"id": dank, "username": "Dank Memer", "bot": True},
+                "content": "", "embeds": [embed], "components": [{"type": 1, "components": buttons}] if buttons else [],
+                "timestamp": "2025-10-09T08:53:20.000000+00:00", "edited_timestamp": None}
+
+    def chatter():
+        for _ in range(rng.randint(noise // 2, noise * 3 // 2)):
+            user = str(rng.randint(10**17, 10**18))
+            kind = rng.random()
+            if kind < 0.3:
+                dispatch("PRESENCE_UPDATE", {"user": {"id": user}, "guild_id": guild, "status": "online",
+                                             "activities": [{"name": "Custom Status", "type": 4, "state": "grinding"}],
+                                             "client_status": {"desktop": "online"}}, rng.uniform(0.05, 2))
+            elif kind < 0.5:
+                dispatch("TYPING_START", {"channel_id": str(rng.randint(10**17, 10**18)), "guild_id": guild,
+                                          "user_id": user, "timestamp": int(at[0])}, rng.uniform(0.05, 2))
+            elif kind < 0.75:
+                dispatch("MESSAGE_CREATE", {"id": str(next(ids)), "channel_id": str(rng.randint(10**17, 10**18)),
+                                            "guild_id": guild, "author": {"id": user, "username": "someone"},
+                                            "content": rng.choice(["pls beg", "pls fish", "lol", "gm", "anyone up for raids?"]),
+                                            "embeds": [], "components": []}, rng.uniform(0.05, 2))
+            elif kind < 0.9:
+                dispatch("MESSAGE_CREATE", dank_message(str(next(ids)), "Fishing", "You cast out your line and brought back 2 Common Fish!",
+                                                        [button("Fish Again", "fish-again:" + user)]) | {"channel_id": str(rng.randint(10**17, 10**18))},
+                         rng.uniform(0.05, 2))
+            else:
+                dispatch("MESSAGE_REACTION_ADD", {"user_id": user, "channel_id": str(rng.randint(10**17, 10**18)),
+                                                  "message_id": str(next(ids)), "guild_id": guild,
+                                                  "emoji": {"id": None, "name": "😂"}}, rng.uniform(0.05, 2))
+        if rng.random() < 0.3:
+            add({"t": None, "s": None, "op": 11, "d": None}, 0.01)
+
+    add({"t": None, "s": None, "op": 10, "d": {"heartbeat_interval": 41250}}, 0)
+    dispatch("READY", {"v": 9, "session_id": "replay-session", "resume_gateway_url": "wss://gateway-replay.discord.gg",
+                       "user": {"id": OUR_USER_ID, "username": "farmer"}, "guilds": [{"id": guild, "unavailable": True}]}, 0.2)
+
+    scenarios = [
+        ("You came across an alien who wants to probe you. What do you do?", ["Talk", "Attack", "Run"]),
+        ("You landed on a blob-like planet. The elusive blob wobbles at you.", ["Grab one", "Leave"]),
+        ("You found a broken telescope floating in deep space. Try and fix it?", ["Try", "Ignore"]),
+        ("An angry alien in the kitchen is cooking some shady stuff.", ["Eat", "Run"]),
+        ("Nothing interesting happened. You passed a star and kept drifting.", []),
+    ]
+    for _ in range(rounds):
+        chatter()
+        dispatch("MESSAGE_CREATE", {"id": str(next(ids)), "channel_id": channel, "guild_id": guild,
+                                    "author": {"id": OUR_USER_ID, "username": "farmer"}, "content": "pls adv",
+                                    "embeds": [], "components": []}, rng.uniform(4, 8))
+        message_id = str(next(ids))
+        backpack = button("", "adventure-backpackitem:" + message_id, style=4, emoji={"name": "🎒"})
+        dispatch("MESSAGE_CREATE", dank_message(message_id, "Space Adventure",
+                                                "Choose items you want to bring along! Recommended items are highlighted.",
+                                                [button("Start", "adventure-start:" + message_id, style=3), backpack]), 0.4)
+        for step, (description, labels) in enumerate(rng.sample(scenarios, 4)):
+            chatter()
+            buttons = [button(label, f"adventure-choice:{message_id}:{step}:{i}") for i, label in enumerate(labels)]
+            if not buttons:
+                buttons = [button("", f"adventure-next:{message_id}:{step}", style=1,
+                                  emoji={"id": "1379166099895091251", "name": "ArrowRightui", "animated": True})]
+            edit(dank_message(message_id, "Space Adventure", description, buttons + [backpack]), rng.uniform(4, 9))
+        chatter()
+        data = dank_message(message_id, "Adventure Summary", "Your adventure is over! You can adventure again in 4 minutes.",
+                            [button("Adventure again in 4 minutes", "adventure-again", disabled=True)],
+                            fields=[("Rewards", f"⏣ {rng.randint(2, 40) * 1000:,} coins, 1x Alien Sample"), ("Lost", "nothing")])
+        edit(data, rng.uniform(4, 9))
+        at[0] += 240
+    return frames
+
+
+def event_type(text):
+    """Label for a frame in the latency table"""
+    frame = json.loads(text)
+    if frame.get("op") == 0:
+        return frame.get("t") or "DISPATCH", frame
+    return OP_NAMES.get(frame.get("op"), f"OP_{frame.get('op')}"), frame
+
+
+def ours(frame):
+    """A message in our channel that the bot acts on: Dank Memer's, or a command we sent"""
+    data = frame.get("d") or {}
+    if frame.get("t") not in main2.MESSAGE_EVENTS or str(data.get("channel_id")) != str(main2.CHANNEL_ID):
+        return None
+    if str((data.get("author") or {}).get("id")) == main2.DANK_MEMER_ID:
+        return "dank"
+    if frame.get("t") == "MESSAGE_CREATE" and data.get("content") in main2.INTERACTIVE_COMMANDS:
+        return "command"
+    return None
+
+
+def raw_custom_ids(msg_data):
+    """Button custom_ids straight from the payload, independent of main2's parsing and memo"""
+    ids = set()
+    for row in msg_data.get("components") or []:
+        for comp in row.get("components", []) if row.get("type") == 1 else [row]:
+            if comp.get("type") == 2 and comp.get("custom_id"):
+                ids.add(comp["custom_id"])
+    return frozenset(ids)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Replay:
+    """Drives main2 with recorded frames and keeps per-event timings and every decision"""
+
+    def __init__(self, frames, speed=0.0, compress=False, rest_latency=0.0):
+        self.frames = frames
+        self.speed = speed
+        self.compress = compress
+        self.stub = StubDiscord(rest_latency)
+        self.ws = FakeSocket()
+        self.reader = defaultdict(list)      # event type -> on_message seconds
+        self.handled = defaultdict(list)     # event type -> received -> handled seconds
+        self.in_flight = {}                  # received_at -> (event type, frame index) of dispatched messages
+        self.decisions = []
+        self.current = None                  # Index of the frame being fed to on_message
+        self.handling = None                 # Index of the frame handle_message is working on
+        self.offered = frozenset()           # custom_ids in that frame's raw components
+        self.stale_clicks = []               # Clicks on a button the handled frame didn't have
+
+        main2.http_client.session.mount("https://", self.stub)
+        main2.http_client.session.mount("http://", self.stub)
+        main2.session_id = main2.session_id or "replay-session"
+        main2.session_ready.set()  # Recordings may start after READY
+        self.schedule_click = main2.schedule_click
+        self.dispatch_message = main2.dispatch_message
+        self.on_channel_message = main2.on_channel_message
+        self.end_adventure = main2.adventure_session.end
+        main2.schedule_click = self.traced_click
+        main2.dispatch_message = self.timed_dispatch
+        main2.adventure_session.end = self.traced_end
+        for event in main2.MESSAGE_EVENTS:
+            main2.DISPATCH_HANDLERS[event] = self.tagged_message
+
+    def traced_click(self, delay, button, message_id, on_done):
+        if button.custom_id not in self.offered:
+            self.stale_clicks.append({"frame": self.handling, "label": button.label, "custom_id": button.custom_id})
+        self.decisions.append({"frame": self.handling, "action": "click", "state": main2.adventure_session.state.name,
+                               "label": button.label, "role": main2.classify_button(button).name,
+                               "prefix": button.custom_id.split(":", 1)[0]})
+        return self.schedule_click(delay / self.speed if self.speed else 0, button, message_id, on_done)
+
+    def traced_end(self, cooldown_seconds, ready_at=None):
+        self.decisions.append({"frame": self.handling, "action": "end", "state": main2.adventure_session.state.name})
+        return self.end_adventure(cooldown_seconds, ready_at)
+
+    def tagged_message(self, ws, data, received_at):
+        self.in_flight[received_at] = (data.get("t"), self.current)
+        self.on_channel_message(ws, data, received_at)
+
+    def timed_dispatch(self, msg_data, received_at):
+        event, self.handling = self.in_flight.pop(received_at, ("MESSAGE", None))
+        self.offered = raw_custom_ids(msg_data)
+        self.dispatch_message(msg_data, received_at)
+        self.handled[event].append(time.perf_counter() - received_at)
+
+    def settle(self):
+        """Wait until queued messages are handled and their click has been answered"""
+        deadline = time.monotonic() + SETTLE_TIMEOUT
+        while True:
+            main2.event_executor.submit(lambda: None).result()
+            if main2.pending_click is None or time.monotonic() > deadline:
+                return
+            time.sleep(0.0002)
+
+    def run(self):
+        prepared = []
+        compressor = zlib.compressobj()
+        for at, text in self.frames:
+            event, frame = event_type(text)
+            wire = text
+            if self.compress:
+                wire = compressor.compress(text.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            prepared.append((at, event, ours(frame), frame, wire))
+        main2.gateway.reset_transport()
+
+        start = time.perf_counter()
+        first_at = next((at for at, *_ in prepared if at is not None), None)
+        for index, (at, event, kind, frame, wire) in enumerate(prepared):
+            self.current = index
+            if self.speed and at is not None and first_at is not None:
+                delay = start + (at - first_at) / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            elif kind and not self.speed:
+                self.settle()
+            if kind == "command":
+                main2.adventure_session.cooldown_over()  # The round loop only sends once the cooldown ran out
+                self.decisions.append({"frame": index, "action": "send", "content": frame["d"]["content"]})
+                main2.send_message(frame["d"]["content"])
+            elif kind == "dank":
+                self.stub.recent.appendleft(frame["d"])
+            received = time.perf_counter()
+            main2.on_message(self.ws, wire)
+            self.reader[event].append(time.perf_counter() - received)
+        self.settle()
+        elapsed = time.perf_counter() - start
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        frames = len(self.frames)
+        events = {}
+        for event in sorted(self.reader, key=lambda e: -len(self.reader[e])):
+            reader, handled = self.reader[event], self.handled.get(event, [])
+            events[event] = {
+                "count": len(reader),
+                "reader_p50_us": round(percentile(reader, 0.5) * 1e6, 1),
+                "reader_p99_us": round(percentile(reader, 0.99) * 1e6, 1),
+                "handled": len(handled),
+                "handle_p50_ms": round(percentile(handled, 0.5) * 1000, 3),
+                "handle_p99_ms": round(percentile(handled, 0.99) * 1000, 3),
+            }
+        return {
+            "frames": frames,
+            "seconds": round(elapsed, 4),
+            "events_per_sec": round(frames / elapsed, 1) if elapsed else 0.0,
+            "reader_events_per_sec": round(frames / sum(sum(v) for v in self.reader.values()), 1) if frames else 0.0,
+            "events": events,
+            "decisions": self.decisions,
+            "stale_clicks": self.stale_clicks,
+            "rest": dict(self.stub.calls),
+            "gateway": main2.gateway_report(),
+            "adventure": main2.adventure_session.snapshot(),
+        }
+
+
+def check_session_loss(schedule_click, timeout=SETTLE_TIMEOUT):
+    """Lose the session during a click: it must be held until READY and finish exactly once.
+
+    Returns the list of on_done results (expected: [True]).
+    """
+    results = []
+    attempts = []
+    click_button = main2.click_button
+
+    def flaky_click(button, message_id, retry_count=0):
+        attempts.append(message_id)
+        if len(attempts) == 1:
+            main2.session_ready.clear()  # Op 9 lands while the request is out
+            return False
+        return True
+
+    main2.click_button = flaky_click
+    try:
+        button = main2.Button("check:park", "Park", 2, False, None, None)
+        click = schedule_click(0, button, "1", results.append)
+        deadline = time.monotonic() + timeout
+        while not main2.session_waiters and time.monotonic() < deadline:
+            time.sleep(0.001)
+        main2.session_established()
+        while main2.pending_click is click and time.monotonic() < deadline:
+            time.sleep(0.001)
+        time.sleep(0.05)  # Long enough for a second finish_click to show up
+        main2.event_executor.submit(lambda: None).result()
+    finally:
+        main2.click_button = click_button
+        main2.session_ready.set()
+    return results
+
+
+REWARD_CASES = [  # (content, embed fields, expected parse_reward)
+    ("You got ⏣ 300 but lost ⏣ 200.", [], (100, 0)),
+    ("A pirate showed up and ⏣ 200 was stolen!", [], (-200, 0)),
+    ("You took 1x Rock and they gave you ⏣ 1000", [], (1000, -1)),
+    ("", [("Rewards", "⏣ 12,450\n1x Alien Sample\n2x Space Ham")], (12450, 3)),
+    ("", [("Coins", "⏣ 500"), ("Items", "1x Alien Sample\n2x Space Ham")], (500, 3)),
+    ("", [("Lost", "⏣ 100\n1x Fuel")], (-100, -1)),
+    ("You looked around for ⏣ 5 and left.", [], None),
+]
+
+
+def check_rewards():
+    """parse_reward on REWARD_CASES; returns the cases it got wrong"""
+    wrong = []
+    for content, fields, expected in REWARD_CASES:
+        embeds = [{"fields": [{"name": name, "value": value} for name, value in fields]}] if fields else []
+        got = main2.parse_reward(main2.MessageView({"content": content, "embeds": embeds, "components": []}))
+        if got != expected:
+            wrong.append({"content": content, "fields": fields, "expected": expected, "got": got})
+    return wrong
+
+
+def print_report(report):
+    print(f"📼 {report['frames']} frames in {report['seconds']:.3f}s: {report['events_per_sec']:,.0f} events/sec "
+          f"({report['reader_events_per_sec']:,.0f}/sec on the reader alone, "
+          f"{report['gateway']['drop_rate']:.1%} dropped undecoded, json: {report['gateway']['json_backend']})")
+    print(f"{'event':<22} {'count':>6} {'reader p50':>11} {'reader p99':>11} {'handled':>8} {'handle p50':>11} {'handle p99':>11}")
+    for event, row in report["events"].items():
+        handled = (f"{row['handled']:>8} {row['handle_p50_ms']:>9.3f}ms {row['handle_p99_ms']:>9.3f}ms"
+                   if row["handled"] else f"{'':>8} {'':>11} {'':>11}")
+        print(f"{event:<22} {row['count']:>6} {row['reader_p50_us']:>9.1f}µs {row['reader_p99_us']:>9.1f}µs {handled}")
+    actions = Counter(d["action"] for d in report["decisions"])
+    roles = Counter(d["role"] for d in report["decisions"] if d["action"] == "click")
+    print(f"🧠 decisions: {dict(actions)}  clicks by role: {dict(roles)}")
+    print(f"🌐 REST: {report['rest']}")
+    for click in report["stale_clicks"][:5]:
+        print(f"❌ frame {click['frame']}: clicked '{click['label']}' ({click['custom_id']}), which that frame doesn't offer")
+    if report["stale_clicks"]:
+        print(f"❌ {len(report['stale_clicks'])} clicks on buttons the handled message didn't have")
+    if "session_loss_results" in report:
+        results = report["session_loss_results"]
+        print(f"{'✅' if results == [True] else '❌'} click parked across a lost session finished with {results}")
+    for case in report.get("reward_mismatches", ()):
+        print(f"❌ parse_reward({case['content'] or case['fields']!r}) gave {case['got']}, expected {case['expected']}")
+
+
+def decision_key(decision):
+    return tuple(sorted((k, v) for k, v in decision.items()))
+
+
+def compare(report, baseline):
+    """Print how this run differs from a saved one; returns the number of changed decisions"""
+    print(f"📊 vs baseline: {baseline['events_per_sec']:,.0f} -> {report['events_per_sec']:,.0f} events/sec "
+          f"({report['events_per_sec'] / baseline['events_per_sec'] - 1:+.1%})" if baseline["events_per_sec"] else "")
+    for event, row in report["events"].items():
+        old = baseline["events"].get(event)
+        if old and row["handled"] and old["handled"]:
+            print(f"   {event:<20} handle p99 {old['handle_p99_ms']:.3f} -> {row['handle_p99_ms']:.3f}ms")
+    old_decisions = [decision_key(d) for d in baseline["decisions"]]
+    new_decisions = [decision_key(d) for d in report["decisions"]]
+    changed = sum(1 for a, b in itertools.zip_longest(old_decisions, new_decisions) if a != b)
+    if changed:
+        print(f"🔀 {changed} decisions differ from the baseline; first ones:")
+        shown = 0
+        for a, b in itertools.zip_longest(baseline["decisions"], report["decisions"]):
+            if a != b and shown < 5:
+                print(f"   was {a}\n   now {b}")
+                shown += 1
+    else:
+        print("✅ same decisions as the baseline")
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay gateway frames through on_message")
+    parser.add_argument("frames", nargs="?", help="recorded frames (.jsonl); built-in session if omitted")
+    parser.add_argument("--speed", type=float, default=0.0, help="0 = full speed, 1 = recorded pace, N = N times faster")
+    parser.add_argument("--compress", action="store_true", help="feed the frames as one zlib stream like the live gateway")
+    parser.add_argument("--rest-latency", type=float, default=0.0, help="milliseconds StubDiscord takes per REST call")
+    parser.add_argument("--rounds", type=int, default=40, help="adventures in the built-in session")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the full report here")
+    parser.add_argument("--compare", help="report saved with --json to compare against")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's own log output")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames) if args.frames else builtin_frames(args.rounds)
+    random.seed(args.seed)
+    replay = Replay(frames, speed=args.speed, compress=args.compress, rest_latency=args.rest_latency / 1000)
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)  # click_button appends to a log file in the working directory
+        try:
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else open(os.devnull, "w")):
+                report = replay.run()
+                report["session_loss_results"] = check_session_loss(replay.schedule_click)
+                report["reward_mismatches"] = check_rewards()
+        finally:
+            os.chdir(cwd)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    failed = report["stale_clicks"] or report["session_loss_results"] != [True] or report["reward_mismatches"]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,782 @@
+# Local Discord stand-in for end-to-end load and chaos tests
+# Usage: python fake_discord.py [--duration 120] [--flood 200] [--chaos drop,reconnect,invalid,zombie]
+#                               [--chaos-every 20] [--rate-limit-rate 0.05] [--rest-latency 40]
+#                               [--heartbeat 5000] [--grace 60] [--json report.json] [--verbose]
+#
+# Starts a fake gateway (a plain-socket RFC 6455 websocket server) and a fake
+# REST API on localhost, points main2 at them and runs the real bot against
+# them: GatewayConnection, monitor_connection, the command worker and
+# click_button all do what they do in production.
+#
+# The gateway speaks Hello, Heartbeat/ACK, IDENTIFY -> READY, RESUME ->
+# replayed events + RESUMED, op 7 and op 9, with zlib-stream when asked for.
+# The REST side answers /interactions, /channels/{id}/messages (send, fetch,
+# delete, bulk-delete) and webhooks with per-route rate-limit headers.
+# FakeDankMemer scripts adventures on top: "pls adv" gets a start message,
+# every accepted click edits it to the next scenario, the last one shows a
+# summary with a short cooldown.
+#
+# Load and chaos:
+#   --flood N          unrelated guild events per second (other channels, other users, presences)
+#   --chaos KINDS      every --chaos-every seconds one of: drop (socket cut without a close frame),
+#                      reconnect (op 7), invalid (op 9, not resumable), zombie (heartbeats stop being ACKed)
+#   --rate-limit-rate  share of REST calls answered with an injected 429
+#   --rest-latency     mean REST latency in milliseconds
+# The report gives event throughput, REST and rate-limit counts, the bot's
+# own /stats numbers and, per incident, how long until the bot had a live
+# session again (READY or RESUMED: the recovery time) and, separately, how
+# long until its adventure made progress after that (the next accepted click
+# once the session is back; this includes any cooldown). An incident the
+# adventure never got past fails the run.
+# Start and navigation clicks keep the bot's fixed 2-5 s delays; choice delays
+# and command spacing are shortened unless --human-delays is given.
+
+import argparse
+import base64
+import contextlib
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+import re
+import socket
+import struct
+import sys
+import tempfile
+import time
+import uuid
+import zlib
+from collections import Counter, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread, Timer
+
+os.environ.setdefault("DISCORD_TOKEN", "fake-token")
+os.environ.setdefault("DISCORD_CHANNEL_ID", "1400000000000000001")
+os.environ.pop("GATEWAY_RECORD_FILE", None)
+
+import main2
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+BOT_USER_ID = "1400000000000000099"
+OTHER_CHANNELS = [str(1400000000000000100 + i) for i in range(20)]
+DANK_DELAY = 0.3   # How long the fake Dank Memer takes to answer (seconds)
+RESUME_BUFFER = 5000  # Events kept per session for RESUME
+CHAOS_KINDS = ("drop", "reconnect", "invalid", "zombie")
+
+SCENARIOS = [
+    ("You came across an alien who wants to probe you. What do you do?", ["Talk", "Attack", "Run"]),
+    ("You landed on a blob-like planet. The elusive blob wobbles at you.", ["Grab one", "Leave"]),
+    ("You found a broken telescope floating in deep space. Try and fix it?", ["Try", "Ignore"]),
+    ("An angry alien in the kitchen is cooking some shady stuff.", ["Eat", "Run"]),
+    ("Your spaceship is low on fuel near a space station. Dock there?", ["Dock", "Keep flying"]),
+    ("Nothing interesting happened. You passed a star and kept drifting.", []),
+]
+
+out = sys.stdout  # The bot's own prints may be redirected; ours always go here
+
+
+def log(message):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}", file=out, flush=True)
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# --- FAKE GATEWAY ---
+def encode_frame(opcode, payload):
+    """One unmasked, unfragmented server frame"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+class Client:
+    """One websocket connection to the fake gateway"""
+
+    def __init__(self, sock, compress):
+        self.sock = sock
+        self.send_lock = Lock()
+        self.compressor = zlib.compressobj() if compress else None
+        self.session = None
+        self.acking = True
+        self.open = True
+
+    def recv_exact(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("client went away")
+            data.extend(chunk)
+        return bytes(data)
+
+    def recv_frame(self):
+        """(opcode, payload) of the next whole message; continuation frames are joined"""
+        message, message_opcode = bytearray(), None
+        while True:
+            first, second = self.recv_exact(2)
+            opcode, length = first & 0x0F, second & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", self.recv_exact(2))[0]
+            elif length == 127:
+                length = struct.unpack("!Q", self.recv_exact(8))[0]
+            mask = self.recv_exact(4) if second & 0x80 else None
+            payload = self.recv_exact(length)
+            if mask:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+            if opcode >= 8:
+                return opcode, payload  # Control frames are never fragmented
+            if opcode:
+                message_opcode = opcode
+            message.extend(payload)
+            if first & 0x80:
+                return message_opcode, bytes(message)
+
+    def write_frame(self, opcode, payload):
+        with self.send_lock:
+            self.sock.sendall(encode_frame(opcode, payload))
+
+    def send_json(self, payload):
+        text = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        try:
+            with self.send_lock:  # The zlib stream and the frame order must match
+                if self.compressor:
+                    data = self.compressor.compress(text) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+                    self.sock.sendall(encode_frame(2, data))
+                else:
+                    data = text
+                    self.sock.sendall(encode_frame(1, data))
+            return len(data)
+        except OSError:
+            self.open = False
+            return 0
+
+    def cut(self):
+        """Drop the TCP connection without a close frame"""
+        self.open = False
+        with contextlib.suppress(OSError):
+            self.sock.shutdown(socket.SHUT_RDWR)
+
+
+class Session:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.seq = 0
+        self.buffer = deque(maxlen=RESUME_BUFFER)
+        self.client = None
+
+
+class FakeGateway:
+    """Websocket gateway: Hello, heartbeats, IDENTIFY/READY, RESUME/RESUMED, op 7 and op 9"""
+
+    def __init__(self, heartbeat_ms):
+        self.heartbeat_ms = heartbeat_ms
+        self.lock = Lock()
+        self.sessions = {}
+        self.clients = []
+        self.incidents = []
+        self.counters = Counter()
+        self.events = Counter()
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.url = f"ws://127.0.0.1:{self.listener.getsockname()[1]}"
+
+    def start(self):
+        Thread(target=self.accept_loop, name="fake-gateway", daemon=True).start()
+
+    def accept_loop(self):
+        while True:
+            sock, _ = self.listener.accept()
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            Thread(target=self.serve, args=(sock,), name="fake-gateway-client", daemon=True).start()
+
+    def handshake(self, sock):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = sock.recv(4096)
+            if not chunk or len(request) > 16384:
+                return None
+            request += chunk
+        lines = request.split(b"\r\n\r\n", 1)[0].decode("latin-1").split("\r\n")
+        path = lines[0].split(" ")[1]
+        headers = dict(line.split(":", 1) for line in lines[1:] if ":" in line)
+        headers = {name.strip().lower(): value.strip() for name, value in headers.items()}
+        accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + WS_GUID).encode()).digest()).decode()
+        sock.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        return Client(sock, "compress=zlib-stream" in path)
+
+    def serve(self, sock):
+        client = None
+        try:
+            client = self.handshake(sock)
+            if client is None:
+                return
+            with self.lock:
+                self.clients.append(client)
+                self.counters["connections"] += 1
+            client.send_json({"t": None, "s": None, "op": 10, "d": {"heartbeat_interval": self.heartbeat_ms}})
+            while client.open:
+                opcode, payload = client.recv_frame()
+                if opcode == 8:
+                    self.counters["close_frames"] += 1
+                    with contextlib.suppress(OSError):
+                        client.write_frame(8, payload[:2])
+                    break
+                if opcode == 9:
+                    client.write_frame(10, payload)
+                elif opcode in (1, 2):
+                    self.receive(client, json.loads(payload))
+        except (OSError, ConnectionError, ValueError, KeyError, IndexError):
+            pass
+        finally:
+            if client is not None:
+                client.open = False
+                with self.lock:
+                    if client in self.clients:
+                        self.clients.remove(client)
+                    if client.session is not None and client.session.client is client:
+                        client.session.client = None
+            with contextlib.suppress(OSError):
+                sock.close()
+
+    def receive(self, client, payload):
+        op, data = payload.get("op"), payload.get("d")
+        if op == 1:
+            self.counters["heartbeats"] += 1
+            if client.acking:
+                client.send_json({"t": None, "s": None, "op": 11, "d": None})
+            else:
+                self.counters["acks_withheld"] += 1
+        elif op == 2:
+            self.counters["identifies"] += 1
+            session = Session()
+            with self.lock:
+                self.sessions[session.id] = session
+                self.bind(client, session)
+                self.dispatch_to(session, "READY", {
+                    "v": 9, "session_id": session.id, "resume_gateway_url": self.url,
+                    "user": {"id": BOT_USER_ID, "username": "farmer", "bot": False},
+                    "guilds": [{"id": main2.GUILD_ID, "unavailable": True}]})
+                self.reconnected()
+        elif op == 6:
+            self.counters["resumes"] += 1
+            with self.lock:
+                session = self.sessions.get(data.get("session_id"))
+                seq = data.get("seq") or 0
+                if session is None or (session.buffer and seq < session.buffer[0]["s"] - 1):
+                    self.counters["resumes_refused"] += 1
+                    client.send_json({"t": None, "s": None, "op": 9, "d": False})
+                    return
+                self.bind(client, session)
+                missed = [frame for frame in session.buffer if frame["s"] > seq]
+                for frame in missed:
+                    client.send_json(frame)
+                self.counters["replayed"] += len(missed)
+                self.dispatch_to(session, "RESUMED", {})
+                self.reconnected()
+
+    def bind(self, client, session):
+        if session.client is not None and session.client is not client:
+            session.client.cut()  # A session lives on one connection
+        session.client = client
+        client.session = session
+
+    def dispatch_to(self, session, event, data):
+        """Numbered dispatch, buffered for RESUME and sent if the session is connected (holds self.lock)"""
+        session.seq += 1
+        frame = {"t": event, "s": session.seq, "op": 0, "d": data}
+        session.buffer.append(frame)
+        self.events[event] += 1
+        if session.client is not None and session.client.open:
+            self.counters["wire_bytes"] += session.client.send_json(frame)
+            self.counters["sent"] += 1
+        else:
+            self.counters["buffered"] += 1
+
+    def broadcast(self, event, data):
+        with self.lock:
+            for session in list(self.sessions.values()):
+                self.dispatch_to(session, event, data)
+
+    def live_clients(self):
+        with self.lock:
+            return [client for client in self.clients if client.open and client.session is not None]
+
+    def reconnected(self):
+        """A session is live again (holds self.lock): the bot has recovered from every open incident"""
+        now = time.monotonic()
+        for incident in self.incidents:
+            if incident["reconnected_at"] is None:
+                incident["reconnected_at"] = now
+                log(f"✅ Recovered from {incident['kind']} in {now - incident['at']:.2f}s")
+
+    def progressed(self):
+        """The adventure moved on (an accepted click) on a session that is back after its incidents"""
+        now = time.monotonic()
+        with self.lock:
+            for incident in self.incidents:
+                if incident["reconnected_at"] is not None and incident["progressed_at"] is None:
+                    incident["progressed_at"] = now
+                    log(f"▶️ Adventure moving again {now - incident['at']:.2f}s after {incident['kind']}")
+
+    def chaos(self, kind):
+        clients = self.live_clients()
+        if not clients:
+            return False
+        client = clients[-1]
+        with self.lock:
+            self.incidents.append({"kind": kind, "at": time.monotonic(), "reconnected_at": None, "progressed_at": None})
+        self.counters["chaos_" + kind] += 1
+        log(f"💥 Chaos: {kind}")
+        if kind == "drop":
+            client.cut()
+        elif kind == "reconnect":
+            client.send_json({"t": None, "s": None, "op": 7, "d": None})
+        elif kind == "invalid":
+            with self.lock:
+                self.sessions.pop(client.session.id, None)
+                client.session.client = None
+                client.session = None
+            client.send_json({"t": None, "s": None, "op": 9, "d": False})
+        elif kind == "zombie":
+            client.acking = False
+        return True
+
+    def open_incidents(self):
+        with self.lock:
+            return [incident for incident in self.incidents if incident["progressed_at"] is None]
+
+    def recovery_times(self, field):
+        with self.lock:
+            return [i[field] - i["at"] for i in self.incidents if i[field] is not None]
+
+
+# --- FAKE REST API ---
+class RouteLimits:
+    """Per-route fixed windows that answer with Discord's rate-limit headers"""
+
+    LIMITS = {"POST /channels/{id}/messages": (5, 5.0), "POST /interactions": (50, 1.0)}
+    DEFAULT = (50, 1.0)
+
+    def __init__(self, inject_rate):
+        self.inject_rate = inject_rate
+        self.lock = Lock()
+        self.windows = {}
+        self.counters = Counter()
+
+    def check(self, route):
+        """(status, headers): 200 with the bucket state, or 429 with Retry-After"""
+        limit, window = self.LIMITS.get(route, self.DEFAULT)
+        bucket = hashlib.md5(route.encode()).hexdigest()[:12]
+        now = time.monotonic()
+        with self.lock:
+            used, reset_at = self.windows.get(route, (0, now + window))
+            if now >= reset_at:
+                used, reset_at = 0, now + window
+            if random.random() < self.inject_rate:
+                retry_after = round(random.uniform(0.2, 1.5), 3)
+                global_limit = random.random() < 0.2
+                self.counters["injected_global" if global_limit else "injected"] += 1
+                return 429, {"Retry-After": str(retry_after), "X-RateLimit-Global": str(global_limit).lower(),
+                             "X-RateLimit-Scope": "global" if global_limit else "user", "X-RateLimit-Bucket": bucket}
+            if used >= limit:
+                self.counters["bucket_429"] += 1
+                return 429, {"Retry-After": f"{reset_at - now:.3f}", "X-RateLimit-Bucket": bucket,
+                             "X-RateLimit-Limit": str(limit), "X-RateLimit-Remaining": "0",
+                             "X-RateLimit-Reset-After": f"{reset_at - now:.3f}", "X-RateLimit-Scope": "user"}
+            self.windows[route] = (used + 1, reset_at)
+            return 200, {"X-RateLimit-Bucket": bucket, "X-RateLimit-Limit": str(limit),
+                         "X-RateLimit-Remaining": str(limit - used - 1),
+                         "X-RateLimit-Reset-After": f"{reset_at - now:.3f}"}
+
+
+class FakeDankMemer:
+    """Scripted adventures in our channel, driven by "pls adv" and button clicks"""
+
+    def __init__(self, gateway, steps, cooldown):
+        self.gateway = gateway
+        self.steps = steps
+        self.cooldown = cooldown
+        self.lock = Lock()
+        self.ids = itertools.count((int(time.time() * 1000) - main2.DISCORD_EPOCH_MS) << 22)  # Real snowflakes: bulk delete checks their age
+        self.messages = deque(maxlen=50)  # Newest last, as GET returns them reversed
+        self.adventure = None
+        self.cooldown_until = 0.0
+        self.counters = Counter()
+
+    def message(self, author, content="", embeds=(), components=(), message_id=None):
+        data = {"id": message_id or str(next(self.ids)), "channel_id": str(main2.CHANNEL_ID), "guild_id": main2.GUILD_ID,
+                "author": author, "content": content, "embeds": list(embeds), "components": list(components),
+                "timestamp": now_iso(), "edited_timestamp": None}
+        self.messages.append(data)
+        return data
+
+    def embed_message(self, title, description, buttons, fields=()):
+        embed = {"type": "rich", "title": title, "description": description}
+        if fields:
+            embed["fields"] = [{"name": name, "value": value, "inline": True} for name, value in fields]
+        return {"embeds": [embed], "components": [{"type": 1, "components": buttons}] if buttons else []}
+
+    def later(self, action, *args):
+        Timer(DANK_DELAY, action, args).start()
+
+    def command(self, content):
+        """Our own message arrives in the channel; Dank Memer answers "pls adv" """
+        data = self.message({"id": BOT_USER_ID, "username": "farmer"}, content)
+        self.gateway.broadcast("MESSAGE_CREATE", data)
+        if content == "pls adv":
+            self.later(self.start_adventure)
+        return data
+
+    def start_adventure(self):
+        dank = {"id": main2.DANK_MEMER_ID, "username": "Dank Memer", "bot": True}
+        with self.lock:
+            wait = self.cooldown_until - time.time()
+            if wait > 0:
+                self.counters["cooldown_replies"] += 1
+                body = self.embed_message("Hold on there!", f"You can adventure again in {math.ceil(wait)} seconds.", [])
+                data = self.message(dank, **body)
+            else:
+                self.counters["started"] += 1
+                message_id = str(next(self.ids))
+                body = self.embed_message("Space Adventure", "Choose items you want to bring along! Recommended items are highlighted.",
+                                          [self.button("Start", f"adventure-start:{message_id}", style=3), self.backpack(message_id)])
+                data = self.message(dank, message_id=message_id, **body)
+                self.adventure = {"message": data, "step": 0, "scenarios": random.sample(SCENARIOS, min(self.steps, len(SCENARIOS)))}
+        self.gateway.broadcast("MESSAGE_CREATE", data)
+
+    def button(self, label, custom_id, style=2, disabled=False, emoji=None):
+        data = {"type": 2, "style": style, "label": label, "custom_id": custom_id, "disabled": disabled}
+        if emoji:
+            data["emoji"] = emoji
+        return data
+
+    def backpack(self, message_id):
+        return self.button("", f"adventure-backpackitem:{message_id}", style=4, emoji={"name": "🎒"})
+
+    def interact(self, payload):
+        """(status, body) for a POST /interactions"""
+        if payload.get("session_id") not in self.gateway.sessions:
+            self.counters["clicks_rejected"] += 1
+            return 400, {"message": "Invalid session", "code": 50035}
+        custom_id = (payload.get("data") or {}).get("custom_id")
+        with self.lock:
+            adventure = self.adventure
+            if adventure is None or payload.get("message_id") != adventure["message"]["id"]:
+                self.counters["clicks_rejected"] += 1
+                return 404, {"message": "Unknown Message", "code": 10008}
+            buttons = [b for row in adventure["message"]["components"] for b in row["components"]]
+            if not any(b["custom_id"] == custom_id and not b["disabled"] for b in buttons):
+                self.counters["clicks_rejected"] += 1
+                return 400, {"message": "Invalid Form Body", "code": 50035}
+            self.counters["clicks"] += 1
+        self.gateway.progressed()
+        self.later(self.advance, adventure)
+        return 204, None
+
+    def advance(self, adventure):
+        with self.lock:
+            if adventure is not self.adventure:
+                return
+            message = adventure["message"]
+            message_id, step = message["id"], adventure["step"]
+            adventure["step"] += 1
+            if step < len(adventure["scenarios"]):
+                description, labels = adventure["scenarios"][step]
+                buttons = [self.button(label, f"adventure-choice:{message_id}:{step}:{i}") for i, label in enumerate(labels)]
+                if not buttons:
+                    buttons = [self.button("", f"adventure-next:{message_id}:{step}", style=1,
+                                           emoji={"id": "1379166099895091251", "name": "ArrowRightui", "animated": True})]
+                message.update(self.embed_message("Space Adventure", description, buttons + [self.backpack(message_id)]))
+            else:
+                message.update(self.embed_message(
+                    "Adventure Summary", f"Your adventure is over! You can adventure again in {self.cooldown} seconds.",
+                    [self.button(f"Adventure again in {self.cooldown} seconds", "adventure-again", disabled=True)],
+                    fields=[("Rewards", f"⏣ {random.randint(2, 40) * 1000:,} coins, 1x Alien Sample"), ("Lost", "nothing")]))
+                self.adventure = None
+                self.cooldown_until = time.time() + self.cooldown
+                self.counters["completed"] += 1
+            message["edited_timestamp"] = now_iso()
+            data = json.loads(json.dumps(message))
+        self.gateway.broadcast("MESSAGE_UPDATE", data)
+
+
+class FakeREST:
+    """Discord REST endpoints the bot uses, served over HTTP/1.1 keep-alive"""
+
+    ROUTES = [
+        ("POST", re.compile(r"^/api/v9/interactions$"), "interaction"),
+        ("POST", re.compile(r"^/api/v9/channels/(\d+)/messages/bulk-delete$"), "bulk_delete"),
+        ("POST", re.compile(r"^/api/v9/channels/(\d+)/messages$"), "send"),
+        ("GET", re.compile(r"^/api/v9/channels/(\d+)/messages$"), "fetch"),
+        ("DELETE", re.compile(r"^/api/v9/channels/(\d+)/messages/(\d+)$"), "delete"),
+        ("POST", re.compile(r"^/api/webhooks/"), "webhook"),
+    ]
+
+    def __init__(self, dank, limits, latency_ms):
+        self.dank = dank
+        self.limits = limits
+        self.latency = latency_ms / 1000
+        self.calls = Counter()
+        self.statuses = Counter()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                fake.handle(self)
+
+            do_POST = do_DELETE = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        Thread(target=self.server.serve_forever, name="fake-rest", daemon=True).start()
+
+    def handle(self, request):
+        length = int(request.headers.get("Content-Length") or 0)
+        body = json.loads(request.rfile.read(length) or b"{}") if length else {}
+        path = request.path.split("?", 1)[0]
+        if self.latency:
+            time.sleep(random.uniform(0.5, 1.5) * self.latency)
+
+        endpoint = next((name for method, pattern, name in self.ROUTES
+                         if method == request.command and pattern.match(path)), None)
+        self.calls[endpoint or "unknown"] += 1
+        if endpoint is None:
+            return self.respond(request, 404, {"message": "404: Not Found", "code": 0})
+        status, headers = self.limits.check(main2.RateLimiter.route_key(request.command, path.replace("/api/v9", "")))
+        if status == 429:
+            return self.respond(request, 429, {"message": "You are being rate limited.",
+                                               "retry_after": float(headers["Retry-After"]),
+                                               "global": headers.get("X-RateLimit-Global") == "true"}, headers)
+
+        if endpoint == "interaction":
+            status, payload = self.dank.interact(body)
+        elif endpoint == "send":
+            status, payload = 200, self.dank.command(body.get("content", ""))
+        elif endpoint == "fetch":
+            limit = int(re.search(r"limit=(\d+)", request.path).group(1)) if "limit=" in request.path else 50
+            status, payload = 200, list(reversed(self.dank.messages))[:limit]
+        else:
+            status, payload = 204, None
+        self.respond(request, status, payload, headers)
+
+    def respond(self, request, status, payload=None, headers=None):
+        self.statuses[status] += 1
+        data = json.dumps(payload).encode() if payload is not None else b""
+        request.send_response(status)
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+
+# --- LOAD ---
+def flood(gateway, rate, stop_at):
+    """Unrelated guild traffic at `rate` events per second"""
+    if rate <= 0:
+        return
+    dank = {"id": main2.DANK_MEMER_ID, "username": "Dank Memer", "bot": True}
+    ids = itertools.count(1500000000000000000)
+    interval = 1.0 / rate
+    next_at = time.monotonic()
+    while time.monotonic() < stop_at:
+        user = {"id": str(random.randint(10**17, 10**18)), "username": "someone"}
+        kind = random.random()
+        if kind < 0.3:
+            gateway.broadcast("PRESENCE_UPDATE", {"user": {"id": user["id"]}, "guild_id": main2.GUILD_ID, "status": "online",
+                                                  "activities": [{"name": "Custom Status", "type": 4, "state": "grinding"}]})
+        elif kind < 0.45:
+            gateway.broadcast("TYPING_START", {"channel_id": random.choice(OTHER_CHANNELS), "guild_id": main2.GUILD_ID,
+                                               "user_id": user["id"], "timestamp": int(time.time())})
+        elif kind < 0.75:
+            gateway.broadcast("MESSAGE_CREATE", {"id": str(next(ids)), "channel_id": random.choice(OTHER_CHANNELS),
+                                                 "guild_id": main2.GUILD_ID, "author": user, "timestamp": now_iso(),
+                                                 "content": random.choice(["pls beg", "pls fish", "lol", "gm", "raid at 9?"]),
+                                                 "embeds": [], "components": []})
+        elif kind < 0.9:
+            gateway.broadcast("MESSAGE_CREATE", {"id": str(next(ids)), "channel_id": random.choice(OTHER_CHANNELS),
+                                                 "guild_id": main2.GUILD_ID, "author": dank, "timestamp": now_iso(), "content": "",
+                                                 "embeds": [{"title": "Space Adventure", "description": "You came across an alien. What do you do?"}],
+                                                 "components": [{"type": 1, "components": [
+                                                     {"type": 2, "style": 2, "label": "Talk", "custom_id": "adventure-choice:" + user["id"]}]}]})
+        else:
+            gateway.broadcast("MESSAGE_CREATE", {"id": str(next(ids)), "channel_id": str(main2.CHANNEL_ID),
+                                                 "guild_id": main2.GUILD_ID, "author": user, "timestamp": now_iso(),
+                                                 "content": "pls rob farmer", "embeds": [], "components": []})
+        next_at += interval
+        delay = next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -1.0:
+            next_at = time.monotonic()  # Can't keep up: don't burst to catch up
+
+
+def chaos_loop(gateway, kinds, every, stop_at):
+    if not kinds:
+        return
+    next_at = time.monotonic() + every
+    while time.monotonic() < stop_at - every / 2:
+        time.sleep(max(0.0, next_at - time.monotonic()))
+        gateway.chaos(random.choice(kinds))
+        next_at += every
+
+
+def bot_report():
+    return {
+        "gateway": main2.gateway_report(),
+        "heartbeat": main2.gateway.stats(),
+        "connection": main2.gateway_connection.stats(),
+        "rate_limits": main2.http_client.limiter.stats(),
+        "http": main2.http_client.connection_stats(),
+        "lifecycle": dict(main2.lifecycle_stats),
+        "adventure": main2.adventure_session.snapshot(),
+    }
+
+
+def build_report(gateway, dank, limits, rest, elapsed):
+    reconnect = gateway.recovery_times("reconnected_at")
+    progress = gateway.recovery_times("progressed_at")
+    return {
+        "seconds": round(elapsed, 2),
+        "server": {
+            "events_sent": gateway.counters["sent"],
+            "events_per_sec": round(gateway.counters["sent"] / elapsed, 1),
+            "events": dict(gateway.events),
+            "gateway": dict(gateway.counters),
+            "rest": dict(rest.calls),
+            "statuses": dict(rest.statuses),
+            "rate_limits": dict(limits.counters),
+            "dank": dict(dank.counters),
+        },
+        "recovery": {
+            "incidents": len(gateway.incidents),
+            "recovered": len(reconnect),
+            "p50": round(percentile(reconnect, 0.5), 3),
+            "max": round(max(reconnect), 3) if reconnect else 0.0,
+            "times": [round(t, 3) for t in reconnect],
+            "progressed": len(progress),
+            "progress_p50": round(percentile(progress, 0.5), 3),
+            "progress_max": round(max(progress), 3) if progress else 0.0,
+            "stuck": [incident["kind"] for incident in gateway.incidents if incident["progressed_at"] is None],
+        },
+        "bot": bot_report(),
+    }
+
+
+def print_report(report):
+    server, bot = report["server"], report["bot"]
+    log(f"📡 {server['events_sent']:,} events sent ({server['events_per_sec']:,.0f}/s), "
+        f"bot read {bot['gateway']['frames']:,} frames, dropped {bot['gateway']['drop_rate']:.1%} undecoded, "
+        f"reader max {bot['gateway']['reader_max_ms']:.2f} ms, queue max {bot['gateway']['queue_max_ms']:.2f} ms")
+    log(f"🔌 connections {server['gateway']['connections']}, identifies {server['gateway'].get('identifies', 0)}, "
+        f"resumes {server['gateway'].get('resumes', 0)} ({server['gateway'].get('resumes_refused', 0)} refused), "
+        f"replayed {server['gateway'].get('replayed', 0)}")
+    recovery = report["recovery"]
+    if recovery["incidents"]:
+        log(f"💥 {recovery['incidents']} incidents, {recovery['recovered']} recovered: session back in "
+            f"p50 {recovery['p50']:.2f}s (max {recovery['max']:.2f}s); adventure moving again after "
+            f"{recovery['progressed']} of them in p50 {recovery['progress_p50']:.2f}s (max {recovery['progress_max']:.2f}s)")
+        if recovery["stuck"]:
+            log(f"❌ The adventure never got past {len(recovery['stuck'])} incidents: {', '.join(recovery['stuck'])}")
+    log(f"🎮 adventures started {server['dank'].get('started', 0)}, completed {server['dank'].get('completed', 0)}, "
+        f"clicks {server['dank'].get('clicks', 0)} ok / {server['dank'].get('clicks_rejected', 0)} rejected")
+    log(f"🌐 REST {server['rest']} statuses {server['statuses']} 429s {server['rate_limits']}, "
+        f"bot limiter {bot['rate_limits']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bot against a local fake Discord")
+    parser.add_argument("--duration", type=float, default=120.0, help="seconds to run")
+    parser.add_argument("--grace", type=float, default=60.0, help="extra seconds for open incidents to recover")
+    parser.add_argument("--flood", type=float, default=200.0, help="unrelated guild events per second")
+    parser.add_argument("--chaos", default="", help="comma-separated: " + ",".join(CHAOS_KINDS))
+    parser.add_argument("--chaos-every", type=float, default=20.0, help="seconds between incidents")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of REST calls answered 429")
+    parser.add_argument("--rest-latency", type=float, default=0.0, help="mean REST latency (ms)")
+    parser.add_argument("--heartbeat", type=int, default=41250, help="heartbeat interval sent in Hello (ms)")
+    parser.add_argument("--steps", type=int, default=4, help="scenarios per adventure")
+    parser.add_argument("--cooldown", type=int, default=5, help="adventure cooldown (seconds)")
+    parser.add_argument("--human-delays", action="store_true", help="keep the bot's real click and command delays")
+    parser.add_argument("--json", help="write the full report here")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's own log output")
+    args = parser.parse_args()
+    kinds = [kind for kind in args.chaos.split(",") if kind]
+    unknown = set(kinds) - set(CHAOS_KINDS)
+    if unknown:
+        parser.error(f"unknown chaos kinds: {', '.join(sorted(unknown))}")
+
+    gateway = FakeGateway(args.heartbeat)
+    dank = FakeDankMemer(gateway, args.steps, args.cooldown)
+    limits = RouteLimits(args.rate_limit_rate)
+    rest = FakeREST(dank, limits, args.rest_latency)
+    gateway.start()
+    rest.start()
+    log(f"🧪 Fake Discord: gateway {gateway.url}, REST {rest.base}")
+
+    main2.GATEWAY_URL = gateway.url
+    main2.API_BASE = rest.base + "/api/v9"
+    main2.webhook_dispatcher.url = rest.base + "/api/webhooks/1/fake"
+    if not args.human_delays:
+        main2.INTERACTION_MIN_DELAY, main2.INTERACTION_MAX_DELAY = 0.2, 0.6
+        main2.COMMAND_DELAY = 0.5
+
+    report_path = os.path.abspath(args.json) if args.json else None
+    workdir = tempfile.mkdtemp(prefix="fake-discord-")
+    os.chdir(workdir)  # Choice memory, the stop file and click logs land here
+    log(f"📂 Bot working directory: {workdir}")
+    started = time.monotonic()
+    stop_at = started + args.duration
+    bot_log = sys.stdout if args.verbose else open(os.path.join(workdir, "bot.log"), "w", buffering=1)
+    with contextlib.redirect_stdout(bot_log):
+        bot = Thread(target=main2.start_adventure_farming, name="bot", daemon=True)
+        bot.start()
+        Thread(target=flood, args=(gateway, args.flood, stop_at), name="fake-flood", daemon=True).start()
+        Thread(target=chaos_loop, args=(gateway, kinds, args.chaos_every, stop_at), name="fake-chaos", daemon=True).start()
+        while time.monotonic() < stop_at:
+            time.sleep(min(10.0, max(0.0, stop_at - time.monotonic())))
+            log(f"⏱️ {time.monotonic() - started:.0f}s: {gateway.counters['sent']:,} events sent, "
+                f"bot frames {main2.gateway_stats['frames']:,}, adventure {main2.adventure_session.state.name}, "
+                f"completed {dank.counters['completed']}")
+        grace_until = time.monotonic() + args.grace
+        while gateway.open_incidents() and time.monotonic() < grace_until:
+            time.sleep(0.5)  # Let the last incidents play out before judging them
+        main2.request_stop("load test finished")
+        bot.join(timeout=30)
+        elapsed = time.monotonic() - started
+        report = build_report(gateway, dank, limits, rest, elapsed)
+        print_report(report)  # Still inside the redirect: late bot output stays out of the report
+
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1, ensure_ascii=False)
+    return 0 if not bot.is_alive() and not report["recovery"]["stuck"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
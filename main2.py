@@ -4,16 +4,36 @@
 import time
 import os
 import requests
+from requests.adapters import HTTPAdapter
 import sys
 import json
 import random
 import re
+import math
 import pprint
 from flask import Flask
-from threading import Thread, Event
+import threading
+from threading import Thread, Event, Lock, Condition
+from concurrent.futures import ThreadPoolExecutor
 import queue
 import pickle
+import sqlite3
+import zlib
+import signal
+import socket
+import struct
+import heapq
+import itertools
+from collections import OrderedDict, namedtuple, deque
 from datetime import datetime, timedelta
+from enum import Enum, Flag, auto
+from functools import lru_cache
+
+# Faster JSON decoding for gateway frames when orjson is installed
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 # Ensure using websocket-client
 try:
@@ -33,7 +53,16 @@ COMMAND_DELAY = 6     # Time between commands (seconds)
 ROUND_DELAY = 240     # 4 minutes between rounds (seconds)
 DELETE_MESSAGE_DELAY = 10  # Time to delete message after sending (seconds), increased from 3
 STOP_FILE = "stop.txt"
-CHOICE_MEMORY_FILE = "choice_memory.pkl"  # Choice memory file
+CHOICE_MEMORY_FILE = "choice_memory.pkl"  # Legacy choice memory file, migrated into CHOICE_MEMORY_DB once
+CHOICE_MEMORY_DB = "choice_memory.db"  # Choice memory store (SQLite, WAL mode)
+CHOICE_FLUSH_INTERVAL = 5.0  # Max seconds a remembered choice waits before being written
+CHOICE_FLUSH_BATCH = 20      # Pending choices that trigger an immediate write
+SCENARIO_MINHASH_SIZE = 64   # MinHash values per scenario fingerprint
+SCENARIO_LSH_BANDS = 32      # LSH bands (2 values each) used to find candidate scenarios
+SCENARIO_SIMILARITY_THRESHOLD = 0.8  # Estimated Jaccard similarity needed to reuse a scenario key
+SCENARIO_FINGERPRINT_VERSION = 2     # Bump when ScenarioIndex.shingles changes; older stored fingerprints are dropped
+SCENARIO_MINHASH_SEED = 1337
+ITEM_REWARD_VALUE = 1000     # Coins-equivalent value of one item when ranking choices by reward
 
 # Enhanced interaction times for longer adventures
 INTERACTION_MIN_DELAY = 3.5  # Minimum wait before clicking, increased for longer delays
@@ -42,6 +71,10 @@ ADVENTURE_TIMEOUT = 600      # 10 minutes per adventure, increased for long adve
 INTERACTION_RETRY_DELAY = 2.0  # Wait time between interaction retries, slight increase
 NAVIGATION_WAIT_TIME = 12    # Wait for navigation message after choice, increased for longer delays
 NO_START_BUTTON_TIMEOUT = 20  # Wait for start button (seconds), increased for slow interaction
+BUTTON_MEMO_SIZE = 256  # Parsed component trees kept per (message id, component tree hash)
+BUTTON_ROLE_CACHE_SIZE = 1024  # Classified button signatures
+
+VERBOSE_LOGGING = os.environ.get("VERBOSE_LOGGING", "").lower() in ("1", "true", "yes")
 
 HEADERS = {
     "Authorization": TOKEN,
@@ -50,20 +83,54 @@ HEADERS = {
 }
 
 API_BASE = "https://discord.com/api/v9"
-
-# Global variables
-waiting_for_interaction = False
-waiting_for_navigation = False
-waiting_for_start_button = False  # New variable for start button wait
+GATEWAY_URL = "wss://gateway.discord.gg"
+GATEWAY_QUERY = "/?v=9&encoding=json"
+GATEWAY_INTENTS = 33280
+GATEWAY_COMPRESS = os.environ.get("GATEWAY_COMPRESS", "1").lower() not in ("0", "false", "no")  # zlib-stream transport
+ZLIB_SUFFIX = b"\x00\x00\xff\xff"  # Ends every complete zlib-stream gateway message
+GATEWAY_RECORD_FILE = os.environ.get("GATEWAY_RECORD_FILE")  # Append every gateway message here (replay with bench_replay.py)
+GATEWAY_BACKOFF_BASE = 1.0   # First reconnect backoff ceiling (seconds), doubled per failed attempt
+GATEWAY_BACKOFF_MAX = 60.0   # Backoff ceiling
+GATEWAY_STABLE_AFTER = 60.0  # A connection that lasted this long resets the backoff
+
+HTTP_POOL_HOSTS = 4   # Hosts with their own keep-alive pool (discord.com, webhook host, ...)
+HTTP_POOL_SIZE = 8    # Keep-alive connections kept per host
+HTTP_TIMEOUTS = {     # Per-endpoint request timeouts (seconds)
+    "interaction": 20,
+    "send": 15,
+    "fetch": 10,
+    "delete": 10,
+    "bulk_delete": 10,
+    "webhook": 10
+}
+HTTP_IO_WORKERS = 2   # Threads running scheduled clicks and deletes
+COUNTDOWN_TICK = 60   # Seconds between cooldown progress logs
+STOP_POLL_INTERVAL = 2  # Stop-file polling period where inotify is unavailable (seconds)
+HTTP_PRIORITIES = {   # Lower goes first when requests queue on the same rate-limit bucket
+    "interaction": 0,
+    "fetch": 1,
+    "send": 2,
+    "delete": 3,
+    "bulk_delete": 3,
+    "webhook": 4
+}
+HTTP_BACKGROUND_PRIORITY = HTTP_PRIORITIES["delete"]  # From here down, yield to every queued click/fetch/send
+DELETE_BATCH_SIZE = 100  # Most ids the bulk-delete endpoint takes at once
+BULK_DELETE_MAX_AGE = 14 * 86400 - 3600  # Bulk delete refuses messages older than two weeks (seconds, with margin)
+BULK_DELETE_RETRY_AFTER = 3600  # After a rejected bulk delete, delete one at a time this long (seconds)
+DISCORD_EPOCH_MS = 1420070400000  # Snowflake timestamps count from here
+WEBHOOK_FLUSH_INTERVAL = 2.0  # Log lines are merged into one webhook post per interval (seconds)
+WEBHOOK_QUEUE_SIZE = 200      # Lines kept while the webhook is slow; the oldest are dropped past this
+WEBHOOK_MESSAGE_LIMIT = 2000  # Discord's message length limit
+WEBHOOK_LINE_LIMIT = WEBHOOK_MESSAGE_LIMIT - 100  # Longer lines are cut, leaving room for the dropped-lines header
+
+# Global variables (adventure state lives in adventure_session)
 session_id = None
-adventure_start_time = None
 current_ws = None
+flask_thread = None
 last_heartbeat = time.time()
-last_choice_time = None
-dynamic_round_delay = ROUND_DELAY
-choice_memory = {}  # Choice memory
-no_start_button_time = None  # Start button wait time
-remaining_cooldown = 0  # Track remaining cooldown time
+choice_memory = {}  # Choice memory cache (read-through over choice_store)
+choice_index = {}  # scenario_key -> {normalized label: (score, remembered label)}
 
 # ✅ Flask for UptimeRobot
 app = Flask('')
@@ -76,6 +143,14 @@ def home():
 def health_check():
     return "OK", 200
 
+@app.route('/stats')
+def stats():
+    return {"http": http_client.connection_stats(), "rate_limits": http_client.limiter.stats(),
+            "gateway": gateway_report(), "scheduler": scheduler.stats(), "deletes": message_deleter.stats(),
+            "webhook": webhook_dispatcher.stats(), "heartbeat": gateway.stats(),
+            "connection": gateway_connection.stats(), "lifecycle": lifecycle_stats,
+            "adventure": adventure_session.snapshot()}
+
 def run_flask(port=8080):
     from waitress import serve
     import socket
@@ -93,172 +168,1083 @@ def run_flask(port=8080):
                 raise
 
 def keep_alive():
-    thread = Thread(target=run_flask, args=(8080,))
-    thread.daemon = True  # Ensure thread stops with main thread
-    thread.start()
+    global flask_thread
+    if flask_thread is not None and flask_thread.is_alive():
+        return
+    flask_thread = Thread(target=run_flask, args=(8080,), name="flask")
+    flask_thread.daemon = True  # Ensure thread stops with main thread
+    flask_thread.start()
     print("🌐 Flask server started for keep-alive on port 8080 (or next available)")
 
+# --- MESSAGE VIEW ---
+class MessageView:
+    """Parsed view of one Dank Memer message, built once per gateway event.
+
+    Normalized text, extracted buttons and button roles are computed lazily on
+    first access and shared by every classifier that looks at the message.
+    """
+
+    __slots__ = ("data", "content", "embeds", "components", "message_id",
+                 "_content_lower", "_full_text", "_short_text", "_full_hits",
+                 "_short_hits", "_buttons", "_roles", "_scenario_key")
+
+    def __init__(self, msg_data):
+        self.data = msg_data
+        self.content = msg_data.get("content") or ""
+        self.embeds = msg_data.get("embeds") or []
+        self.components = msg_data.get("components") or []
+        self.message_id = msg_data.get("id")
+        self._content_lower = None
+        self._full_text = None
+        self._short_text = None
+        self._full_hits = None
+        self._short_hits = None
+        self._buttons = None
+        self._roles = None
+        self._scenario_key = None
+
+    @property
+    def content_lower(self):
+        """Lowercased message content"""
+        if self._content_lower is None:
+            self._content_lower = self.content.lower()
+        return self._content_lower
+
+    @property
+    def full_text(self):
+        """Lowercased content plus embed titles, descriptions and fields"""
+        if self._full_text is None:
+            parts = [self.content]
+            for embed in self.embeds:
+                parts.append(str(embed.get("title", "")))
+                parts.append(str(embed.get("description", "")))
+                for field in embed.get("fields") or ():
+                    parts.append(str(field.get("name", "")))
+                    parts.append(str(field.get("value", "")))
+            self._full_text = " ".join(parts).lower()
+        return self._full_text
+
+    @property
+    def short_text(self):
+        """Lowercased content plus embed descriptions and titles (no fields)"""
+        if self._short_text is None:
+            parts = [self.content]
+            for embed in self.embeds:
+                parts.append(str(embed.get("description", "")))
+                parts.append(str(embed.get("title", "")))
+            self._short_text = " ".join(parts).lower()
+        return self._short_text
+
+    @property
+    def full_hits(self):
+        """FULL_TEXT_ENGINE hits for full_text, scanned once"""
+        if self._full_hits is None:
+            self._full_hits = FULL_TEXT_ENGINE.scan(self.full_text)
+        return self._full_hits
+
+    @property
+    def short_hits(self):
+        """SHORT_TEXT_ENGINE hits for short_text, scanned once"""
+        if self._short_hits is None:
+            self._short_hits = SHORT_TEXT_ENGINE.scan(self.short_text)
+        return self._short_hits
+
+    @property
+    def buttons(self):
+        """All buttons in the component tree, extracted once"""
+        if self._buttons is None:
+            self._buttons = get_message_buttons(self.data)
+        return self._buttons
+
+    @property
+    def scenario_key(self):
+        """create_scenario_key for this message, computed once"""
+        if self._scenario_key is None:
+            self._scenario_key = create_scenario_key(self)
+        return self._scenario_key
+
+    def role(self, button):
+        """ButtonRole flags of one of this message's buttons, classified once"""
+        if self._roles is None:
+            self._roles = {id(btn): classify_button(btn) for btn in self.buttons}
+        role = self._roles.get(id(button))
+        return classify_button(button) if role is None else role
+
+    def is_navigation(self, button):
+        return bool(self.role(button) & ButtonRole.NAVIGATION)
+
+    def is_backpack(self, button):
+        return bool(self.role(button) & ButtonRole.BACKPACK)
+
+    def is_start(self, button):
+        return bool(self.role(button) & ButtonRole.START)
+
+# --- KEYWORD ENGINE ---
+class KeywordHits:
+    """Result of one KeywordEngine scan: the set of indicators present in the text"""
+
+    __slots__ = ("engine", "words")
+
+    def __init__(self, engine, words):
+        self.engine = engine
+        self.words = words
+
+    def __contains__(self, category):
+        return not self.words.isdisjoint(self.engine.category_sets[category])
+
+    def get(self, category, default=None):
+        """Matched indicators of a category in list order (first one is what an `in` loop would stop at)"""
+        if category not in self:
+            return default
+        return [word for word in self.engine.categories[category] if word in self.words]
+
+    def as_dict(self):
+        return {name: self.get(name) for name in self.engine.categories if name in self}
+
+
+class KeywordEngine:
+    """Multi-pattern substring matcher compiled once from category keyword lists.
+
+    All indicators are merged into one prefix-trie regex, so a single scan of
+    the text finds every indicator of every category. Shorter indicators that
+    sit inside a longer match are credited through a precomputed table, and the
+    few that can overlap the end of a match are confirmed with a plain `in`.
+    """
+
+    def __init__(self, categories):
+        self.categories = {name: list(indicators) for name, indicators in categories.items()}
+        self.category_sets = {name: frozenset(indicators) for name, indicators in self.categories.items()}
+
+        words = sorted(set().union(*self.category_sets.values()))
+        self._contained = {word: frozenset(other for other in words if other in word) for word in words}
+        self._straddling = {}
+        for word in words:
+            straddling = tuple(other for other in words if other not in word and any(
+                other.startswith(word[i:]) for i in range(1, len(word))))
+            if straddling:
+                self._straddling[word] = straddling
+        self.pattern = re.compile(self._trie_pattern(words))
+
+    @staticmethod
+    def _trie_pattern(words):
+        trie = {}
+        for word in words:
+            node = trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node[""] = {}
+
+        def build(node):
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ""
+            body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+            if "" in node:
+                body = "(?:" + body + ")?"  # greedy: prefer the longest indicator
+            return body
+
+        return build(trie)
+
+    def scan(self, text):
+        """Find every indicator present in text with one regex pass"""
+        words = set()
+        for word in set(self.pattern.findall(text)):
+            words |= self._contained[word]
+            for other in self._straddling.get(word, ()):
+                if other in text:
+                    words |= self._contained[other]
+        return KeywordHits(self, words)
+
+RANDOM_EVENT_INDICATORS = [
+    "the shop sale just started",
+    "i am very bored so here is a boring event",
+    "let's see how big your knowledge is",
+    "guess guess guess",
+    "microsoft is trying to buy discord again",
+    "skype is trying to beat discord again",
+    "they've got airpods",
+    "karen is starting a fight",
+    "your immune system is under attack",
+    "windows sucks lol",
+    "lol imagine using skype",
+    "jerk",
+    "frick off karen",
+    "disinfect",
+    "trivia night",
+    "let's see who's the smartest person here",
+    "what an absolute gamer",
+    "gamers are gaming in the game",
+    "someone posted an idea on reddit",
+    "try their game",
+    "f in the chat i just died in minecraft",
+    "press an f in the chat",
+    "random event",
+    "global event",
+    "server event",
+    "giveaway",
+    "drop sale",
+    "limited time",
+    "guess the price",
+    "what's the price",
+    "price between",
+    "health:",
+    "hp:",
+    "damage the",
+    "defeat",
+    "fight"
+]
+
+ADVENTURE_KEYWORDS = [
+    "adventure",
+    "spaceship",
+    "space station",
+    "planet",
+    "galaxy",
+    "alien",
+    "what do you do",
+    "you approach",
+    "you encounter",
+    "you came across",
+    "choose items",
+    "bring along",
+    "recommended",
+    "adventure summary",
+    "adventure again in",
+    "your adventure is over",
+    "adventure completed",
+    "adventure has ended",
+    "turns out",
+    "blob-like planet",
+    "odd eyes",
+    "kitchen"
+]
+
+COOLDOWN_KEYWORDS = [
+    "adventure again in",
+    "try again in",
+    "cooldown",
+    "wait",
+    "minutes",
+    "seconds",
+    "hours"
+]
+
+COMPLETION_SIGNS = [
+    "adventure summary",
+    "adventure again in",
+    "your adventure is over",
+    "adventure completed",
+    "thanks for playing",
+    "final results",
+    "you lost all items",
+    "summary"
+]
+
+START_BUTTON_INDICATORS = [
+    "choose items",
+    "bring along",
+    "recommended",
+    "adventure options",
+    "select adventure",
+    "pick items"
+]
+
+NAVIGATION_NEEDED_SIGNS = [
+    "nothing interesting happened",
+    "you passed a star",
+    "you found",
+    "you discovered",
+    "you encountered",
+    "turns out",
+    "it seems",
+    "you feel",
+    "blob-like planet",
+    "odd eyes",
+    "kitchen"
+]
+
+SCENARIO_KEY_KEYWORDS = [
+    "alien", "probe", "spaceship", "planet", "toxic", "dangerous",
+    "kitchen", "food", "telescope", "repair", "star", "fuel",
+    "transmission", "signal", "blob", "radioactive", "chemicals", "odd eyes"
+]
+
+SCENARIO_CHOICES = {
+    # Choose Items Phase
+    "choose_items": {
+        "keywords": ["choose items", "bring along", "recommended"],
+        "best_choices": {
+            "start": 15,
+            "begin": 15,
+            "go": 14
+        },
+        "avoid_choices": {
+            "equip all": 2,
+            "cancel": 1
+        }
+    },
+    # Alien Encounters
+    "alien": {
+        "keywords": ["alien", "probe", "abduct", "space", "extraterrestrial"],
+        "best_choices": {
+            "talk": 10,
+            "sit back": 10,
+            "enjoy": 10,
+            "cooperate": 9,
+            "be friendly": 8,
+            "do": 7,
+            "try": 6
+        },
+        "avoid_choices": {
+            "attack": 1,
+            "fight": 2,
+            "resist": 3,
+            "probe": 4
+        }
+    },
+    # Blob Planet
+    "blob_planet": {
+        "keywords": ["blob-like planet", "blob", "elusive blob", "grab one"],
+        "best_choices": {
+            "grab one": 10,
+            "take": 9,
+            "collect": 8,
+            "inspect": 7
+        },
+        "avoid_choices": {
+            "ignore": 2,
+            "flee": 3
+        }
+    },
+    # Dangerous Planets
+    "dangerous_planet": {
+        "keywords": ["toxic", "radioactive", "dangerous", "chemicals", "poison"],
+        "best_choices": {
+            "distant scan": 10,
+            "scan": 9,
+            "observe": 8,
+            "avoid": 8,
+            "leave": 7
+        },
+        "avoid_choices": {
+            "land": 2,
+            "explore": 3,
+            "approach": 3
+        }
+    },
+    # Kitchen/Food Scenarios with Angry Alien
+    "kitchen_alien": {
+        "keywords": ["kitchen", "food", "eat", "cook", "shady stuff", "angry alien"],
+        "best_choices": {
+            "flee": 15,
+            "leave": 10,
+            "run": 10
+        },
+        "avoid_choices": {
+            "inspect": 2,
+            "ignore": 3,
+            "eat": 1,
+            "approach": 1
+        }
+    },
+    # Technical/Repair Scenarios
+    "technical_repair": {
+        "keywords": ["telescope", "repair", "fix", "broken", "technical"],
+        "best_choices": {
+            "try and fix": 10,
+            "repair": 9,
+            "fix": 9,
+            "examine": 7
+        },
+        "avoid_choices": {
+            "flee": 2,
+            "ignore": 3,
+            "destroy": 1
+        }
+    },
+    # Space Objects
+    "space_objects": {
+        "keywords": ["star", "object", "strange", "floating", "shooting star"],
+        "best_choices": {
+            "reach for it": 10,
+            "collect": 10,
+            "inspect": 9,
+            "wish": 8,
+            "take picture": 7,
+            "grab": 7
+        },
+        "avoid_choices": {
+            "flee": 2,
+            "ignore": 3,
+            "avoid": 3
+        }
+    },
+    # Fuel/Resource Management
+    "fuel_resources": {
+        "keywords": ["fuel", "ran out", "empty", "resource", "energy"],
+        "best_choices": {
+            "search planet": 10,
+            "search": 9,
+            "look for": 8,
+            "find": 7
+        },
+        "avoid_choices": {
+            "give up": 1,
+            "urinate": 2
+        }
+    },
+    # Communication/Transmission
+    "communication": {
+        "keywords": ["transmission", "signal", "communication", "message", "deep space"],
+        "best_choices": {
+            "respond": 10,
+            "answer": 9,
+            "investigate": 8,
+            "decode": 8
+        },
+        "avoid_choices": {
+            "ignore": 3
+        }
+    },
+    # Odd Eyes Encounter
+    "odd_eyes": {
+        "keywords": ["odd eyes"],
+        "best_choices": {
+            "flee": 15
+        },
+        "avoid_choices": {
+            "attack": 1,
+            "fight": 1,
+            "approach": 1,
+            "inspect": 1
+        }
+    }
+}
+
+# Text with embed fields (MessageView.full_text)
+FULL_TEXT_ENGINE = KeywordEngine({
+    "random_event": RANDOM_EVENT_INDICATORS,
+    "adventure": ADVENTURE_KEYWORDS,
+    "cooldown": COOLDOWN_KEYWORDS,
+    "completion": COMPLETION_SIGNS,
+})
+
+# Content, descriptions and titles only (MessageView.short_text)
+SHORT_TEXT_ENGINE = KeywordEngine(dict(
+    {
+        "start_button": START_BUTTON_INDICATORS,
+        "navigation_needed": NAVIGATION_NEEDED_SIGNS,
+        "scenario_key": SCENARIO_KEY_KEYWORDS,
+    },
+    **{"scenario:" + name: data["keywords"] for name, data in SCENARIO_CHOICES.items()}
+))
+
 # --- CHOICE MEMORY SYSTEM ---
+class ChoiceStore:
+    """SQLite (WAL) store for choice memory, one row per (scenario_key, label)"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS choices (
+            scenario_key TEXT NOT NULL,
+            label TEXT NOT NULL,
+            success_count INTEGER NOT NULL DEFAULT 0,
+            failure_count INTEGER NOT NULL DEFAULT 0,
+            last_used TEXT,
+            reward_total REAL NOT NULL DEFAULT 0,
+            reward_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (scenario_key, label)
+        ) WITHOUT ROWID
+    """
+    SCENARIO_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS scenarios (
+            scenario_key TEXT PRIMARY KEY,
+            signature TEXT NOT NULL
+        ) WITHOUT ROWID
+    """
+    UPSERT = """
+        INSERT INTO choices (scenario_key, label, success_count, failure_count, last_used, reward_total, reward_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (scenario_key, label) DO UPDATE SET
+            success_count = excluded.success_count,
+            failure_count = excluded.failure_count,
+            last_used = excluded.last_used,
+            reward_total = excluded.reward_total,
+            reward_count = excluded.reward_count
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(self.SCHEMA)
+        self.conn.execute(self.SCENARIO_SCHEMA)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < SCENARIO_FINGERPRINT_VERSION:
+            # Fingerprints of an older text reduction never match new ones; the choices themselves are kept
+            self.conn.execute("DELETE FROM scenarios")
+            self.conn.execute(f"PRAGMA user_version = {SCENARIO_FINGERPRINT_VERSION}")
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(choices)")}
+        for column, definition in (("reward_total", "REAL NOT NULL DEFAULT 0"), ("reward_count", "INTEGER NOT NULL DEFAULT 0")):
+            if column not in columns:  # Databases created before outcome tracking
+                self.conn.execute(f"ALTER TABLE choices ADD COLUMN {column} {definition}")
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM choices").fetchone()[0]
+
+    def scenario(self, scenario_key):
+        """All remembered labels of one scenario as {label: stats}"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT label, success_count, failure_count, last_used, reward_total, reward_count "
+                "FROM choices WHERE scenario_key = ?",
+                (scenario_key,)
+            ).fetchall()
+        return {label: {'success_count': success, 'failure_count': failure, 'last_used': last_used,
+                        'reward_total': reward_total, 'reward_count': reward_count}
+                for label, success, failure, last_used, reward_total, reward_count in rows}
+
+    def scenarios(self):
+        """All scenario fingerprints as [(scenario_key, signature tuple)]"""
+        with self.lock:
+            rows = self.conn.execute("SELECT scenario_key, signature FROM scenarios").fetchall()
+        return [(scenario_key, tuple(int(value) for value in signature.split(","))) for scenario_key, signature in rows]
+
+    def upsert_many(self, rows, scenarios=()):
+        """Write [(scenario_key, label, stats)] and [(scenario_key, signature)] in one transaction"""
+        params = [(scenario_key, label, stats.get('success_count', 0), stats.get('failure_count', 0), stats.get('last_used'),
+                   stats.get('reward_total', 0.0), stats.get('reward_count', 0))
+                  for scenario_key, label, stats in rows]
+        scenario_params = [(scenario_key, ",".join(map(str, signature))) for scenario_key, signature in scenarios]
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(self.UPSERT, params)
+                self.conn.executemany("INSERT OR REPLACE INTO scenarios (scenario_key, signature) VALUES (?, ?)", scenario_params)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def upsert(self, scenario_key, label, stats):
+        self.upsert_many([(scenario_key, label, stats)])
+
+    def checkpoint(self):
+        with self.lock:
+            self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def migrate_pickle(self, pickle_path):
+        """One-time import of the old pickled choice_memory dict; returns rows imported"""
+        if not os.path.exists(pickle_path) or self.count():
+            return 0
+        with open(pickle_path, 'rb') as f:
+            legacy = pickle.load(f)
+        rows = [(scenario_key, label, stats)
+                for scenario_key, labels in legacy.items()
+                for label, stats in labels.items()]
+        self.upsert_many(rows)
+        os.replace(pickle_path, pickle_path + ".migrated")
+        return len(rows)
+
+class ChoiceWriteBehind:
+    """Coalesces remembered choices and writes them to a ChoiceStore on a background thread.
+
+    A batch is flushed once the oldest pending change is CHOICE_FLUSH_INTERVAL
+    seconds old or CHOICE_FLUSH_BATCH rows are pending, whichever comes first,
+    as one transaction. flush() writes everything synchronously for shutdown.
+    A failed write keeps its rows and isn't retried by the thread for another
+    interval, so a locked or full database can't turn the batch trigger into
+    a busy loop.
+    """
+
+    def __init__(self, store, interval=None, max_pending=None):
+        self.store = store
+        self.interval = CHOICE_FLUSH_INTERVAL if interval is None else interval
+        self.max_pending = CHOICE_FLUSH_BATCH if max_pending is None else max_pending
+        self.cond = Condition()
+        self.write_lock = Lock()  # Keeps batches in order between the thread and flush()
+        self.pending = {}  # (scenario_key, label) -> stats snapshot
+        self.pending_scenarios = {}  # scenario_key -> signature
+        self.first_dirty = None
+        self.retry_at = None  # Set after a failed write: no background retry before this
+        self.stopped = False
+        self.flushes = 0
+        self.thread = Thread(target=self._run, name="choice-flush", daemon=True)
+        self.thread.start()
+
+    def mark_dirty(self, scenario_key, label, stats):
+        with self.cond:
+            self.pending[(scenario_key, label)] = dict(stats)
+            self._touch()
+
+    def mark_scenario(self, scenario_key, signature):
+        with self.cond:
+            self.pending_scenarios[scenario_key] = signature
+            self._touch()
+
+    def _touch(self):
+        if self.first_dirty is None:
+            self.first_dirty = time.monotonic()
+            self.cond.notify()  # Start the flush timer
+        elif len(self.pending) >= self.max_pending:
+            self.cond.notify()
+
+    def _due(self):
+        now = time.monotonic()
+        if self.retry_at is not None and now < self.retry_at:
+            return False
+        if len(self.pending) >= self.max_pending:
+            return True
+        return self.first_dirty is not None and now - self.first_dirty >= self.interval
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.stopped and not self._due():
+                    if self.first_dirty is None:
+                        self.cond.wait()
+                    else:
+                        wake_at = max(self.first_dirty + self.interval, self.retry_at or 0.0)
+                        self.cond.wait(max(0.0, wake_at - time.monotonic()))
+                if self.stopped:
+                    return
+            self.flush()
+
+    def flush(self):
+        """Write every pending change now; returns the number of rows written"""
+        with self.write_lock:
+            with self.cond:
+                rows = [(scenario_key, label, stats) for (scenario_key, label), stats in self.pending.items()]
+                scenarios = list(self.pending_scenarios.items())
+                self.pending = {}
+                self.pending_scenarios = {}
+                self.first_dirty = None
+            if not rows and not scenarios:
+                return 0
+            try:
+                self.store.upsert_many(rows, scenarios)
+                self.flushes += 1
+                self.retry_at = None
+                return len(rows)
+            except Exception as e:
+                print(f"❌ Error flushing choice memory: {e}")
+                with self.cond:
+                    for scenario_key, label, stats in rows:
+                        self.pending.setdefault((scenario_key, label), stats)  # Keep newer snapshots
+                    for scenario_key, signature in scenarios:
+                        self.pending_scenarios.setdefault(scenario_key, signature)
+                    if self.first_dirty is None:
+                        self.first_dirty = time.monotonic()
+                    self.retry_at = time.monotonic() + self.interval
+                return 0
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+        self.thread.join(timeout=5)
+        return self.flush()
+
+choice_store = None
+choice_writer = None
+
 def load_choice_memory():
-    """Load choice memory from file"""
-    global choice_memory
+    """Open the choice memory store, migrating the old pickle file on first run"""
+    global choice_memory, choice_index, choice_store, choice_writer, scenario_index
+    if choice_writer is not None:
+        choice_writer.flush()  # The cache is reset below, so the store must be current
+    choice_memory = {}  # Read-through cache: scenario_key -> {label: stats}
+    choice_index = {}
     try:
-        if os.path.exists(CHOICE_MEMORY_FILE):
-            with open(CHOICE_MEMORY_FILE, 'rb') as f:
-                choice_memory = pickle.load(f)
-            print(f"✅ Loaded {len(choice_memory)} remembered choices")
+        if choice_store is None:
+            choice_store = ChoiceStore(CHOICE_MEMORY_DB)
+        if choice_writer is None:
+            choice_writer = ChoiceWriteBehind(choice_store)
+        scenario_index = ScenarioIndex()
+        for scenario_key, signature in choice_store.scenarios():
+            scenario_index.add(scenario_key, signature)
+        migrated = choice_store.migrate_pickle(CHOICE_MEMORY_FILE)
+        if migrated:
+            print(f"📦 Migrated {migrated} choices from {CHOICE_MEMORY_FILE} to {CHOICE_MEMORY_DB}")
+        total = choice_store.count()
+        if total:
+            print(f"✅ Loaded {total} remembered choices ({len(scenario_index.signatures)} scenario fingerprints)")
         else:
-            choice_memory = {}
             print("📝 Starting with empty choice memory")
     except Exception as e:
         print(f"❌ Error loading choice memory: {e}")
-        choice_memory = {}
 
 def save_choice_memory():
-    """Save choice memory to file"""
+    """Flush pending choices and checkpoint the choice memory WAL"""
+    if choice_store is None:
+        return
     try:
-        with open(CHOICE_MEMORY_FILE, 'wb') as f:
-            pickle.dump(choice_memory, f)
-        print(f"💾 Saved {len(choice_memory)} choices to memory at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
+        written = choice_writer.flush() if choice_writer is not None else 0
+        choice_store.checkpoint()
+        print(f"💾 Saved {written} pending choices to memory at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
     except Exception as e:
         print(f"❌ Error saving choice memory: {e}")
 
-def create_scenario_key(content, embeds):
-    """Create unique key for scenario"""
-    all_text = content.lower()
-    for embed in embeds:
-        all_text += " " + str(embed.get("description", "")).lower()
-        all_text += " " + str(embed.get("title", "")).lower()
+def normalize_label(label):
+    """Case- and whitespace-insensitive form of a button label"""
+    return " ".join(label.lower().split())
+
+def choice_score(stats):
+    """(expected reward per use, click success score): observed rewards rank first"""
+    reward_count = stats.get('reward_count', 0)
+    expected_reward = stats.get('reward_total', 0.0) / reward_count if reward_count else 0.0
+    success_rate = stats['success_count'] / max(1, stats['success_count'] + stats['failure_count'])
+    return (expected_reward, success_rate * 100 + stats['success_count'])
+
+def _best_for_label(choices, normalized):
+    """Best (score, label) among remembered labels that normalize to the same text"""
+    return max(((choice_score(stats), label) for label, stats in choices.items()
+                if normalize_label(label) == normalized), default=None)
+
+def get_scenario_index(scenario_key):
+    """{normalized label: (score, remembered label)} for a scenario, built once"""
+    index = choice_index.get(scenario_key)
+    if index is None:
+        index = {}
+        for label, stats in get_scenario_choices(scenario_key).items():
+            normalized = normalize_label(label)
+            if normalized:
+                entry = (choice_score(stats), label)
+                if normalized not in index or entry > index[normalized]:
+                    index[normalized] = entry
+        choice_index[scenario_key] = index
+    return index
+
+def close_choice_memory():
+    """Final flush on shutdown: stop the write-behind thread, then checkpoint"""
+    global choice_writer
+    if choice_writer is not None:
+        choice_writer.stop()
+        choice_writer = None
+    save_choice_memory()
 
-    key_words = []
-    important_keywords = [
-        "alien", "probe", "spaceship", "planet", "toxic", "dangerous",
-        "kitchen", "food", "telescope", "repair", "star", "fuel",
-        "transmission", "signal", "blob", "radioactive", "chemicals", "odd eyes"
-    ]
+def get_scenario_choices(scenario_key):
+    """Remembered {label: stats} for a scenario, read through the in-memory cache"""
+    choices = choice_memory.get(scenario_key)
+    if choices is None:
+        choices = {}
+        if choice_store is not None:
+            try:
+                choices = choice_store.scenario(scenario_key)
+            except Exception as e:
+                print(f"❌ Error reading choice memory: {e}")
+        choice_memory[scenario_key] = choices
+    return choices
+
+class ScenarioIndex:
+    """MinHash signatures of scenario texts with an LSH index over them.
+
+    Texts are the scenario descriptions only (no embed titles), reduced to
+    word-bigram shingles after the phrasing every scenario shares ("you came
+    across", "what do you do") and filler words are dropped, so only what
+    actually happens is compared. Each signature holds
+    SCENARIO_MINHASH_SIZE minimum hashes. Signatures are split into
+    SCENARIO_LSH_BANDS bands, and any shared band makes a known scenario a
+    candidate. The candidate whose signatures agree most is the nearest
+    scenario if it passes SCENARIO_SIMILARITY_THRESHOLD (estimated Jaccard).
+    """
+
+    PRIME = (1 << 61) - 1
+    FILLER_WORDS = frozenset(
+        "a an the you your you're it its is are was be to of in on at by for and or "
+        "what do does will would could can now there this that with near".split()
+    )
+    BOILERPLATE_PATTERN = re.compile(
+        r"\b(?:space adventure|you (?:came|come|run|ran) across|you (?:encounter(?:ed)?|see|saw|spot(?:ted)?|notice[d]?)"
+        r"|what (?:do|will|would|should) you do|while (?:exploring|drifting|flying))\b"
+    )
 
-    for keyword in important_keywords:
-        if keyword in all_text:
-            key_words.append(keyword)
+    def __init__(self, num_hashes=None, bands=None, threshold=None):
+        self.num_hashes = SCENARIO_MINHASH_SIZE if num_hashes is None else num_hashes
+        self.bands = SCENARIO_LSH_BANDS if bands is None else bands
+        self.rows = self.num_hashes // self.bands
+        self.threshold = SCENARIO_SIMILARITY_THRESHOLD if threshold is None else threshold
+        rng = random.Random(SCENARIO_MINHASH_SEED)  # Fixed, so stored signatures stay comparable
+        self.coefficients = [(rng.randrange(1, self.PRIME), rng.randrange(self.PRIME)) for _ in range(self.num_hashes)]
+        self.buckets = {}  # (band, band values) -> [scenario_key]
+        self.signatures = {}  # scenario_key -> signature
+
+    @classmethod
+    def shingles(cls, text):
+        text = cls.BOILERPLATE_PATTERN.sub(" ", text)
+        words = [word for word in re.findall(r"[a-z]+(?:'[a-z]+)?", text) if word not in cls.FILLER_WORDS]
+        if len(words) < 2:
+            return set(words)
+        return {words[i] + " " + words[i + 1] for i in range(len(words) - 1)}
+
+    def signature(self, text):
+        """MinHash signature of text, or None when it has no words"""
+        hashes = [zlib.crc32(shingle.encode()) for shingle in self.shingles(text)]
+        if not hashes:
+            return None
+        prime = self.PRIME
+        return tuple(min((a * h + b) % prime for h in hashes) for a, b in self.coefficients)
+
+    def _bands(self, signature):
+        rows = self.rows
+        return [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def add(self, scenario_key, signature):
+        if len(signature) != self.num_hashes or scenario_key in self.signatures:
+            return
+        self.signatures[scenario_key] = signature
+        for band_key in self._bands(signature):
+            self.buckets.setdefault(band_key, []).append(scenario_key)
+
+    def nearest(self, signature):
+        """(scenario_key, similarity) of the closest known scenario above the threshold, else (None, best similarity)"""
+        candidates = set()
+        for band_key in self._bands(signature):
+            candidates.update(self.buckets.get(band_key, ()))
+
+        best_key, best_similarity = None, 0.0
+        for scenario_key in candidates:
+            known = self.signatures[scenario_key]
+            similarity = sum(1 for a, b in zip(signature, known) if a == b) / self.num_hashes
+            if similarity > best_similarity or (similarity == best_similarity and best_key is not None and scenario_key < best_key):
+                best_key, best_similarity = scenario_key, similarity
+
+        if best_similarity >= self.threshold:
+            return best_key, best_similarity
+        return None, best_similarity
+
+scenario_index = ScenarioIndex()
+
+def create_scenario_key(view):
+    """Create unique key for scenario, reusing the key of the nearest known scenario"""
+    all_text = view.short_text
+    key_words = view.short_hits.get("scenario_key", [])
 
     if not key_words:
-        return all_text[:50].strip()
-
-    return "_".join(sorted(key_words))
+        legacy_key = all_text[:50].strip()
+    else:
+        legacy_key = "_".join(sorted(key_words))
+
+    # Fingerprint the description alone: the shared "Space Adventure" title would pull prompts together
+    description = " ".join([view.content] + [str(embed.get("description", "")) for embed in view.embeds]).lower()
+    signature = scenario_index.signature(description)
+    if signature is None:
+        return legacy_key
+
+    scenario_key, similarity = scenario_index.nearest(signature)
+    if scenario_key is not None:
+        if scenario_key != legacy_key:
+            print(f"🧬 Scenario matched '{scenario_key[:30]}' (similarity {similarity:.2f})")
+        return scenario_key
+
+    # New scenario: keep the keyword key (and any choices remembered under it) unless a
+    # different-looking scenario already owns it
+    scenario_key = legacy_key
+    if scenario_key in scenario_index.signatures:
+        scenario_key = f"{legacy_key}#{zlib.crc32(','.join(map(str, signature)).encode()):08x}"
+    scenario_index.add(scenario_key, signature)
+    if choice_writer is not None:
+        choice_writer.mark_scenario(scenario_key, signature)
+    print(f"🧬 New scenario fingerprint: '{scenario_key[:30]}'")
+    return scenario_key
 
 def remember_choice(scenario_key, chosen_button_label, success_outcome):
     """Remember a specific choice for a scenario"""
-    global choice_memory
-
-    if scenario_key not in choice_memory:
-        choice_memory[scenario_key] = {}
-
-    if chosen_button_label not in choice_memory[scenario_key]:
-        choice_memory[scenario_key][chosen_button_label] = {
-            'success_count': 0,
-            'failure_count': 0,
-            'last_used': None
-        }
+    choices = get_scenario_choices(scenario_key)
 
+    stats = _choice_stats(choices, chosen_button_label)
     if success_outcome:
-        choice_memory[scenario_key][chosen_button_label]['success_count'] += 1
+        stats['success_count'] += 1
     else:
-        choice_memory[scenario_key][chosen_button_label]['failure_count'] += 1
-
-    choice_memory[scenario_key][chosen_button_label]['last_used'] = datetime.now().isoformat()
+        stats['failure_count'] += 1
 
+    stats['last_used'] = datetime.now().isoformat()
+    _update_choice(scenario_key, choices, chosen_button_label)
     print(f"🧠 Remembered choice: {chosen_button_label} for scenario: {scenario_key[:30]}...")
-    save_choice_memory()
+
+def _choice_stats(choices, label):
+    if label not in choices:
+        choices[label] = {
+            'success_count': 0,
+            'failure_count': 0,
+            'last_used': None,
+            'reward_total': 0.0,
+            'reward_count': 0
+        }
+    return choices[label]
+
+def _update_choice(scenario_key, choices, label):
+    """Refresh the scenario's label index for one changed label and queue it for writing"""
+    stats = choices[label]
+    normalized = normalize_label(label)
+    if normalized:
+        index = get_scenario_index(scenario_key)
+        entry = (choice_score(stats), label)
+        current = index.get(normalized)
+        if current is None or entry >= current:
+            index[normalized] = entry
+        elif current[1] == label:
+            index[normalized] = _best_for_label(choices, normalized)  # Best label got worse
+
+    if choice_writer is not None:
+        choice_writer.mark_dirty(scenario_key, label, stats)
 
 def get_remembered_choice(scenario_key, available_buttons):
-    """Get best remembered choice for a scenario"""
-    if scenario_key not in choice_memory:
+    """Get best remembered choice for a scenario (exact normalized label match)"""
+    index = get_scenario_index(scenario_key)
+    if not index:
         return None
 
     best_button = None
-    best_score = -1
+    best_score = None
 
     for button in available_buttons:
-        button_label = button['label'].lower().strip()
+        entry = index.get(normalize_label(button.label))
+        if entry is not None and (best_score is None or entry[0] > best_score):
+            best_score = entry[0]
+            best_button = button
+            print(f"🧠 Found remembered choice: {button.label} (expected reward: {best_score[0]:.0f}, score: {best_score[1]:.1f})")
 
-        if not button_label or button_label == '':
-            continue
+    return best_button
 
-        for remembered_label, stats in choice_memory[scenario_key].items():
-            if (button_label == remembered_label.lower() or 
-                button_label in remembered_label.lower() or 
-                remembered_label.lower() in button_label):
+# --- OUTCOME ATTRIBUTION ---
+COIN_PATTERN = re.compile(r"⏣\s*([\d,]+)")
+ITEM_COUNT_PATTERN = re.compile(r"\b(\d+)\s*x\b")
+GAIN_WORDS = re.compile(r"\b(?:found|got|gained|gain|earned|received|won|obtained|collected|gave|given|rewards?|loot)\b")
+LOSS_WORDS = re.compile(r"\b(?:lost|lose|paid|spent|stole|stolen|dropped|took)\b")
+REWARD_FIELD_NAMES = re.compile(r"\b(?:coins?|items?)\b")  # Summary fields that list what was gained
+CLAUSE_SPLIT = re.compile(r"[.!?]+")
+
+pending_choice = None    # Last clicked choice, waiting for the message that shows its outcome
+adventure_choices = []   # Choices of the current adventure, settled against its summary
+
+def parse_reward(view):
+    """Net (coins, items) gained in a message, or None if it mentions no amounts.
+
+    The content, each embed description and each embed field value are read
+    on their own, sentence by sentence; lines without punctuation stay in one
+    sentence. Every amount takes its sign from the nearest gain or loss word
+    before it. A field's name counts as coming before every sentence of its
+    value, so "Rewards" or "Items" covers a whole multi-line list. With nothing
+    before it, an amount takes the first word after it ("⏣ 200 was stolen");
+    amounts with neither are ignored.
+    """
+    parts = [(view.content, 0)]
+    for embed in view.embeds:
+        parts.append((str(embed.get("description", "")), 0))
+        for field in embed.get("fields") or ():
+            parts.append((str(field.get("value", "")), _field_sign(str(field.get("name", "")))))
+
+    coins = items = 0
+    found = False
+    for text, heading in parts:
+        for clause in CLAUSE_SPLIT.split(text.lower()):
+            reward = _clause_reward(clause, heading)
+            if reward is not None:
+                found = True
+                coins += reward[0]
+                items += reward[1]
+
+    return (coins, items) if found else None
+
+def _field_sign(name):
+    """Sign an embed field's name gives its value: -1 for a loss, 1 for a gain or a coins/items list, else 0"""
+    name = name.lower()
+    if LOSS_WORDS.search(name):
+        return -1
+    return 1 if GAIN_WORDS.search(name) or REWARD_FIELD_NAMES.search(name) else 0
+
+def _clause_reward(clause, heading):
+    """Signed (coins, items) of one sentence, or None if it has no amount with a sign"""
+    amounts = list(COIN_PATTERN.finditer(clause))
+    counts = list(ITEM_COUNT_PATTERN.finditer(clause))
+    if not amounts and not counts:
+        return None
+    verbs = sorted([(m.start(), 1) for m in GAIN_WORDS.finditer(clause)] +
+                   [(m.start(), -1) for m in LOSS_WORDS.finditer(clause)])
+    if heading:
+        verbs.insert(0, (-1, heading))  # The field name comes before the whole value
+    if not verbs:
+        return None
+    coins = sum(_amount_sign(verbs, m.start()) * int(m.group(1).replace(",", "")) for m in amounts)
+    items = sum(_amount_sign(verbs, m.start()) * int(m.group(1)) for m in counts)
+    return coins, items
+
+def _amount_sign(verbs, position):
+    """Sign of the last (position, sign) verb before `position`, else of the first one after it"""
+    sign = verbs[0][1]
+    for verb_position, verb_sign in verbs:
+        if verb_position > position:
+            break
+        sign = verb_sign
+    return sign
+
+def reward_value(reward):
+    """Coins-equivalent value of a (coins, items) reward"""
+    coins, items = reward
+    return coins + items * ITEM_REWARD_VALUE
+
+def record_choice_reward(scenario_key, label, reward, samples=1):
+    """Add an observed reward to a remembered choice"""
+    choices = get_scenario_choices(scenario_key)
+    stats = _choice_stats(choices, label)
+    stats['reward_total'] = stats.get('reward_total', 0.0) + reward
+    stats['reward_count'] = stats.get('reward_count', 0) + samples
+    _update_choice(scenario_key, choices, label)
+
+def track_choice(scenario_key, label, view):
+    """Remember a clicked choice so the next message's outcome is credited to it"""
+    global pending_choice
+    pending_choice = {'scenario_key': scenario_key, 'label': label, 'prompt': view.short_text, 'reward': None}
+    adventure_choices.append(pending_choice)
+
+def attribute_outcome(view):
+    """Credit the reward shown in the message after a choice to that choice"""
+    global pending_choice
+    if pending_choice is None or view.short_text == pending_choice['prompt']:
+        return
 
-                success_rate = stats['success_count'] / max(1, stats['success_count'] + stats['failure_count'])
-                score = success_rate * 100 + stats['success_count']
+    reward = parse_reward(view)
+    value = reward_value(reward) if reward else 0
+    pending_choice['reward'] = value
+    record_choice_reward(pending_choice['scenario_key'], pending_choice['label'], value)
+    print(f"💰 Outcome of '{pending_choice['label']}': {value:+.0f} (coins, items: {reward or (0, 0)})")
+    pending_choice = None
+
+def settle_adventure(view=None):
+    """Split whatever the adventure summary shows beyond the per-choice outcomes across its choices"""
+    global pending_choice, adventure_choices
+    choices, adventure_choices, pending_choice = adventure_choices, [], None
+    if not choices or view is None:
+        return
 
-                if score > best_score:
-                    best_score = score
-                    best_button = button
-                    print(f"🧠 Found remembered choice: {button['label']} (score: {score:.1f})")
+    reward = parse_reward(view)
+    if reward is None:
+        for choice in choices:  # No summary amounts: just close out unresolved choices
+            if choice['reward'] is None:
+                record_choice_reward(choice['scenario_key'], choice['label'], 0)
+        return
 
-    return best_button
+    attributed = sum(choice['reward'] or 0 for choice in choices)
+    share = (reward_value(reward) - attributed) / len(choices)
+    for choice in choices:
+        record_choice_reward(choice['scenario_key'], choice['label'], share,
+                             samples=1 if choice['reward'] is None else 0)
+    print(f"💰 Adventure summary {reward_value(reward):+.0f}: {share:+.0f} per choice over {len(choices)} choices")
 
 # --- RANDOM EVENT DETECTION ---
-def is_random_event(content, embeds, components):
+def is_random_event(view):
     """Determine if message is a random event from Dank Memer"""
-    all_text = content.lower()
-
-    for embed in embeds:
-        all_text += " " + str(embed.get("title", "")).lower()
-        all_text += " " + str(embed.get("description", "")).lower()
-        if embed.get("fields"):
-            for field in embed["fields"]:
-                all_text += " " + str(field.get("name", "")).lower()
-                all_text += " " + str(field.get("value", "")).lower()
-
-    random_event_indicators = [
-        "the shop sale just started",
-        "i am very bored so here is a boring event",
-        "let's see how big your knowledge is",
-        "guess guess guess",
-        "microsoft is trying to buy discord again",
-        "skype is trying to beat discord again",
-        "they've got airpods",
-        "karen is starting a fight",
-        "your immune system is under attack",
-        "windows sucks lol",
-        "lol imagine using skype",
-        "jerk",
-        "frick off karen",
-        "disinfect",
-        "trivia night",
-        "let's see who's the smartest person here",
-        "what an absolute gamer",
-        "gamers are gaming in the game",
-        "someone posted an idea on reddit",
-        "try their game",
-        "f in the chat i just died in minecraft",
-        "press an f in the chat",
-        "random event",
-        "global event",
-        "server event",
-        "giveaway",
-        "drop sale",
-        "limited time",
-        "guess the price",
-        "what's the price",
-        "price between",
-        "health:",
-        "hp:",
-        "damage the",
-        "defeat",
-        "fight"
-    ]
-
-    for indicator in random_event_indicators:
-        if indicator in all_text:
-            print(f"🎲 Random event detected: '{indicator}'")
-            return True
+    all_text = view.full_text
+    indicators = view.full_hits.get("random_event")
 
-    if components:
-        buttons = extract_all_buttons(components)
-        button_labels = [btn.get("label", "").lower() for btn in buttons]
+    if indicators:
+        print(f"🎲 Random event detected: '{indicators[0]}'")
+        return True
+
+    if view.components:
+        button_labels = [btn.label.lower() for btn in view.buttons]
 
         event_button_patterns = [
             "f", "windows sucks lol", "disinfect", "jerk", "frick off karen", "lol imagine using skype"
@@ -274,127 +1260,120 @@ def is_random_event(content, embeds, components):
         print("🎲 Price guessing event detected")
         return True
 
-    if "gained" in all_text and not any(indicator in all_text for indicator in random_event_indicators):
+    if "gained" in all_text:
         print("🚫 'gained' detected but not a clear random event - ignoring as random event")
         return False
 
     return False
 
 # --- ENHANCED BUTTON EXTRACTION ---
+Button = namedtuple("Button", ["custom_id", "label", "style", "disabled", "emoji", "url"])
+
+_button_memo = OrderedDict()  # (message id, component tree hash) -> tuple of Buttons
+
+def _make_button(comp):
+    return Button(
+        comp.get("custom_id") or "",
+        comp.get("label") or "",
+        comp.get("style", 1),
+        comp.get("disabled", False),
+        comp.get("emoji") or {},
+        comp.get("url") or ""
+    )
+
 def extract_all_buttons(components):
     """Enhanced extraction of buttons from Discord component structure"""
     buttons = []
 
-    print(f"🔍 Starting button search...")
-    print(f"📋 Raw components: {json.dumps(components, indent=2)[:500]}...")
+    if VERBOSE_LOGGING:
+        print(f"🔍 Starting button search...")
+        print(f"📋 Raw components: {json.dumps(components, indent=2)[:500]}...")
 
     if not components:
-        print("❌ No components provided")
         return buttons
 
-    def extract_from_component(comp, comp_index=0):
+    if isinstance(components, dict):
+        components = [components]
+
+    for comp in components:
         if not isinstance(comp, dict):
-            return
+            continue
 
         comp_type = comp.get("type")
-        print(f"🔧 Component {comp_index}: type={comp_type}")
-
         if comp_type == 1:
-            components_list = comp.get("components", [])
-            print(f"   🗂️ ActionRow with {len(components_list)} sub-components")
-
-            for i, sub_comp in enumerate(components_list):
+            for sub_comp in comp.get("components", []):
                 if isinstance(sub_comp, dict) and sub_comp.get("type") == 2:
-                    button_data = {
-                        "custom_id": sub_comp.get("custom_id", ""),
-                        "label": sub_comp.get("label", ""),
-                        "style": sub_comp.get("style", 1),
-                        "disabled": sub_comp.get("disabled", False),
-                        "emoji": sub_comp.get("emoji", {}),
-                        "url": sub_comp.get("url", ""),
-                        "raw": sub_comp
-                    }
-                    buttons.append(button_data)
-                    print(f"   🔘 Button {i}: '{button_data['label']}' (disabled: {button_data['disabled']})")
-
+                    buttons.append(_make_button(sub_comp))
         elif comp_type == 2:
-            button_data = {
-                "custom_id": comp.get("custom_id", ""),
-                "label": comp.get("label", ""),
-                "style": comp.get("style", 1),
-                "disabled": comp.get("disabled", False),
-                "emoji": comp.get("emoji", {}),
-                "url": comp.get("url", ""),
-                "raw": comp
-            }
-            buttons.append(button_data)
-            print(f"   🔘 Direct Button: '{button_data['label']}' (disabled: {button_data['disabled']})")
+            buttons.append(_make_button(comp))
 
-    if isinstance(components, list):
-        for i, component in enumerate(components):
-            extract_from_component(component, i)
-    elif isinstance(components, dict):
-        extract_from_component(components)
+    if VERBOSE_LOGGING:
+        for i, button in enumerate(buttons):
+            print(f"   🔘 Button {i}: '{button.label}' (disabled: {button.disabled})")
+        print(f"✅ Total buttons found: {len(buttons)}")
+    return buttons
 
-    print(f"✅ Total buttons found: {len(buttons)}")
+def _component_hash(components):
+    """Hash of what makes one edit's buttons differ from another's"""
+    if isinstance(components, dict):
+        components = [components]
+    shape = []
+    for comp in components:
+        if not isinstance(comp, dict):
+            continue
+        children = comp.get("components", []) if comp.get("type") == 1 else [comp]
+        for sub_comp in children:
+            if isinstance(sub_comp, dict) and sub_comp.get("type") == 2:
+                emoji = sub_comp.get("emoji") or {}
+                shape.append((sub_comp.get("custom_id"), sub_comp.get("label"), sub_comp.get("disabled"),
+                              sub_comp.get("style"), emoji.get("id"), emoji.get("name"), sub_comp.get("url")))
+        shape.append(None)  # Row boundary
+    return hash(tuple(shape))
+
+def get_message_buttons(msg_data):
+    """Buttons of a message payload, parsed once per message id and component tree.
+
+    Dank Memer edits adventure messages in place and its edit stamps can't
+    be trusted to change (or to be there at all), so the memo is keyed on a
+    hash of the buttons themselves; the id just keeps messages apart.
+    """
+    message_id = msg_data.get("id")
+    components = msg_data.get("components") or []
+    if not message_id:
+        return extract_all_buttons(components)
+
+    key = (message_id, _component_hash(components))
+    buttons = _button_memo.get(key)
+    if buttons is None:
+        buttons = tuple(extract_all_buttons(components))
+        _button_memo[key] = buttons
+        if len(_button_memo) > BUTTON_MEMO_SIZE:
+            _button_memo.popitem(last=False)
     return buttons
 
 # --- ADVENTURE MESSAGE FILTERING ---
-def is_adventure_message(content, embeds, components):
+def is_adventure_message(view):
     """Determine if message is adventure-related"""
-    all_text = content.lower()
-
-    for embed in embeds:
-        all_text += " " + str(embed.get("title", "")).lower()
-        all_text += " " + str(embed.get("description", "")).lower()
-        if embed.get("fields"):
-            for field in embed["fields"]:
-                all_text += " " + str(field.get("name", "")).lower()
-                all_text += " " + str(field.get("value", "")).lower()
+    all_text = view.full_text
+    components = view.components
 
-    if is_random_event(content, embeds, components):
+    if is_random_event(view):
         print("🚫 Random event detected - ignoring")
         return False
 
-    global waiting_for_interaction, waiting_for_navigation, waiting_for_start_button
-    if waiting_for_interaction or waiting_for_navigation or waiting_for_start_button:
+    if adventure_session.active:
         print("🎮 In adventure mode - treating message as adventure content")
         return True
 
-    clear_adventure_keywords = [
-        "adventure",
-        "spaceship",
-        "space station",
-        "planet",
-        "galaxy",
-        "alien",
-        "what do you do",
-        "you approach",
-        "you encounter",
-        "you came across",
-        "choose items",
-        "bring along",
-        "recommended",
-        "adventure summary",
-        "adventure again in",
-        "your adventure is over",
-        "adventure completed",
-        "adventure has ended",
-        "turns out",
-        "blob-like planet",
-        "odd eyes",
-        "kitchen"
-    ]
-
-    for keyword in clear_adventure_keywords:
-        if keyword in all_text:
-            print(f"✅ Adventure keyword detected: '{keyword}'")
-            return True
+    keywords = view.full_hits.get("adventure")
+    if keywords:
+        print(f"✅ Adventure keyword detected: '{keywords[0]}'")
+        return True
 
     if components:
-        buttons = extract_all_buttons(components)
+        buttons = view.buttons
         if buttons or any(comp.get("type") == 3 for comp in components):  # Check for select menus
-            button_labels = [btn.get("label", "").lower() for btn in buttons]
+            button_labels = [btn.label.lower() for btn in buttons]
             adventure_button_patterns = [">", "→", "inspect", "try", "approach", "take", "grab", "talk", "start"]
             non_adventure_button_patterns = ["basement", "bank", "couch", "identity theft", "gaslighting", "vandalism"]
 
@@ -409,444 +1388,201 @@ def is_adventure_message(content, embeds, components):
     print(f"❓ No clear adventure indicators in: {all_text[:100]}... Components: {len(components)}")
     return False
 
-def needs_start_button(content, embeds):
+def needs_start_button(view):
     """Determine if message needs a start button"""
-    all_text = content.lower()
-
-    for embed in embeds:
-        all_text += " " + str(embed.get("description", "")).lower()
-        all_text += " " + str(embed.get("title", "")).lower()
-
-    start_button_indicators = [
-        "choose items",
-        "bring along",
-        "recommended",
-        "adventure options",
-        "select adventure",
-        "pick items"
-    ]
-
-    return any(indicator in all_text for indicator in start_button_indicators)
-
-def is_start_button(button):
-    """Determine if button is a start button"""
-    label = button["label"].lower().strip()
-    custom_id = button["custom_id"].lower()
-
-    start_indicators = [
-        label == "start",
-        label == "begin",
-        label == "go",
-        label == "start adventure",
-        "start" in custom_id,
-        "begin" in custom_id,
-        custom_id.startswith("adventure-start:")
-    ]
-
-    return any(start_indicators)
+    return "start_button" in view.short_hits
 
 # --- ENHANCED COOLDOWN DETECTION ---
-def is_cooldown_message(content, embeds, components):
+def is_cooldown_message(view):
     """Determine if message contains cooldown information"""
-    all_text = content.lower()
-
-    for embed in embeds:
-        all_text += " " + str(embed.get("title", "")).lower()
-        all_text += " " + str(embed.get("description", "")).lower()
-        if embed.get("fields"):
-            for field in embed["fields"]:
-                all_text += " " + str(field.get("name", "")).lower()
-                all_text += " " + str(field.get("value", "")).lower()
-
-    cooldown_keywords = [
-        "adventure again in",
-        "try again in",
-        "cooldown",
-        "wait",
-        "minutes",
-        "seconds",
-        "hours"
-    ]
-
-    return any(keyword in all_text for keyword in cooldown_keywords) and not any(is_navigation_button(btn) for btn in extract_all_buttons(components))
-
-def extract_cooldown_time(content, embeds, buttons=None):
-    """Extract precise cooldown time from Discord message"""
-    all_text = content.lower()
-
-    for embed in embeds:
-        all_text += " " + str(embed.get("title", "")).lower()
-        all_text += " " + str(embed.get("description", "")).lower()
-        if embed.get("fields"):
-            for field in embed["fields"]:
-                all_text += " " + str(field.get("name", "")).lower()
-                all_text += " " + str(field.get("value", "")).lower()
-
-    if buttons:
-        for button in buttons:
-            button_label = button.get("label", "").lower()
-            if "adventure again in" in button_label and ("minute" in button_label or "hour" in button_label or "second" in button_label):
-                all_text += " " + button_label
-                print(f"🔘 Found cooldown in button label: '{button.get('label', '')}'")
-
-    time_patterns = [
-        (r"adventure again in (\d+)\s*minutes?", "minute"),
-        (r"adventure again in (\d+)\s*mins?", "minute"),
-        (r"adventure again in (\d+)\s*m\b", "minute"),
-        (r"adventure again in (\d+)\s*minute", "minute"),
-        (r"next adventure in (\d+)\s*minutes?", "minute"),
-        (r"try again in (\d+)\s*minutes?", "minute"),
-        (r"try again in (\d+)\s*mins?", "minute"),
-        (r"wait (\d+)\s*minutes?", "minute"),
-        (r"cooldown (\d+)\s*minutes?", "minute"),
-        (r"adventure again in (\d+)\s*hours?", "hour"),
-        (r"try again in (\d+)\s*hours?", "hour"),
-        (r"adventure again in (\d+)\s*seconds?", "second"),
-        (r"try again in (\d+)\s*seconds?", "second"),
-    ]
-
-    time_multipliers = {
-        'hour': 3600,
-        'minute': 60,
-        'second': 1
-    }
-
-    for pattern, time_type in time_patterns:
-        match = re.search(pattern, all_text)
-        if match:
-            time_value = int(match.group(1))
-            seconds = time_value * time_multipliers[time_type]
-            safety_buffer = random.randint(30, 90)
-            total_seconds = seconds + safety_buffer
-            print(f"⏰ COOLDOWN DETECTED: {time_value} {time_type}(s) + {safety_buffer}s buffer = {total_seconds}s total")
-            return total_seconds
+    return "cooldown" in view.full_hits and not any(view.is_navigation(btn) for btn in view.buttons)
+
+# Compound durations ("1 hour 3 minutes", "4m 12s") or a Discord timestamp after a
+# cooldown phrase, or a relative timestamp (<t:1700000000:R>) anywhere, matched in
+# a single scan of the text. Other timestamp styles elsewhere in the text are
+# event dates and the like, not the cooldown.
+_DURATION_PART = r"\d+\s*(?:hours?|hrs?|h|minutes?|mins?|m|seconds?|secs?|s)(?![a-z])"  # No \b: "1h30m" runs units together
+COOLDOWN_PATTERN = re.compile(
+    r"<t:(?P<epoch>\d+):[rR]>"
+    r"|(?:adventure again in|next adventure in|try again in|wait|cooldown)\s*(?:is|of|for|until|:)?\s*"
+    r"(?:<t:(?P<phrase_epoch>\d+)(?::[a-zA-Z])?>"
+    r"|(?P<duration>" + _DURATION_PART + r"(?:\s*(?:,|and)?\s*" + _DURATION_PART + r")*))"
+)
+DURATION_PART_PATTERN = re.compile(r"(\d+)\s*([hms])")
+DURATION_UNIT_SECONDS = {"h": 3600, "m": 60, "s": 1}
+COOLDOWN_BUFFER_MIN = 2  # Safety buffer added to a parsed cooldown (seconds)
+COOLDOWN_BUFFER_MAX = 8
+
+def parse_cooldown_ready_at(text, now=None):
+    """Return (absolute epoch time the cooldown in text expires, exact), or None.
+
+    Only a timestamp or a duration down to the second is exact; "4 minutes"
+    is rounded and may run up to a minute longer.
+    """
+    now = time.time() if now is None else now
+    parsed = None
+
+    for match in COOLDOWN_PATTERN.finditer(text):
+        epoch = match.group("epoch") or match.group("phrase_epoch")
+        if epoch:
+            if float(epoch) > now:
+                return float(epoch), True  # Always preferred
+            continue  # Already past: not a cooldown, fall back to a duration
+        if parsed is None:
+            parts = DURATION_PART_PATTERN.findall(match.group("duration"))
+            seconds = sum(int(value) * DURATION_UNIT_SECONDS[unit] for value, unit in parts)
+            parsed = now + seconds, any(unit == "s" for _, unit in parts)
+
+    return parsed
+
+def extract_cooldown_time(view):
+    """Extract precise cooldown from Discord message as (ready_at epoch time, exact)"""
+    all_text = view.full_text
+
+    for button in view.buttons:
+        button_label = button.label.lower()
+        if "adventure again in" in button_label:
+            all_text += " " + button_label
+            print(f"🔘 Found cooldown in button label: '{button.label}'")
+
+    now = time.time()
+    parsed = parse_cooldown_ready_at(all_text, now)
+
+    if parsed is not None:
+        ready_at, exact = parsed
+        safety_buffer = random.uniform(COOLDOWN_BUFFER_MIN, COOLDOWN_BUFFER_MAX)
+        ready_at += safety_buffer
+        print(f"⏰ COOLDOWN DETECTED: ready at {datetime.fromtimestamp(ready_at).strftime('%Y-%m-%d %H:%M:%S CET')} "
+              f"({max(0, ready_at - now):.0f}s incl. {safety_buffer:.1f}s buffer{'' if exact else ', rounded: padded further'})")
+        return ready_at, exact
 
     default_with_buffer = ROUND_DELAY + random.randint(30, 80)
     print(f"⏰ DEFAULT COOLDOWN: {default_with_buffer}s (no match found)")
-    return default_with_buffer
+    return now + default_with_buffer, False
 
-def is_truly_complete(content, embeds, buttons):
+def is_truly_complete(view):
     """Enhanced check for adventure completion"""
-    all_text = content.lower()
-
-    for embed in embeds:
-        all_text += " " + str(embed.get("title", "")).lower()
-        all_text += " " + str(embed.get("description", "")).lower()
-        if embed.get("fields"):
-            for field in embed["fields"]:
-                all_text += " " + str(field.get("name", "")).lower()
-                all_text += " " + str(field.get("value", "")).lower()
+    all_text = view.full_text
+    buttons = view.buttons
 
     print(f"🔍 Checking completion with text: {all_text[:200]}...")
 
     for btn in buttons:
-        if (btn.get("disabled", False) and 
-            btn.get("label", "").lower().startswith("adventure again in") and
-            "minute" in btn.get("label", "").lower()):
-            print(f"🏆 COMPLETION: Disabled 'Adventure again in' button detected: '{btn['label']}'")
+        if (btn.disabled and 
+            btn.label.lower().startswith("adventure again in") and
+            "minute" in btn.label.lower()):
+            print(f"🏆 COMPLETION: Disabled 'Adventure again in' button detected: '{btn.label}'")
             return True
 
-    true_completion_signs = [
-        "adventure summary",
-        "adventure again in",
-        "your adventure is over",
-        "adventure completed",
-        "thanks for playing",
-        "final results",
-        "you lost all items",
-        "summary"
-    ]
-
-    return any(sign in all_text for sign in true_completion_signs) and not any(is_navigation_button(btn) for btn in buttons)
+    return "completion" in view.full_hits and not any(view.is_navigation(btn) for btn in buttons)
 
 # --- ENHANCED BUTTON DETECTION ---
-def is_backpack_button(button):
-    """Determine backpack buttons (red)"""
-    emoji = button.get("emoji", {})
-    style = button.get("style", 1)
-    custom_id = button.get("custom_id", "").lower()
-    label = button.get("label", "").lower()
-
-    backpack_indicators = [
-        emoji.get("name") == "🎒",
-        "🎒" in str(button),
-        style == 4,  # Red
-        "inventory" in custom_id,
-        "backpack" in label,
-        "bag" in custom_id,
-        custom_id.startswith("adventure-progress:") or custom_id.startswith("adventure-backpackitem:")
-    ]
-
-    is_backpack = any(backpack_indicators)
-    if is_backpack:
-        print(f"🎒 BACKPACK DETECTED: '{button['label']}' (style: {style}, custom_id: {custom_id})")
-
-    return is_backpack
-
-def is_navigation_button(button):
-    """Determine navigation buttons (blue arrow or unlabeled)"""
-    label = button["label"].strip()
-    custom_id = button["custom_id"].lower()
-    emoji = button.get("emoji", {})
-    style = button.get("style", 1)
-
-    navigation_indicators = [
-        label == ">",
-        label == "→",
-        label == "▶",
-        "next" in custom_id,
-        "continue" in custom_id,
-        "forward" in custom_id,
-        style == 1 and label in [">", "→", "▶", "Continue", "Next"],
-        custom_id.startswith("adventure-next:") or custom_id.startswith("adventure-continue:"),
-        emoji.get("name") == "ArrowRightui" and emoji.get("id") == "1379166099895091251" and emoji.get("animated", False),
-        not label and not button["disabled"] and not custom_id.startswith("adventure-backpackitem:")
-    ]
-
-    is_nav = any(navigation_indicators)
-    if is_nav:
-        print(f"🧭 NAVIGATION DETECTED: '{label}' (style: {style}, custom_id: {custom_id}, emoji: {emoji})")
-
-    return is_nav
-
-def needs_navigation_after_choice(content, embeds):
+class ButtonRole(Flag):
+    """What a button does in an adventure; a button can carry several roles"""
+    CHOICE = 0
+    START = auto()
+    NAVIGATION = auto()
+    BACKPACK = auto()  # Red / inventory buttons, never clicked
+
+def button_signature(button):
+    """Stable shape of a button: Dank Memer reuses these with fresh custom_id suffixes"""
+    emoji = button.emoji
+    return (button.custom_id.split(":", 1)[0].lower(), button.label, button.style, button.disabled,
+            emoji.get("id"), emoji.get("name"), bool(emoji.get("animated")))
+
+@lru_cache(maxsize=BUTTON_ROLE_CACHE_SIZE)
+def _classify_signature(prefix, label, style, disabled, emoji_id, emoji_name, animated):
+    role = ButtonRole.CHOICE
+    lowered = label.lower().strip()
+    stripped = label.strip()
+
+    # Start buttons
+    if (lowered in ("start", "begin", "go", "start adventure") or
+            "start" in prefix or "begin" in prefix):
+        role |= ButtonRole.START
+
+    # Backpack buttons (red)
+    if (style == 4 or emoji_name == "🎒" or "🎒" in label or "backpack" in lowered or
+            "inventory" in prefix or "bag" in prefix or
+            prefix in ("adventure-progress", "adventure-backpackitem")):
+        role |= ButtonRole.BACKPACK
+
+    # Navigation buttons (blue arrow or unlabeled)
+    if (stripped in (">", "→", "▶") or
+            "next" in prefix or "continue" in prefix or "forward" in prefix or
+            (style == 1 and stripped in ("Continue", "Next")) or
+            (emoji_name == "ArrowRightui" and emoji_id == "1379166099895091251" and animated) or
+            (not stripped and not disabled and prefix != "adventure-backpackitem")):
+        role |= ButtonRole.NAVIGATION
+
+    return role
+
+def classify_button(button):
+    """Role flags of a button, cached by button_signature"""
+    return _classify_signature(*button_signature(button))
+
+def needs_navigation_after_choice(view):
     """Determine if navigation is needed after choice"""
-    all_text = content.lower()
-
-    for embed in embeds:
-        all_text += " " + str(embed.get("description", "")).lower()
-        all_text += " " + str(embed.get("title", "")).lower()
-
-    navigation_needed_signs = [
-        "nothing interesting happened",
-        "you passed a star",
-        "you found",
-        "you discovered",
-        "you encountered",
-        "turns out",
-        "it seems",
-        "you feel",
-        "blob-like planet",
-        "odd eyes",
-        "kitchen"
-    ]
-
-    return any(sign in all_text for sign in navigation_needed_signs)
+    return "navigation_needed" in view.short_hits
 
 # --- SMART SCENARIO-BASED BUTTON SELECTION ---
-def select_best_button(buttons, content, embeds, is_navigation_phase=False):
+def select_best_button(buttons, view, is_navigation_phase=False):
     """Smart button selection based on actual scenarios and choice memory"""
     if not buttons:
         return None
 
     # Filter disabled buttons
-    enabled_buttons = [btn for btn in buttons if not btn["disabled"]]
+    enabled_buttons = [btn for btn in buttons if not btn.disabled]
     if not enabled_buttons:
         print("⚠️ All buttons are disabled")
         return None
 
     print(f"🎯 Selecting from {len(enabled_buttons)} enabled buttons:")
     for i, btn in enumerate(enabled_buttons):
-        print(f"   {i+1}. '{btn['label']}' (ID: {btn['custom_id'][:30]}..., Style: {btn.get('style', 1)})")
+        print(f"   {i+1}. '{btn.label}' (ID: {btn.custom_id[:30]}..., Style: {btn.style})")
 
     # PRIORITY 1: If in navigation phase, search for navigation button only
     if is_navigation_phase:
         for btn in enabled_buttons:
-            if is_navigation_button(btn):
-                print(f"🧭 NAVIGATION PHASE: Selected '{btn['label']}'")
+            if view.is_navigation(btn):
+                print(f"🧭 NAVIGATION PHASE: Selected '{btn.label}'")
                 return btn
         print("❌ Navigation phase but no navigation button found")
         return None
 
     # PRIORITY 2: Navigation buttons always have highest priority (outside choice phase)
-    navigation_buttons = [btn for btn in enabled_buttons if is_navigation_button(btn)]
+    navigation_buttons = [btn for btn in enabled_buttons if view.is_navigation(btn)]
     if navigation_buttons:
         selected = navigation_buttons[0]
-        print(f"🧭 PRIORITY: Navigation button selected: '{selected['label']}'")
+        print(f"🧭 PRIORITY: Navigation button selected: '{selected.label}'")
         return selected
 
     # PRIORITY 3: Avoid backpack buttons entirely
-    non_backpack_buttons = [btn for btn in enabled_buttons if not is_backpack_button(btn)]
+    non_backpack_buttons = [btn for btn in enabled_buttons if not view.is_backpack(btn)]
 
     if not non_backpack_buttons:
         print("⚠️ Only backpack buttons available - this shouldn't happen in normal gameplay")
         return None
 
     # PRIORITY 4: Check choice memory first
-    scenario_key = create_scenario_key(content, embeds)
+    scenario_key = view.scenario_key
     remembered_choice = get_remembered_choice(scenario_key, non_backpack_buttons)
 
     if remembered_choice:
-        print(f"🧠 Using remembered choice: '{remembered_choice['label']}'")
+        print(f"🧠 Using remembered choice: '{remembered_choice.label}'")
         return remembered_choice
 
     # Collect all text for analysis
-    all_text = content.lower()
-    for embed in embeds:
-        all_text += " " + str(embed.get("description", "")).lower()
-        all_text += " " + str(embed.get("title", "")).lower()
+    all_text = view.short_text
 
     print(f"📝 Analyzing new scenario: {all_text[:100]}...")
 
-    # PRIORITY 5: Selection based on specific scenarios
-    scenario_choices = {
-        # Choose Items Phase
-        "choose_items": {
-            "keywords": ["choose items", "bring along", "recommended"],
-            "best_choices": {
-                "start": 15,
-                "begin": 15,
-                "go": 14
-            },
-            "avoid_choices": {
-                "equip all": 2,
-                "cancel": 1
-            }
-        },
-        # Alien Encounters
-        "alien": {
-            "keywords": ["alien", "probe", "abduct", "space", "extraterrestrial"],
-            "best_choices": {
-                "talk": 10,
-                "sit back": 10,
-                "enjoy": 10,
-                "cooperate": 9,
-                "be friendly": 8,
-                "do": 7,
-                "try": 6
-            },
-            "avoid_choices": {
-                "attack": 1,
-                "fight": 2,
-                "resist": 3,
-                "probe": 4
-            }
-        },
-        # Blob Planet
-        "blob_planet": {
-            "keywords": ["blob-like planet", "blob", "elusive blob", "grab one"],
-            "best_choices": {
-                "grab one": 10,
-                "take": 9,
-                "collect": 8,
-                "inspect": 7
-            },
-            "avoid_choices": {
-                "ignore": 2,
-                "flee": 3
-            }
-        },
-        # Dangerous Planets
-        "dangerous_planet": {
-            "keywords": ["toxic", "radioactive", "dangerous", "chemicals", "poison"],
-            "best_choices": {
-                "distant scan": 10,
-                "scan": 9,
-                "observe": 8,
-                "avoid": 8,
-                "leave": 7
-            },
-            "avoid_choices": {
-                "land": 2,
-                "explore": 3,
-                "approach": 3
-            }
-        },
-        # Kitchen/Food Scenarios with Angry Alien
-        "kitchen_alien": {
-            "keywords": ["kitchen", "food", "eat", "cook", "shady stuff", "angry alien"],
-            "best_choices": {
-                "flee": 15,
-                "leave": 10,
-                "run": 10
-            },
-            "avoid_choices": {
-                "inspect": 2,
-                "ignore": 3,
-                "eat": 1,
-                "approach": 1
-            }
-        },
-        # Technical/Repair Scenarios
-        "technical_repair": {
-            "keywords": ["telescope", "repair", "fix", "broken", "technical"],
-            "best_choices": {
-                "try and fix": 10,
-                "repair": 9,
-                "fix": 9,
-                "examine": 7
-            },
-            "avoid_choices": {
-                "flee": 2,
-                "ignore": 3,
-                "destroy": 1
-            }
-        },
-        # Space Objects
-        "space_objects": {
-            "keywords": ["star", "object", "strange", "floating", "shooting star"],
-            "best_choices": {
-                "reach for it": 10,
-                "collect": 10,
-                "inspect": 9,
-                "wish": 8,
-                "take picture": 7,
-                "grab": 7
-            },
-            "avoid_choices": {
-                "flee": 2,
-                "ignore": 3,
-                "avoid": 3
-            }
-        },
-        # Fuel/Resource Management
-        "fuel_resources": {
-            "keywords": ["fuel", "ran out", "empty", "resource", "energy"],
-            "best_choices": {
-                "search planet": 10,
-                "search": 9,
-                "look for": 8,
-                "find": 7
-            },
-            "avoid_choices": {
-                "give up": 1,
-                "urinate": 2
-            }
-        },
-        # Communication/Transmission
-        "communication": {
-            "keywords": ["transmission", "signal", "communication", "message", "deep space"],
-            "best_choices": {
-                "respond": 10,
-                "answer": 9,
-                "investigate": 8,
-                "decode": 8
-            },
-            "avoid_choices": {
-                "ignore": 3
-            }
-        },
-        # Odd Eyes Encounter
-        "odd_eyes": {
-            "keywords": ["odd eyes"],
-            "best_choices": {
-                "flee": 15
-            },
-            "avoid_choices": {
-                "attack": 1,
-                "fight": 1,
-                "approach": 1,
-                "inspect": 1
-            }
-        }
-    }
-
-    # Determine matching scenario
+    # PRIORITY 5: Selection based on specific scenarios (first match in SCENARIO_CHOICES order)
     matched_scenario = None
     scenario_name = None
 
-    for name, scenario_data in scenario_choices.items():
-        if any(keyword in all_text for keyword in scenario_data["keywords"]):
+    for name, scenario_data in SCENARIO_CHOICES.items():
+        if "scenario:" + name in view.short_hits:
             matched_scenario = scenario_data
             scenario_name = name
             print(f"🎯 Matched scenario: {name}")
@@ -857,20 +1593,20 @@ def select_best_button(buttons, content, embeds, is_navigation_phase=False):
         button_scores = []
 
         for btn in non_backpack_buttons:
-            label = btn["label"].lower().strip()
+            label = btn.label.lower().strip()
             score = 5  # Default score
 
             # Match with good choices
             for good_choice, points in matched_scenario["best_choices"].items():
                 if good_choice in label or label in good_choice:
                     score = max(score, points)
-                    print(f"✅ Good match: '{btn['label']}' -> {points} points")
+                    print(f"✅ Good match: '{btn.label}' -> {points} points")
 
             # Penalize for bad choices
             for bad_choice, penalty in matched_scenario["avoid_choices"].items():
                 if bad_choice in label or label in bad_choice:
                     score = min(score, penalty)
-                    print(f"❌ Bad match: '{btn['label']}' -> {penalty} points")
+                    print(f"❌ Bad match: '{btn.label}' -> {penalty} points")
 
             button_scores.append((btn, score))
 
@@ -879,7 +1615,7 @@ def select_best_button(buttons, content, embeds, is_navigation_phase=False):
         best_button = button_scores[0][0]
         best_score = button_scores[0][1]
 
-        print(f"🏆 Best choice for {scenario_name}: '{best_button['label']}' ({best_score} points)")
+        print(f"🏆 Best choice for {scenario_name}: '{best_button.label}' ({best_score} points)")
         return best_button
 
     # PRIORITY 6: If no specific scenario, use general rules
@@ -887,40 +1623,291 @@ def select_best_button(buttons, content, embeds, is_navigation_phase=False):
     general_bad_choices = ["no", "refuse", "ignore", "give up"]
 
     for btn in non_backpack_buttons:
-        label = btn["label"].lower()
+        label = btn.label.lower()
         if any(good in label for good in general_good_choices):
-            print(f"🔶 General good choice: '{btn['label']}'")
+            print(f"🔶 General good choice: '{btn.label}'")
             return btn
 
     safe_buttons = []
     for btn in non_backpack_buttons:
-        label = btn["label"].lower()
+        label = btn.label.lower()
         if not any(bad in label for bad in general_bad_choices):
             safe_buttons.append(btn)
 
     if safe_buttons:
         selected = safe_buttons[0]
-        print(f"🛡️ Safe choice: '{selected['label']}'")
+        print(f"🛡️ Safe choice: '{selected.label}'")
         return selected
 
     selected = non_backpack_buttons[0]
-    print(f"🎲 Default selection: '{selected['label']}'")
+    print(f"🎲 Default selection: '{selected.label}'")
     return selected
 
+# --- SCHEDULER ---
+class ScheduledAction:
+    __slots__ = ("at", "action", "args", "tag", "interval", "cancelled")
+
+    def __init__(self, at, action, args, tag, interval):
+        self.at = at
+        self.action = action
+        self.args = args
+        self.tag = tag
+        self.interval = interval
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class Scheduler:
+    """Every delayed action in the bot on one timer heap and one thread.
+
+    Times are time.monotonic() values. Actions run on the scheduler thread
+    and must be quick; anything that blocks (HTTP) should hand itself to
+    io_executor. Cancelled entries are dropped lazily when they reach the
+    top of the heap. Actions tagged "adventure" are cancelled together when
+    the adventure they belong to ends.
+    """
+
+    def __init__(self):
+        self.cond = Condition()
+        self.heap = []  # (at, seq, ScheduledAction)
+        self.sequence = itertools.count()
+        self.thread = None
+        self.counters = {"scheduled": 0, "ran": 0, "cancelled": 0, "wakeups": 0}
+
+    def schedule(self, at, action, *args, tag=None, interval=None):
+        entry = ScheduledAction(at, action, args, tag, interval)
+        with self.cond:
+            if self.thread is None:
+                self.thread = Thread(target=self._run, name="scheduler", daemon=True)
+                self.thread.start()
+            self._push(entry)
+            self.counters["scheduled"] += 1
+        return entry
+
+    def call_later(self, delay, action, *args, tag=None):
+        return self.schedule(time.monotonic() + delay, action, *args, tag=tag)
+
+    def call_every(self, interval, action, *args, tag=None):
+        """Run action every `interval` seconds (first run one interval from now) until cancelled"""
+        return self.schedule(time.monotonic() + interval, action, *args, tag=tag, interval=interval)
+
+    def cancel_tag(self, tag):
+        with self.cond:
+            cancelled = 0
+            for _, _, entry in self.heap:
+                if entry.tag == tag and not entry.cancelled:
+                    entry.cancel()
+                    cancelled += 1
+        return cancelled
+
+    def _push(self, entry):
+        heapq.heappush(self.heap, (entry.at, next(self.sequence), entry))
+        if self.heap[0][2] is entry:
+            self.cond.notify()  # New earliest deadline: re-arm the wait
+
+    def _next_due(self):
+        with self.cond:
+            while True:
+                while self.heap and self.heap[0][2].cancelled:
+                    heapq.heappop(self.heap)
+                    self.counters["cancelled"] += 1
+                if not self.heap:
+                    self.cond.wait()
+                    continue
+                delay = self.heap[0][0] - time.monotonic()
+                if delay <= 0:
+                    return heapq.heappop(self.heap)[2]
+                self.cond.wait(timeout=delay)
+                self.counters["wakeups"] += 1
+
+    def _run(self):
+        while True:
+            entry = self._next_due()
+            try:
+                entry.action(*entry.args)
+            except Exception as e:
+                print(f"❌ Scheduled action {getattr(entry.action, '__name__', entry.action)} failed: {e}")
+            with self.cond:
+                self.counters["ran"] += 1
+                if entry.interval and not entry.cancelled:
+                    entry.at = max(entry.at + entry.interval, time.monotonic())
+                    self._push(entry)
+
+    def stats(self):
+        with self.cond:
+            return dict(self.counters, pending=sum(1 for _, _, entry in self.heap if not entry.cancelled))
+
+scheduler = Scheduler()
+io_executor = ThreadPoolExecutor(max_workers=HTTP_IO_WORKERS, thread_name_prefix="discord-io")
+
+# --- HTTP CLIENT ---
+class RateLimiter:
+    """Per-route Discord rate-limit buckets learned from response headers.
+
+    Discord groups routes into buckets (X-RateLimit-Bucket) and reports what
+    is left in each one, so a request can be held back until its bucket
+    resets instead of being sent, rejected with a 429 and retried. Routes are
+    keyed by method and path with only the major ids (channel, guild,
+    webhook) kept; webhook tokens are masked so they never reach a key or a
+    log line. Requests queued on the same bucket leave in
+    HTTP_PRIORITIES order, so a click never waits behind a delete.
+    """
+
+    MINOR_ID_PATTERN = re.compile(r"(?<!channels)(?<!guilds)(?<!webhooks)/\d{15,21}")
+    WEBHOOK_TOKEN_PATTERN = re.compile(r"(/webhooks/\d+)/[^/]+")
+
+    def __init__(self):
+        self.cond = Condition()
+        self.route_buckets = {}  # route -> bucket hash from X-RateLimit-Bucket
+        self.buckets = {}        # bucket -> [remaining, reset_at (monotonic)]
+        self.global_reset_at = 0.0
+        self.waiting = []        # heap of (priority, seq, route)
+        self.sequence = itertools.count()
+        self.counters = {"delayed": 0, "delay_seconds": 0.0, "rate_limited": 0}
+
+    @classmethod
+    def route_key(cls, method, url):
+        path = url[len(API_BASE):] if url.startswith(API_BASE) else url.split("://", 1)[-1]
+        path = cls.WEBHOOK_TOKEN_PATTERN.sub(r"\1/{token}", path.split("?", 1)[0])
+        return f"{method} {cls.MINOR_ID_PATTERN.sub('/{id}', path)}"
+
+    def _bucket(self, route):
+        return self.route_buckets.get(route, route)
+
+    def _delay(self, bucket, now):
+        delay = self.global_reset_at - now
+        state = self.buckets.get(bucket)
+        if state and state[0] is not None and state[0] <= 0:
+            if state[1] > now:
+                delay = max(delay, state[1] - now)
+            else:
+                state[0] = None  # Reset passed: unknown until the next response
+        return delay
+
+    def _first_in_line(self, ticket, bucket):
+        # Background requests (deletes, webhooks) also stand aside for any
+        # queued foreground request, so they never spend the global budget first
+        background = ticket[0] >= HTTP_BACKGROUND_PRIORITY
+        return not any(other < ticket and (self._bucket(other[2]) == bucket or
+                                           (background and other[0] < HTTP_BACKGROUND_PRIORITY))
+                       for other in self.waiting)
+
+    def acquire(self, route, priority):
+        """Block until the route's bucket has room; returns seconds spent waiting"""
+        ticket = (priority, next(self.sequence), route)
+        start = time.monotonic()
+        with self.cond:
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    bucket = self._bucket(route)
+                    now = time.monotonic()
+                    delay = self._delay(bucket, now)
+                    if delay <= 0 and self._first_in_line(ticket, bucket):
+                        state = self.buckets.get(bucket)
+                        if state and state[0] is not None:
+                            state[0] -= 1
+                        break
+                    self.cond.wait(timeout=delay if delay > 0 else None)
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.cond.notify_all()
+        waited = time.monotonic() - start
+        if waited > 0.05:
+            self.counters["delayed"] += 1
+            self.counters["delay_seconds"] += waited
+        return waited
+
+    def update(self, route, response):
+        """Learn the route's bucket, what is left in it and when it resets"""
+        headers = response.headers
+        now = time.monotonic()
+        with self.cond:
+            bucket = headers.get("X-RateLimit-Bucket")
+            if bucket:
+                self.route_buckets[route] = bucket
+            bucket = self._bucket(route)
+            remaining = headers.get("X-RateLimit-Remaining")
+            reset_after = headers.get("X-RateLimit-Reset-After")
+            if remaining is not None and reset_after is not None:
+                self.buckets[bucket] = [int(remaining), now + float(reset_after)]
+
+            if response.status_code == 429:
+                self.counters["rate_limited"] += 1
+                retry_after = float(headers.get("Retry-After") or 1)
+                if headers.get("X-RateLimit-Global", "").lower() == "true":
+                    self.global_reset_at = max(self.global_reset_at, now + retry_after)
+                else:
+                    self.buckets[bucket] = [0, now + retry_after]
+                print(f"⏰ Rate limited on {route}, holding for {retry_after:.2f}s")
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return dict(self.counters, delay_seconds=round(self.counters["delay_seconds"], 3),
+                        buckets=len(self.buckets))
+
+class DiscordHTTP:
+    """One pooled keep-alive session shared by every Discord REST and webhook call.
+
+    requests keeps a urllib3 connection pool per host, so clicks, sends,
+    deletes and webhooks reuse warm TLS connections instead of opening a new
+    one each time. Each call names its endpoint, which picks the timeout in
+    HTTP_TIMEOUTS and whether the Discord auth HEADERS are sent.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE):
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=pool_size)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.limiter = RateLimiter()
+
+    def request(self, method, url, endpoint, auth=True, **kwargs):
+        kwargs.setdefault("timeout", HTTP_TIMEOUTS[endpoint])
+        if auth:
+            kwargs["headers"] = HEADERS
+        route = RateLimiter.route_key(method, url)
+        self.limiter.acquire(route, HTTP_PRIORITIES[endpoint])
+        response = self.session.request(method, url, **kwargs)
+        self.limiter.update(route, response)
+        return response
+
+    def api(self, method, path, endpoint, **kwargs):
+        """Request against API_BASE with the Discord auth headers"""
+        return self.request(method, API_BASE + path, endpoint, **kwargs)
+
+    def connection_stats(self):
+        """Requests sent and how many needed a new connection vs reused a pooled one"""
+        pools = self.adapter.poolmanager.pools
+        total_requests = new_connections = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                total_requests += pool.num_requests
+                new_connections += pool.num_connections
+        return {
+            "requests": total_requests,
+            "new_connections": new_connections,
+            "reused_connections": max(0, total_requests - new_connections)
+        }
+
+http_client = DiscordHTTP()
+
 # --- ENHANCED BUTTON CLICKING ---
 def click_button(button, message_id, retry_count=0):
     """Click button with enhanced error handling"""
     global session_id
 
-    if not all([button.get("custom_id"), message_id, session_id]):
+    if not all([button.custom_id, message_id, session_id]):
         print(f"❌ Missing data for button click:")
-        print(f"   Custom ID: {bool(button.get('custom_id'))}")
+        print(f"   Custom ID: {bool(button.custom_id)}")
         print(f"   Message ID: {bool(message_id)}")
         print(f"   Session ID: {bool(session_id)}")
         return False
 
-    url = f"{API_BASE}/interactions"
-
     payload = {
         "type": 3,
         "channel_id": str(CHANNEL_ID),
@@ -930,26 +1917,26 @@ def click_button(button, message_id, retry_count=0):
         "session_id": str(session_id),
         "data": {
             "component_type": 2,
-            "custom_id": str(button["custom_id"])
+            "custom_id": str(button.custom_id)
         },
         "nonce": str(random.randint(100000000000000000, 999999999999999999))
     }
 
     print(f"🔘 Clicking button (attempt {retry_count + 1}):")
-    print(f"   Label: '{button['label']}'")
-    print(f"   Custom ID: {button['custom_id']}")
+    print(f"   Label: '{button.label}'")
+    print(f"   Custom ID: {button.custom_id}")
     print(f"   Message ID: {message_id}")
 
     try:
-        response = requests.post(url, headers=HEADERS, json=payload, timeout=20)
+        response = http_client.api("POST", "/interactions", "interaction", json=payload)
 
         print(f"📡 Click response: {response.status_code}")
 
         if response.status_code in [200, 204]:
-            print(f"✅ Successfully clicked: '{button['label']}'")
+            print(f"✅ Successfully clicked: '{button.label}'")
             with open(CHOICE_MEMORY_FILE + "_clicked_buttons.json", "a") as f:
-                f.write(json.dumps({"custom_id": button["custom_id"], "label": button["label"], "timestamp": datetime.now().isoformat()}) + "\n")
-            print(f"💾 Saved clicked button: {button['custom_id']}")
+                f.write(json.dumps({"custom_id": button.custom_id, "label": button.label, "timestamp": datetime.now().isoformat()}) + "\n")
+            print(f"💾 Saved clicked button: {button.custom_id}")
             return True
         elif response.status_code == 400:
             error_data = response.text
@@ -963,9 +1950,7 @@ def click_button(button, message_id, retry_count=0):
             if retry_count < 2:
                 return try_fresh_click(button)
         elif response.status_code == 429:
-            retry_after = int(response.headers.get('Retry-After', 10))
-            print(f"⏰ Rate limited, waiting {retry_after}s")
-            time.sleep(retry_after)
+            # The limiter has recorded Retry-After; the retry waits exactly that long
             if retry_count < 3:
                 return click_button(button, message_id, retry_count + 1)
         else:
@@ -982,8 +1967,7 @@ def click_button(button, message_id, retry_count=0):
 def try_fresh_click(original_button):
     """Try clicking with a fresh message"""
     try:
-        url = f"{API_BASE}/channels/{CHANNEL_ID}/messages?limit=10"
-        response = requests.get(url, headers=HEADERS, timeout=10)
+        response = http_client.api("GET", f"/channels/{CHANNEL_ID}/messages", "fetch", params={"limit": 10})
 
         if response.status_code == 200:
             messages = response.json()
@@ -992,17 +1976,18 @@ def try_fresh_click(original_button):
                 if (str(msg.get("author", {}).get("id")) == DANK_MEMER_ID and 
                     msg.get("components")):
 
-                    fresh_buttons = extract_all_buttons(msg.get("components", []))
+                    fresh_view = MessageView(msg)
+                    fresh_buttons = fresh_view.buttons
 
                     for btn in fresh_buttons:
-                        if (btn["label"] == original_button["label"] or
-                            btn["custom_id"].split(":")[0] == original_button["custom_id"].split(":")[0]):
+                        if (btn.label == original_button.label or
+                            btn.custom_id.split(":")[0] == original_button.custom_id.split(":")[0]):
 
-                            if not btn["disabled"]:
+                            if not btn.disabled:
                                 print("🔄 Found matching button in fresh message")
                                 return click_button(btn, msg["id"])
 
-                    navigation_buttons = [b for b in fresh_buttons if is_navigation_button(b) and not b["disabled"]]
+                    navigation_buttons = [b for b in fresh_buttons if fresh_view.is_navigation(b) and not b.disabled]
                     if navigation_buttons:
                         print("🔄 Using first available navigation button from fresh message")
                         return click_button(navigation_buttons[0], msg["id"])
@@ -1013,21 +1998,200 @@ def try_fresh_click(original_button):
     return False
 
 # --- Message Sending Functions ---
+class WebhookDispatcher:
+    """Background webhook poster that merges log lines and never blocks the caller.
+
+    post() only appends to a bounded deque. One daemon thread sends at most
+    one webhook message per WEBHOOK_FLUSH_INTERVAL, packing as many queued
+    lines as fit in WEBHOOK_MESSAGE_LIMIT. When the endpoint falls behind,
+    the oldest lines are dropped and the next message starts with a count
+    of what was lost.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.cond = Condition()
+        self.lines = deque()
+        self.unreported_drops = 0
+        self.sending = False
+        self.thread = None
+        self.counters = {"queued": 0, "sent_lines": 0, "messages": 0, "dropped": 0, "failed": 0}
+
+    def post(self, line):
+        if not self.url:
+            return
+        with self.cond:
+            if len(self.lines) >= WEBHOOK_QUEUE_SIZE:
+                self.lines.popleft()
+                self.unreported_drops += 1
+                self.counters["dropped"] += 1
+            self.lines.append(line[:WEBHOOK_LINE_LIMIT])
+            self.counters["queued"] += 1
+            if self.thread is None:
+                self.thread = Thread(target=self._run, name="webhook", daemon=True)
+                self.thread.start()
+            self.cond.notify_all()
+
+    def _pack(self):
+        parts = []
+        size = 0
+        lines = 0
+        if self.unreported_drops:
+            parts.append(f"⚠️ {self.unreported_drops} log lines dropped (webhook backlog)")
+            size = len(parts[0])
+            self.unreported_drops = 0
+        while self.lines:
+            # A newline only goes between parts; the first line always fits
+            needed = len(self.lines[0]) + (1 if parts else 0)
+            if parts and size + needed > WEBHOOK_MESSAGE_LIMIT:
+                break
+            parts.append(self.lines.popleft())
+            size += needed
+            lines += 1
+        return "\n".join(parts), lines
+
+    def _run(self):
+        last_sent = 0.0
+        while True:
+            with self.cond:
+                while not self.lines and not self.unreported_drops:
+                    self.cond.wait()
+                # Let lines from the same moment pile up into one message
+                send_at = last_sent + WEBHOOK_FLUSH_INTERVAL
+                while time.monotonic() < send_at:
+                    self.cond.wait(timeout=send_at - time.monotonic())
+                content, count = self._pack()
+                self.sending = True
+
+            last_sent = time.monotonic()
+            try:
+                response = http_client.request("POST", self.url, "webhook", auth=False, json={"content": content})
+                ok = response.status_code < 300
+            except Exception as e:
+                print(f"Webhook error: {e}")
+                ok = False
+
+            with self.cond:
+                self.sending = False
+                if ok:
+                    self.counters["messages"] += 1
+                    self.counters["sent_lines"] += count
+                else:
+                    self.counters["failed"] += 1
+                self.cond.notify_all()
+
+    def drain(self, timeout=5.0):
+        """Wait (up to timeout) for queued lines to go out, e.g. before exiting"""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while self.lines or self.sending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(timeout=remaining)
+        return True
+
+    def stats(self):
+        with self.cond:
+            return dict(self.counters, pending=len(self.lines))
+
+webhook_dispatcher = WebhookDispatcher(WEBHOOK_URL)
+
 def send_webhook(msg):
-    if WEBHOOK_URL:
+    webhook_dispatcher.post(msg)
+
+class MessageDeleter:
+    """Deletes our sent commands in batches once DELETE_MESSAGE_DELAY has passed.
+
+    Due messages are collected and removed with one bulk-delete call when
+    two or more young enough for it are due and the endpoint is allowed for
+    this account; the rest go one DELETE at a time. A 401/403 from
+    bulk-delete turns it off for good, any other rejection (400, 404) for
+    BULK_DELETE_RETRY_AFTER, so a persistent error isn't retried on every
+    batch. Every request runs at delete priority through the rate limiter.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.pending = []  # (due, message_id, content)
+        self.flush_at = None
+        self.bulk_allowed = True
+        self.bulk_retry_at = 0.0  # Monotonic time bulk delete may be tried again after a rejection
+        self.counters = {"deleted": 0, "bulk_requests": 0, "failed": 0}
+
+    def enqueue(self, message_id, content):
+        due = time.monotonic() + DELETE_MESSAGE_DELAY
+        with self.lock:
+            self.pending.append((due, message_id, content))
+            if self.flush_at is None or due < self.flush_at:
+                self.flush_at = due
+                scheduler.schedule(due, io_executor.submit, self.flush)
+
+    def flush(self):
+        now = time.monotonic()
+        with self.lock:
+            due = [entry for entry in self.pending if entry[0] <= now][:DELETE_BATCH_SIZE]
+            self.pending = [entry for entry in self.pending if entry not in due]
+            self.flush_at = min((entry[0] for entry in self.pending), default=None)
+            if self.flush_at is not None:
+                scheduler.schedule(self.flush_at, io_executor.submit, self.flush)
+        if not due:
+            return
+
+        cutoff = time.time() - BULK_DELETE_MAX_AGE
+        bulk = [entry for entry in due if snowflake_time(entry[1]) > cutoff]
+        if len(bulk) >= 2 and self.bulk_allowed and now >= self.bulk_retry_at and self.delete_bulk(bulk):
+            due = [entry for entry in due if entry not in bulk]
+        for _, message_id, content in due:
+            self.delete_one(message_id, content)
+
+    def delete_bulk(self, due):
         try:
-            requests.post(WEBHOOK_URL, json={"content": msg}, timeout=10)
+            response = http_client.api("POST", f"/channels/{CHANNEL_ID}/messages/bulk-delete", "bulk_delete",
+                                       json={"messages": [message_id for _, message_id, _ in due]})
         except Exception as e:
-            print(f"Webhook error: {e}")
+            print(f"❌ Bulk delete error: {e}")
+            return False
+        self.counters["bulk_requests"] += 1
+        if response.status_code == 204:
+            self.counters["deleted"] += len(due)
+            print(f"🗑️ Deleted {len(due)} messages in one request")
+            return True
+        if response.status_code in (401, 403):
+            print("🗑️ Bulk delete not permitted - deleting one at a time from now on")
+            self.bulk_allowed = False
+        elif 400 <= response.status_code < 500 and response.status_code != 429:
+            print(f"🗑️ Bulk delete rejected ({response.status_code}) - deleting one at a time for {BULK_DELETE_RETRY_AFTER}s")
+            self.bulk_retry_at = time.monotonic() + BULK_DELETE_RETRY_AFTER
+        return False
 
-def send_message(content):
-    global waiting_for_interaction, waiting_for_start_button, adventure_start_time, no_start_button_time
+    def delete_one(self, message_id, content):
+        try:
+            response = http_client.api("DELETE", f"/channels/{CHANNEL_ID}/messages/{message_id}", "delete")
+            if response.status_code == 204:
+                self.counters["deleted"] += 1
+                print(f"🗑️ Deleted: {content}")
+                return
+        except Exception:
+            pass
+        self.counters["failed"] += 1
 
-    url = f"{API_BASE}/channels/{CHANNEL_ID}/messages"
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, pending=len(self.pending),
+                        bulk_allowed=self.bulk_allowed and time.monotonic() >= self.bulk_retry_at)
+
+def snowflake_time(snowflake):
+    """Creation time (epoch seconds) encoded in a Discord id"""
+    return ((int(snowflake) >> 22) + DISCORD_EPOCH_MS) / 1000
+
+message_deleter = MessageDeleter()
+
+def send_message(content):
     payload = {"content": content}
 
     try:
-        response = requests.post(url, headers=HEADERS, json=payload, timeout=15)
+        response = http_client.api("POST", f"/channels/{CHANNEL_ID}/messages", "send", json=payload)
         if response.status_code == 200:
             message_data = response.json()
             message_id = message_data.get("id")
@@ -1035,24 +2199,11 @@ def send_message(content):
             send_webhook(f"🟢 Sent: `{content}` at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
 
             if message_id and DELETE_MESSAGE_DELAY > 0:
-                def delete_later():
-                    time.sleep(DELETE_MESSAGE_DELAY)
-                    try:
-                        delete_url = f"{API_BASE}/channels/{CHANNEL_ID}/messages/{message_id}"
-                        del_response = requests.delete(delete_url, headers=HEADERS, timeout=10)
-                        if del_response.status_code == 204:
-                            print(f"🗑️ Deleted: {content}")
-                    except:
-                        pass
-
-                Thread(target=delete_later, daemon=True).start()
+                message_deleter.enqueue(message_id, content)
 
             if content in INTERACTIVE_COMMANDS:
-                if remaining_cooldown <= 0:  # Only start if no cooldown
-                    waiting_for_interaction = True
-                    waiting_for_start_button = True
-                    adventure_start_time = time.time()
-                    no_start_button_time = time.time()
+                if adventure_session.remaining_cooldown <= 0:  # Only start if no cooldown
+                    adventure_session.begin_start()
                     print(f"🎮 Started adventure interaction mode at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
 
             return True
@@ -1064,361 +2215,1030 @@ def send_message(content):
 
     return False
 
+# --- ADVENTURE SESSION ---
+class AdventureState(Enum):
+    IDLE = "idle"                # No adventure running
+    STARTING = "starting"        # "pls adv" sent, waiting for the start button
+    PLAYING = "playing"          # Answering scenario choices
+    NAVIGATING = "navigating"    # A choice was made, its navigation button is expected next
+    COOLDOWN = "cooldown"        # Adventure over, waiting for the cooldown to expire
+
+ADVENTURE_TRANSITIONS = {
+    AdventureState.IDLE: {AdventureState.STARTING, AdventureState.PLAYING, AdventureState.COOLDOWN},
+    AdventureState.STARTING: {AdventureState.PLAYING, AdventureState.COOLDOWN, AdventureState.IDLE},
+    AdventureState.PLAYING: {AdventureState.PLAYING, AdventureState.NAVIGATING, AdventureState.COOLDOWN, AdventureState.IDLE},
+    AdventureState.NAVIGATING: {AdventureState.PLAYING, AdventureState.NAVIGATING, AdventureState.COOLDOWN, AdventureState.IDLE},
+    AdventureState.COOLDOWN: {AdventureState.IDLE, AdventureState.STARTING, AdventureState.COOLDOWN},
+}
+
+class AdventureSession:
+    """The adventure lifecycle as one state machine instead of a dozen globals.
+
+    Every transition goes through _move() under one lock and is checked
+    against ADVENTURE_TRANSITIONS; one that isn't allowed from the current
+    state is logged and ignored. Each transition notifies `cond`, which is
+    what command_worker waits on. Single-attribute reads are left unlocked.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.cond = Condition(self.lock)
+        self.state = AdventureState.IDLE
+        self.started_at = None         # Wall-clock start of the adventure (for ADVENTURE_TIMEOUT)
+        self.start_wait_since = None   # When we began waiting for the start button
+        self.last_choice_at = None
+        self.idle_since = None         # Monotonic time the last adventure ended
+        self.round_delay = ROUND_DELAY
+        self.remaining_cooldown = 0
+        self.cooldown_ready_at = None  # Absolute time the parsed cooldown expires (None if unknown)
+        self.transitions = 0
+
+    @property
+    def active(self):
+        return self.state in (AdventureState.STARTING, AdventureState.PLAYING, AdventureState.NAVIGATING)
+
+    def _move(self, new_state):
+        if new_state not in ADVENTURE_TRANSITIONS[self.state]:
+            print(f"⚠️ Ignoring adventure transition {self.state.name} -> {new_state.name}")
+            return False
+        was_active = self.active
+        self.state = new_state
+        self.transitions += 1
+        if was_active and not self.active:
+            self.idle_since = time.monotonic()
+        self.cond.notify_all()
+        return True
+
+    def begin_start(self):
+        """Our "pls adv" went out: wait for its start button"""
+        with self.lock:
+            if self._move(AdventureState.STARTING):
+                self.started_at = self.start_wait_since = time.time()
+                self.idle_since = None
+
+    def begin_play(self):
+        """An adventure we didn't start ourselves is under way (not allowed during a cooldown)"""
+        with self.lock:
+            if self._move(AdventureState.PLAYING):
+                self.started_at = time.time()
+                self.idle_since = None
+                return True
+            return False
+
+    def start_clicked(self):
+        """Start button clicked, or the adventure began without one"""
+        with self.lock:
+            if self.state is AdventureState.STARTING:
+                self.start_wait_since = None
+                self._move(AdventureState.PLAYING)
+
+    def expect_navigation(self, expected):
+        with self.lock:
+            if self.state in (AdventureState.PLAYING, AdventureState.NAVIGATING):
+                self._move(AdventureState.NAVIGATING if expected else AdventureState.PLAYING)
+                if expected:
+                    self.last_choice_at = time.time()
+
+    def end(self, cooldown_seconds, ready_at=None):
+        """The adventure is over; the next may start in cooldown_seconds"""
+        with self.lock:
+            self._move(AdventureState.COOLDOWN)
+            self.round_delay = cooldown_seconds
+            self.remaining_cooldown = cooldown_seconds
+            self.cooldown_ready_at = ready_at
+            self.started_at = self.start_wait_since = self.last_choice_at = None
+
+    def reset(self):
+        """Give up on the current adventure (timeouts) without a cooldown"""
+        with self.lock:
+            self._move(AdventureState.IDLE)
+            self.started_at = self.start_wait_since = self.last_choice_at = None
+
+    def count_down(self, remaining):
+        self.remaining_cooldown = remaining
+
+    def cooldown_over(self):
+        with self.lock:
+            self.remaining_cooldown = 0
+            self.cooldown_ready_at = None
+            if self.state is AdventureState.COOLDOWN:
+                self._move(AdventureState.IDLE)
+
+    def duration(self):
+        return int(time.time() - self.started_at) if self.started_at else 0
+
+    def timed_out(self):
+        return bool(self.started_at and time.time() - self.started_at > ADVENTURE_TIMEOUT)
+
+    def start_wait_expired(self):
+        return bool(self.state is AdventureState.STARTING and self.start_wait_since and
+                    time.time() - self.start_wait_since > NO_START_BUTTON_TIMEOUT)
+
+    def snapshot(self):
+        with self.lock:
+            return {"state": self.state.value, "duration": self.duration(), "transitions": self.transitions,
+                    "remaining_cooldown": self.remaining_cooldown, "round_delay": self.round_delay}
+
+adventure_session = AdventureSession()
+
+# --- DEFERRED CLICKS ---
+# Dank Memer messages are handled one at a time on event_executor, never on
+# the websocket reader thread. Human-like delays before a click are
+# scheduler entries, the click's HTTP call runs on io_executor, and its
+# follow-up (state flags, webhook, choice memory) is handed back to
+# event_executor so all adventure state is still only touched from one thread.
+event_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gateway-events")
+pending_click = None  # The one click waiting on its delay, if any
+deferred_message = None  # Newest message that arrived while pending_click was in flight
+gateway_stats = {"frames": 0, "dispatched": 0, "reader_seconds": 0.0, "reader_max_ms": 0.0,
+                 "queue_max_ms": 0.0, "wire_bytes": 0, "inflated_bytes": 0,
+                 "messages": 0, "skipped_raw": 0}
+
+class PendingClick:
+    def __init__(self, button, message_id, on_done):
+        self.button = button
+        self.message_id = message_id
+        self.on_done = on_done
+        self.cancelled = False
+        self.handle = None
+        self.edit = last_handled_edit  # The message edit this click answers
+
+def schedule_click(delay, button, message_id, on_done):
+    """Click `button` after `delay` seconds; on_done(success) runs back on the event thread"""
+    global pending_click
+    click = PendingClick(button, message_id, on_done)
+
+    def fire():
+        if click.cancelled or not when_session_ready(fire):
+            return
+        success = click_button(button, message_id)
+        if not success and not session_ready.is_set() and not when_session_ready(fire):
+            return  # Lost the session mid-click: fired again by READY
+        event_executor.submit(finish_click, click, success)
+
+    pending_click = click
+    click.handle = scheduler.call_later(delay, io_executor.submit, fire, tag="adventure")
+    return click
+
+session_waiters = []  # Actions parked by when_session_ready until the next READY
+session_cond = Condition()  # Guards session_waiters; notified on READY and on stop
+
+def when_session_ready(action):
+    """True if there is a session now; otherwise park `action` for io_executor on READY and return False"""
+    with session_cond:
+        if session_ready.is_set():
+            return True
+        session_waiters.append(action)
+    print("⏸️ No gateway session - holding click until READY")
+    return False
+
+def session_established():
+    """READY arrived: mark the session usable and run what waited for it"""
+    with session_cond:
+        session_ready.set()
+        session_cond.notify_all()
+        waiters = session_waiters[:]
+        session_waiters.clear()
+    for action in waiters:
+        io_executor.submit(action)
+
+def finish_click(click, success):
+    global pending_click, deferred_message
+    if pending_click is click:
+        pending_click = None
+    if click.cancelled:
+        print(f"🚫 Ignoring result of cancelled click: '{click.button.label}'")
+        return
+    try:
+        click.on_done(success)
+    except Exception as e:
+        print(f"❌ Click follow-up error: {e}")
+
+    # The follow-up may have scheduled the next click; the deferred message then waits for that one
+    if deferred_message is None or pending_click is not None:
+        return
+    msg_data, deferred_message = deferred_message, None
+    if (msg_data.get("id"), _component_hash(msg_data.get("components") or [])) == click.edit:
+        return  # Just a repeat of the message the click answered
+    print("↪️ Handling the message that arrived during the click")
+    dispatch_message(msg_data, time.perf_counter())
+
+def defer_message(view):
+    """A click is in flight: keep the newest message and handle it once the click finishes"""
+    global deferred_message
+    deferred_message = view.data
+    print(f"⏳ Click on '{pending_click.button.label}' in flight - handling this message after it")
+
+def cancel_pending_click(reason):
+    """Drop a click still waiting on its delay and anything else scheduled for this adventure"""
+    global pending_click, deferred_message
+    if pending_click is not None:
+        pending_click.cancelled = True
+        print(f"🚫 Cancelled pending click '{pending_click.button.label}' ({reason})")
+        pending_click = None
+    deferred_message = None
+    scheduler.cancel_tag("adventure")
+
+def dispatch_message(msg_data, received_at):
+    global last_handled_edit
+    queued_ms = (time.perf_counter() - received_at) * 1000
+    if queued_ms > gateway_stats["queue_max_ms"]:
+        gateway_stats["queue_max_ms"] = queued_ms
+    last_handled_edit = (msg_data.get("id"), _component_hash(msg_data.get("components") or []))
+    try:
+        handle_message(msg_data)
+    except Exception as e:
+        print(f"❌ Message handler error at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}: {e}")
+
+last_handled_edit = None  # (message id, component hash) of the last message handled
+
+def resync_adventure():
+    """A new session can't replay what the old one missed: re-read the latest Dank Memer message"""
+    try:
+        response = http_client.api("GET", f"/channels/{CHANNEL_ID}/messages", "fetch", params={"limit": 10})
+        if response.status_code != 200:
+            print(f"❌ Adventure resync failed: {response.status_code}")
+            return
+        for msg in response.json():
+            if str(msg.get("author", {}).get("id")) == DANK_MEMER_ID:
+                if (msg.get("id"), _component_hash(msg.get("components") or [])) == last_handled_edit:
+                    print("🔁 Adventure resync: nothing was missed")
+                else:
+                    print("🔁 Adventure resync: handling the latest Dank Memer message")
+                    event_executor.submit(dispatch_message, msg, time.perf_counter())
+                return
+    except Exception as e:
+        print(f"❌ Adventure resync error: {e}")
+
+# --- GATEWAY SESSION ---
+def drop_connection(ws, status=4000):
+    """Close ws from another thread without waiting for the peer's close frame.
+
+    WebSocketApp.close() closes the file descriptor, which epoll silently
+    forgets, so run_forever would sit out its whole select timeout. Sending
+    the close frame and shutting the socket down instead wakes the reader
+    with an EOF and lets it tear the connection down right away.
+    """
+    sock = ws.sock
+    if sock is None or sock.sock is None:
+        return
+    try:
+        sock.send_close(status)
+    except Exception:
+        pass  # A dead peer may not take the close frame; the shutdown still ends the connection
+    try:
+        sock.sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+class GatewaySession:
+    """Heartbeat, sequence number and RESUME state for the gateway connection.
+
+    Hello (op 10) sets the heartbeat interval; beats run on the scheduler
+    with the spec's random first delay and carry the last seen sequence
+    number. A beat that finds the previous one never ACKed (op 11) marks the
+    connection as a zombie and closes it with a non-1000 code so the session
+    stays resumable. On the next Hello a RESUME (op 6) with session_id and
+    seq replays what was missed instead of starting over with IDENTIFY.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.ws = None
+        self.seq = None
+        self.resume_url = None
+        self.interval = None
+        self.heartbeat = None     # Scheduler entry for the beat
+        self.last_sent = None
+        self.acked = True
+        self.latency_ms = None
+        self.resume_started = None
+        self.replayed = 0
+        self.reset_transport()
+        self.counters = {"heartbeats": 0, "acks": 0, "zombies": 0, "identifies": 0,
+                         "resumes": 0, "resumed": 0, "invalid_sessions": 0}
+
+    def can_resume(self):
+        return bool(session_id and self.seq is not None)
+
+    def url(self):
+        base = self.resume_url if self.can_resume() and self.resume_url else GATEWAY_URL
+        return base.rstrip("/") + GATEWAY_QUERY + ("&compress=zlib-stream" if GATEWAY_COMPRESS else "")
+
+    def reset_transport(self):
+        """zlib-stream shares one inflate context per connection; start a fresh one on connect"""
+        self.inflater = zlib.decompressobj()
+        self.inflate_buffer = bytearray()
+
+    def inflate(self, data):
+        """Feed one binary frame; returns the JSON text once a whole message has arrived"""
+        self.inflate_buffer.extend(data)
+        if len(data) < 4 or data[-4:] != ZLIB_SUFFIX:
+            return None
+        text = self.inflater.decompress(self.inflate_buffer)
+        self.inflate_buffer.clear()
+        gateway_stats["inflated_bytes"] += len(text)
+        return text.decode("utf-8")
+
+    def track(self, seq):
+        if seq is not None:
+            with self.lock:
+                self.seq = seq
+                if self.resume_started is not None:
+                    self.replayed += 1
+
+    def hello(self, ws, interval_ms):
+        with self.lock:
+            if self.heartbeat:
+                self.heartbeat.cancel()
+            self.ws = ws
+            self.interval = interval_ms / 1000
+            self.acked = True
+            first_beat = time.monotonic() + self.interval * random.random()
+            self.heartbeat = scheduler.schedule(first_beat, self.beat, ws, interval=self.interval)
+        print(f"💓 Heartbeat every {self.interval:.1f}s")
+        if self.can_resume():
+            self.resume(ws)
+        else:
+            self.identify(ws)
+
+    def beat(self, ws):
+        with self.lock:
+            if ws is not self.ws:
+                return
+            if not self.acked:
+                self.counters["zombies"] += 1
+                self.heartbeat.cancel()
+                self.heartbeat = None
+                zombie = True
+            else:
+                self.acked = False
+                self.last_sent = time.monotonic()
+                self.counters["heartbeats"] += 1
+                zombie = False
+        if zombie:
+            print(f"🧟 No heartbeat ACK within {self.interval:.1f}s - closing zombie connection to resume")
+            drop_connection(ws)
+        else:
+            self.send_heartbeat(ws)
+
+    def send_heartbeat(self, ws):
+        ws.send(json.dumps({"op": 1, "d": self.seq}))
+
+    def ack(self):
+        global last_heartbeat
+        with self.lock:
+            self.acked = True
+            self.counters["acks"] += 1
+            if self.last_sent is not None:
+                self.latency_ms = (time.monotonic() - self.last_sent) * 1000
+        last_heartbeat = time.time()
+
+    def identify(self, ws):
+        self.counters["identifies"] += 1
+        ws.send(json.dumps({
+            "op": 2,
+            "d": {
+                "token": TOKEN,
+                "intents": GATEWAY_INTENTS,
+                "properties": {
+                    "$os": "linux",
+                    "$browser": "chrome",
+                    "$device": "computer"
+                }
+            }
+        }))
+
+    def resume(self, ws):
+        with self.lock:
+            self.counters["resumes"] += 1
+            self.resume_started = time.monotonic()
+            self.replayed = 0
+            seq = self.seq
+        print(f"🔁 Resuming session {session_id} from seq {seq}")
+        ws.send(json.dumps({"op": 6, "d": {"token": TOKEN, "session_id": session_id, "seq": seq}}))
+
+    def ready(self, data):
+        with self.lock:
+            self.resume_url = data.get("resume_gateway_url")
+            self.resume_started = None
+
+    def resumed(self):
+        with self.lock:
+            took = time.monotonic() - self.resume_started if self.resume_started else 0.0
+            self.resume_started = None
+            self.counters["resumed"] += 1
+            replayed = max(0, self.replayed - 1)  # RESUMED itself carries a seq too
+        print(f"✅ Session resumed in {took:.2f}s, {replayed} missed events replayed")
+        send_webhook(f"🔁 Gateway resumed in {took:.2f}s ({replayed} events replayed)")
+
+    def invalid_session(self, ws, resumable):
+        """op 9: resume again if allowed, otherwise forget the session and IDENTIFY after 1-5 s"""
+        global session_id
+        self.counters["invalid_sessions"] += 1
+        if not resumable:
+            session_ready.clear()  # First, so no click goes out with session_id gone
+            with self.lock:
+                self.seq = None
+                self.resume_started = None
+            session_id = None
+        print(f"⚠️ Invalid session (resumable: {resumable})")
+        scheduler.call_later(random.uniform(1.0, 5.0), self.resume if resumable else self.identify, ws)
+
+    def closed(self, ws):
+        with self.lock:
+            if ws is self.ws and self.heartbeat:
+                self.heartbeat.cancel()
+                self.heartbeat = None
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, seq=self.seq, interval=self.interval,
+                        latency_ms=round(self.latency_ms, 1) if self.latency_ms is not None else None)
+
+gateway = GatewaySession()
+
 # --- MAIN MESSAGE HANDLER ---
 def on_message(ws, message):
-    global waiting_for_interaction, waiting_for_navigation, waiting_for_start_button
-    global session_id, last_heartbeat, adventure_start_time, last_choice_time, no_start_button_time
+    """Websocket reader callback: parse, answer the gateway, dispatch. Never blocks."""
+    received_at = time.perf_counter()
+    try:
+        gateway_stats["wire_bytes"] += len(message)  # Text frames count characters, close enough for JSON
+        if isinstance(message, bytes):
+            message = gateway.inflate(message)
+            if message is None:
+                return
+        else:
+            gateway_stats["inflated_bytes"] += len(message)
+        if GATEWAY_RECORD_FILE:
+            record_frame(message)
+        read_gateway_frame(ws, message, received_at)
+    finally:
+        elapsed = time.perf_counter() - received_at
+        gateway_stats["frames"] += 1
+        gateway_stats["reader_seconds"] += elapsed
+        if elapsed * 1000 > gateway_stats["reader_max_ms"]:
+            gateway_stats["reader_max_ms"] = elapsed * 1000
+
+frame_record = None  # Line-buffered GATEWAY_RECORD_FILE, opened on the first frame
+
+def record_frame(message):
+    """Append one decoded gateway message as {"at": epoch seconds, "frame": text}"""
+    global frame_record
+    if frame_record is None:
+        frame_record = open(GATEWAY_RECORD_FILE, "a", encoding="utf-8", buffering=1)
+    frame_record.write(json.dumps({"at": round(time.time(), 3), "frame": message}) + "\n")
+
+# Raw-frame prefilter. Discord serialises dispatches as {"t":..,"s":..,"op":..,"d":..},
+# so the event name and sequence number sit in the first few dozen characters
+# and most frames can be dropped without decoding the payload.
+RAW_PEEK = 96
+RAW_EVENT_PATTERN = re.compile(r'"t":\s*"([A-Z_]+)"')
+RAW_SEQ_PATTERN = re.compile(r'"s":\s*(\d+)')
+MESSAGE_EVENTS = ("MESSAGE_CREATE", "MESSAGE_UPDATE")
+CHANNEL_NEEDLE = f'"channel_id":"{CHANNEL_ID}"'
+AUTHOR_NEEDLE = f'"{DANK_MEMER_ID}"'
+
+def skip_raw_frame(frame):
+    """True if this frame can be dropped undecoded (its seq is still recorded)"""
+    event = RAW_EVENT_PATTERN.search(frame, 0, RAW_PEEK)
+    if not event:
+        return False  # Not a dispatch, or not laid out as expected: decode it
+    event = event.group(1)
+    if event in DISPATCH_HANDLERS:
+        if event not in MESSAGE_EVENTS or (CHANNEL_NEEDLE in frame and AUTHOR_NEEDLE in frame):
+            return False
+    seq = RAW_SEQ_PATTERN.search(frame, 0, RAW_PEEK)
+    if not seq:
+        return False
+    gateway.track(int(seq.group(1)))
+    return True
+
+def read_gateway_frame(ws, message, received_at):
+    gateway_stats["messages"] += 1
+    if skip_raw_frame(message):
+        gateway_stats["skipped_raw"] += 1
+        return
 
     try:
-        data = json.loads(message)
+        data = json_loads(message)
     except:
         print(f"❌ Failed to parse message at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}: {message[:100]}...")
         return
 
-    # Handle heartbeat
-    if data.get("op") == 1:
-        ws.send(json.dumps({"op": 1, "d": data.get("d")}))
-        last_heartbeat = time.time()
+    gateway.track(data.get("s"))
+    op = data.get("op")
+    handler = DISPATCH_HANDLERS.get(data.get("t")) if op == 0 else GATEWAY_OP_HANDLERS.get(op)
+    if handler:
+        handler(ws, data, received_at)
+
+def on_heartbeat_request(ws, data, received_at):
+    global last_heartbeat
+    gateway.send_heartbeat(ws)
+    last_heartbeat = time.time()
+
+def on_heartbeat_ack(ws, data, received_at):
+    gateway.ack()
+
+def on_hello(ws, data, received_at):
+    # Start heartbeating, then IDENTIFY or RESUME
+    gateway.hello(ws, data["d"]["heartbeat_interval"])
+
+def on_reconnect_request(ws, data, received_at):
+    # Close without 1000 so the session can be resumed
+    print("🔁 Gateway asked us to reconnect")
+    ws.close(status=4000)
+
+def on_invalid_session(ws, data, received_at):
+    gateway.invalid_session(ws, bool(data.get("d")))
+
+def on_ready(ws, data, received_at):
+    global session_id
+    session_id = data["d"].get("session_id")
+    gateway.ready(data["d"])
+    gateway_connection.established()
+    session_established()
+    if adventure_session.active:
+        io_executor.submit(resync_adventure)  # Events sent while we had no session are gone
+    print(f"💾 Session ID: {session_id} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
+
+def on_resumed(ws, data, received_at):
+    gateway.resumed()
+    gateway_connection.established()
+
+def on_channel_message(ws, data, received_at):
+    msg_data = data["d"]
+
+    # ✅ CRITICAL: Only process messages from OUR channel and guild
+    message_channel_id = str(msg_data.get("channel_id", ""))
+    message_guild_id = str(msg_data.get("guild_id", ""))
+
+    if message_channel_id != str(CHANNEL_ID):
+        return
+
+    if message_guild_id != str(GUILD_ID):
         return
 
-    # Handle hello
-    elif data.get("op") == 10:
+    # Only Dank Memer messages
+    if str(msg_data.get("author", {}).get("id")) != DANK_MEMER_ID:
         return
 
-    # Handle ready
-    elif data.get("t") == "READY":
-        session_id = data["d"].get("session_id")
-        print(f"💾 Session ID: {session_id} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
+    gateway_stats["dispatched"] += 1
+    event_executor.submit(dispatch_message, msg_data, received_at)
+
+GATEWAY_OP_HANDLERS = {
+    1: on_heartbeat_request,
+    7: on_reconnect_request,
+    9: on_invalid_session,
+    10: on_hello,
+    11: on_heartbeat_ack
+}
+
+DISPATCH_HANDLERS = {
+    "READY": on_ready,
+    "RESUMED": on_resumed,
+    "MESSAGE_CREATE": on_channel_message,
+    "MESSAGE_UPDATE": on_channel_message
+}
+
+def gateway_report():
+    """gateway_stats plus the share of gateway messages dropped before decoding"""
+    messages = gateway_stats["messages"]
+    return dict(gateway_stats, json_backend=json_loads.__module__,
+                drop_rate=round(gateway_stats["skipped_raw"] / messages, 4) if messages else 0.0)
+
+def handle_message(msg_data):
+    """Handle one Dank Memer message from our channel (runs on event_executor)"""
+    print(f"\n{'='*60}")
+    print(f"🤖 DANK MEMER MESSAGE - OUR CHANNEL at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
+    print(f"{'='*60}")
+
+    view = MessageView(msg_data)
+    state = adventure_session.state
+
+    print(f"📝 Content: {view.content[:150]}...")
+    print(f"🖼️ Embeds: {len(view.embeds)}")
+    print(f"🔧 Components: {len(view.components)}")
+    print(f"🎮 Adventure state: {state.name}")
+
+    ADVENTURE_HANDLERS[state](view)
+
+def handle_idle(view):
+    """No adventure of ours is running: only cooldowns, a manual adventure or stray navigation matter"""
+    # ✅ CRITICAL: Only process adventure-related messages
+    if not is_adventure_message(view):
+        print("🚫 Non-adventure message detected - ignoring")
         return
 
-    # Handle messages
-    if data.get("t") in ["MESSAGE_CREATE", "MESSAGE_UPDATE"]:
-        msg_data = data["d"]
+    if finish_if_over(view):
+        return
 
-        # ✅ CRITICAL: Only process messages from OUR channel and guild
-        message_channel_id = str(msg_data.get("channel_id", ""))
-        message_guild_id = str(msg_data.get("guild_id", ""))
+    if pending_click is not None:
+        defer_message(view)
+        return
 
-        if message_channel_id != str(CHANNEL_ID):
-            return
+    if needs_interaction(view) and adventure_session.begin_play():
+        print(f"🎮 Adventure interaction started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
+        send_webhook("🎮 Adventure interaction started")
+        play_turn(view)
+        return
 
-        if message_guild_id != str(GUILD_ID):
-            return
+    if needs_navigation_after_choice(view):
+        navigation_buttons = [btn for btn in view.buttons if view.is_navigation(btn) and not btn.disabled]
+        if navigation_buttons:
+            print("🧭 Found standalone navigation need")
+            selected_button = navigation_buttons[0]
+
+            def navigated(success):
+                if success:
+                    send_webhook(f"🧭 Standalone navigation: {selected_button.label}")
 
-        # Only Dank Memer messages
-        if str(msg_data.get("author", {}).get("id")) != DANK_MEMER_ID:
+            schedule_click(random.uniform(3.0, 5.0), selected_button, view.message_id, navigated)
             return
+    print("🔕 Not waiting for interaction")
 
-        print(f"\n{'='*60}")
-        print(f"🤖 DANK MEMER MESSAGE - OUR CHANNEL at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
-        print(f"{'='*60}")
+def handle_cooldown(view):
+    """Cooldown running: the adventure is already settled and begin_play refuses a new one, so drop the message"""
+    print("🕐 On cooldown - ignoring")
 
-        content = msg_data.get("content", "")
-        embeds = msg_data.get("embeds", [])
-        components = msg_data.get("components", [])  # Ensure components is defined here
-        message_id = msg_data.get("id")
+def handle_starting(view):
+    if not is_adventure_message(view):
+        print("🚫 Non-adventure message detected - ignoring")
+        return
 
-        print(f"📝 Content: {content[:150]}...")
-        print(f"🖼️ Embeds: {len(embeds)}")
-        print(f"🔧 Components: {len(components)}")
-        print(f"🎮 Waiting for interaction: {waiting_for_interaction}")
-        print(f"🧭 Waiting for navigation: {waiting_for_navigation}")
-        print(f"🚀 Waiting for start button: {waiting_for_start_button}")
+    # Check start button timeout
+    if adventure_session.start_wait_expired():
+        print(f"⏰ No start button timeout - sending another pls adv at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
+        send_webhook("⏰ No start button found - retrying pls adv")
+        cancel_pending_click("start button timeout")
+        adventure_session.reset()
+        command_queue.put("pls adv")
+        return
 
-        # Extract buttons
-        buttons = extract_all_buttons(components)
+    if finish_if_over(view):
+        return
 
-        # ✅ CRITICAL: Only process adventure-related messages
-        if not is_adventure_message(content, embeds, components):
-            print("🚫 Non-adventure message detected - ignoring")
-            return
+    play_turn(view)
 
-        # Check start button timeout
-        if (waiting_for_start_button and no_start_button_time and 
-            time.time() - no_start_button_time > NO_START_BUTTON_TIMEOUT):
-            print(f"⏰ No start button timeout - sending another pls adv at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
-            send_webhook("⏰ No start button found - retrying pls adv")
-            waiting_for_start_button = False
-            waiting_for_interaction = False
-            no_start_button_time = None
-            command_queue.put("pls adv")
-            return
+def handle_playing(view):
+    if not is_adventure_message(view):
+        print("🚫 Non-adventure message detected - ignoring")
+        return
 
-        # PRIORITY CHECK: Cooldown message detection
-        if is_cooldown_message(content, embeds, components):
-            global dynamic_round_delay, remaining_cooldown
-            print(f"🕐 COOLDOWN MESSAGE DETECTED at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
-            cooldown_time = extract_cooldown_time(content, embeds, buttons)
-            dynamic_round_delay = cooldown_time
-            remaining_cooldown = cooldown_time  # Set initial remaining cooldown
-
-            duration = int(time.time() - adventure_start_time) if adventure_start_time else 0
-            cooldown_minutes = cooldown_time // 60
-            cooldown_seconds = cooldown_time % 60
-
-            print(f"🏁 Adventure session ended!")
-            print(f"   Duration: {duration}s")
-            print(f"   Cooldown: {cooldown_minutes}m {cooldown_seconds}s")
-
-            send_webhook(f"🏁 Adventure ended in {duration}s | Cooldown: {cooldown_minutes}m {cooldown_seconds}s")
-
-            waiting_for_interaction = False
-            waiting_for_navigation = False
-            waiting_for_start_button = False
-            adventure_start_time = None
-            last_choice_time = None
-            no_start_button_time = None
-            return
+    if finish_if_over(view):
+        return
 
-        # Check adventure completion
-        if is_truly_complete(content, embeds, buttons):
-            print(f"🏁 Adventure completed at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
-            duration = int(time.time() - adventure_start_time) if adventure_start_time else 0
-
-            next_delay = extract_cooldown_time(content, embeds, buttons)
-            dynamic_round_delay = next_delay
-            remaining_cooldown = next_delay  # Set initial remaining cooldown
-
-            send_webhook(f"🏁 Adventure completed in {duration}s - Next in {next_delay//60}min")
-            waiting_for_interaction = False
-            waiting_for_navigation = False
-            waiting_for_start_button = False
-            adventure_start_time = None
-            last_choice_time = None
-            no_start_button_time = None
-            return
+    play_turn(view)
 
-        if adventure_start_time and (time.time() - adventure_start_time > ADVENTURE_TIMEOUT):
-            print(f"⏰ Adventure timeout ({ADVENTURE_TIMEOUT}s) - Retrying interaction at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
-            send_webhook(f"⏰ Adventure timeout - Retrying pls adv")
-            waiting_for_interaction = False
-            waiting_for_navigation = False
-            waiting_for_start_button = False
-            adventure_start_time = None
-            last_choice_time = None
-            no_start_button_time = None
-            command_queue.put("pls adv")  # Infinite retry
-            return
+ADVENTURE_HANDLERS = {
+    AdventureState.IDLE: handle_idle,
+    AdventureState.COOLDOWN: handle_cooldown,
+    AdventureState.STARTING: handle_starting,
+    AdventureState.PLAYING: handle_playing,
+    AdventureState.NAVIGATING: handle_playing,
+}
+
+INTERACTION_TRIGGERS = (
+    "choose items", "recommended", "bring along",
+    "what do you do", "approach", "encounter"
+)
+
+def needs_interaction(view):
+    return any(trigger in view.content_lower for trigger in INTERACTION_TRIGGERS)
+
+def finish_if_over(view):
+    """Cooldown / completion checks shared by every state; True if this message ended the adventure"""
+    # PRIORITY CHECK: Cooldown message detection
+    if is_cooldown_message(view):
+        print(f"🕐 COOLDOWN MESSAGE DETECTED at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
+        ready_at, exact = extract_cooldown_time(view)
+        cooldown_time = max(0, math.ceil(ready_at - time.time()))
+        duration = adventure_session.duration()
+        cooldown_minutes = cooldown_time // 60
+        cooldown_seconds = cooldown_time % 60
+
+        print(f"🏁 Adventure session ended!")
+        print(f"   Duration: {duration}s")
+        print(f"   Cooldown: {cooldown_minutes}m {cooldown_seconds}s")
+
+        send_webhook(f"🏁 Adventure ended in {duration}s | Cooldown: {cooldown_minutes}m {cooldown_seconds}s")
+        cancel_pending_click("cooldown")
+        settle_adventure(view)
+        adventure_session.end(cooldown_time, ready_at if exact else None)
+        return True
+
+    # Check adventure completion
+    if is_truly_complete(view):
+        print(f"🏁 Adventure completed at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
+        duration = adventure_session.duration()
+        ready_at, exact = extract_cooldown_time(view)
+        next_delay = max(0, math.ceil(ready_at - time.time()))
+
+        send_webhook(f"🏁 Adventure completed in {duration}s - Next in {next_delay//60}min")
+        cancel_pending_click("adventure completed")
+        settle_adventure(view)
+        adventure_session.end(next_delay, ready_at if exact else None)
+        return True
+
+    return False
+
+def play_turn(view):
+    """Answer one message of a running adventure: start button, navigation or a choice"""
+    if adventure_session.timed_out():
+        print(f"⏰ Adventure timeout ({ADVENTURE_TIMEOUT}s) - Retrying interaction at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
+        send_webhook(f"⏰ Adventure timeout - Retrying pls adv")
+        cancel_pending_click("adventure timeout")
+        settle_adventure()
+        adventure_session.reset()
+        command_queue.put("pls adv")  # Infinite retry
+        return
+
+    # One click at a time: a message that lands before it finishes is handled after it
+    if pending_click is not None:
+        defer_message(view)
+        return
 
-        # Check start button first
-        if waiting_for_start_button:
-            start_buttons = [btn for btn in buttons if is_start_button(btn) and not btn["disabled"]]
+    # Credit the outcome shown after the last choice to that choice
+    attribute_outcome(view)
 
-            if start_buttons:
-                print("🚀 Found start button!")
-                selected_button = start_buttons[0]
+    buttons = view.buttons
+    message_id = view.message_id
 
-                delay = random.uniform(2.0, 4.0)
-                print(f"⏱️ Waiting {delay:.1f}s before clicking start...")
-                time.sleep(delay)
+    # Check start button first
+    if adventure_session.state is AdventureState.STARTING:
+        start_buttons = [btn for btn in buttons if view.is_start(btn) and not btn.disabled]
 
-                success = click_button(selected_button, message_id)
+        if start_buttons:
+            print("🚀 Found start button!")
+            selected_button = start_buttons[0]
 
+            def started(success):
                 if success:
-                    send_webhook(f"🚀 Started: {selected_button['label']}")
-                    waiting_for_start_button = False
-                    no_start_button_time = None
+                    send_webhook(f"🚀 Started: {selected_button.label}")
+                    adventure_session.start_clicked()
                     print("✅ Adventure started!")
                 else:
                     print("❌ Failed to click start button")
 
-                return
-            else:
-                if needs_start_button(content, embeds):
-                    print("🚀 Needs start button but none found - waiting...")
-                    return
-                else:
-                    waiting_for_start_button = False
-                    no_start_button_time = None
-
-        # Determine if interaction is needed
-        interaction_triggers = [
-            "choose items", "recommended", "bring along",
-            "what do you do", "approach", "encounter"
-        ]
-
-        needs_interaction = any(trigger in content.lower() for trigger in interaction_triggers)
-
-        if needs_interaction and not waiting_for_interaction:
-            waiting_for_interaction = True
-            adventure_start_time = time.time()
-            print("🎮 Adventure interaction started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
-            send_webhook("🎮 Adventure interaction started")
-
-        if not waiting_for_interaction:
-            if needs_navigation_after_choice(content, embeds):
-                navigation_buttons = [btn for btn in buttons if is_navigation_button(btn) and not btn["disabled"]]
-                if navigation_buttons:
-                    print("🧭 Found standalone navigation need")
-                    selected_button = navigation_buttons[0]
-                    delay = random.uniform(3.0, 5.0)
-                    time.sleep(delay)
-                    success = click_button(selected_button, message_id)
-                    if success:
-                        send_webhook(f"🧭 Standalone navigation: {selected_button['label']}")
-                    return
-            print("🔕 Not waiting for interaction")
+            delay = random.uniform(2.0, 4.0)
+            print(f"⏱️ Clicking start in {delay:.1f}s...")
+            schedule_click(delay, selected_button, message_id, started)
             return
-
-        if not buttons:
-            print("⏳ No buttons found, waiting for next message...")
+        elif needs_start_button(view):
+            print("🚀 Needs start button but none found - waiting...")
             return
+        else:
+            adventure_session.start_clicked()
 
-        will_need_navigation = needs_navigation_after_choice(content, embeds)
+    if not buttons:
+        print("⏳ No buttons found, waiting for next message...")
+        return
 
-        choice_buttons = []
-        navigation_buttons = []
-        backpack_buttons = []
+    will_need_navigation = needs_navigation_after_choice(view)
 
-        for btn in buttons:
-            if btn["disabled"]:
-                continue
+    choice_buttons = []
+    navigation_buttons = []
+    backpack_buttons = []
 
-            if is_backpack_button(btn):
-                backpack_buttons.append(btn)
-                print(f"🚫 BACKPACK: '{btn['label']}'")
-            elif is_navigation_button(btn):
-                navigation_buttons.append(btn)
-                print(f"🧭 NAVIGATION: '{btn['label']}'")
-            else:
-                choice_buttons.append(btn)
-                print(f"⚡ CHOICE: '{btn['label']}'")
+    for btn in buttons:
+        if btn.disabled:
+            continue
 
-        if navigation_buttons:
-            selected_button = navigation_buttons[0]
-            print(f"🧭 PRIORITY: Navigation button selected: '{selected_button['label']}'")
-            delay = random.uniform(3.0, 5.0)
-            time.sleep(delay)
-            success = click_button(selected_button, message_id)
+        role = view.role(btn)
+        if role & ButtonRole.BACKPACK:
+            backpack_buttons.append(btn)
+            print(f"🚫 BACKPACK: '{btn.label}'")
+        elif role & ButtonRole.NAVIGATION:
+            navigation_buttons.append(btn)
+            print(f"🧭 NAVIGATION: '{btn.label}'")
+        else:
+            choice_buttons.append(btn)
+            print(f"⚡ CHOICE: '{btn.label}'")
+
+    if navigation_buttons:
+        selected_button = navigation_buttons[0]
+        print(f"🧭 PRIORITY: Navigation button selected: '{selected_button.label}'")
+
+        def navigated(success):
             if success:
-                send_webhook(f"🧭 Navigation: {selected_button['label']}")
-                waiting_for_navigation = will_need_navigation
+                send_webhook(f"🧭 Navigation: {selected_button.label}")
+                adventure_session.expect_navigation(will_need_navigation)
                 if will_need_navigation:
-                    last_choice_time = time.time()
                     print(f"🧭 Entering navigation wait mode for {NAVIGATION_WAIT_TIME}s")
-            return
 
-        if choice_buttons:
-            selected_button = select_best_button(choice_buttons, content, embeds, is_navigation_phase=False)
+        schedule_click(random.uniform(3.0, 5.0), selected_button, message_id, navigated)
+        return
 
-            if selected_button:
-                scenario_key = create_scenario_key(content, embeds)
-                delay = random.uniform(INTERACTION_MIN_DELAY, INTERACTION_MAX_DELAY)
-                print(f"⏱️ Waiting {delay:.1f}s before clicking choice...")
-                time.sleep(delay)
-                success = click_button(selected_button, message_id)
+    if choice_buttons:
+        selected_button = select_best_button(choice_buttons, view, is_navigation_phase=False)
+
+        if selected_button:
+            scenario_key = view.scenario_key
+
+            def chosen(success):
                 if success:
-                    send_webhook(f"🔘 Choice: {selected_button['label']}")
-                    remember_choice(scenario_key, selected_button['label'], True)
+                    send_webhook(f"🔘 Choice: {selected_button.label}")
+                    remember_choice(scenario_key, selected_button.label, True)
+                    track_choice(scenario_key, selected_button.label, view)
                     if will_need_navigation:
-                        waiting_for_navigation = True
-                        last_choice_time = time.time()
+                        adventure_session.expect_navigation(True)
                         print(f"🧭 Entering navigation wait mode for {NAVIGATION_WAIT_TIME}s")
                 else:
                     print("❌ Failed to click choice button")
-                    remember_choice(scenario_key, selected_button['label'], False)
-            else:
-                print("❌ No suitable choice button found")
+                    remember_choice(scenario_key, selected_button.label, False)
+
+            delay = random.uniform(INTERACTION_MIN_DELAY, INTERACTION_MAX_DELAY)
+            print(f"⏱️ Clicking choice in {delay:.1f}s...")
+            schedule_click(delay, selected_button, message_id, chosen)
         else:
-            print("❌ No suitable buttons found (all are backpack or disabled)")
+            print("❌ No suitable choice button found")
+    else:
+        print("❌ No suitable buttons found (all are backpack or disabled)")
 
-        print(f"{'='*60}")
+    print(f"{'='*60}")
 
 def on_open(ws):
+    # IDENTIFY / RESUME is sent once Hello arrives (see GatewaySession.hello)
+    gateway.reset_transport()
     print(f"🌐 WebSocket opened at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
-    identify = {
-        "op": 2,
-        "d": {
-            "token": TOKEN,
-            "intents": 33280,
-            "properties": {
-                "$os": "linux",
-                "$browser": "chrome",
-                "$device": "computer"
-            }
-        }
-    }
-    ws.send(json.dumps(identify))
 
 def on_error(ws, error):
     print(f"❌ WebSocket error at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}: {error}")
 
 def on_close(ws, code, msg):
+    # Reconnecting is GatewayConnection's job, once run_forever returns
     print(f"🔌 WebSocket closed at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}: {code} - {msg}")
-    time.sleep(5)
-    run_websocket()
-
-def run_websocket():
-    global current_ws
-    current_ws = WebSocketApp(
-        "wss://gateway.discord.gg/?v=9&encoding=json",
-        on_open=on_open,
-        on_message=on_message,
-        on_error=on_error,
-        on_close=on_close
-    )
+    gateway.closed(ws)
+
+class GatewayConnection:
+    """Owns the one live gateway socket and the only thread that reconnects it.
+
+    A single loop runs WebSocketApp.run_forever and, when it returns, waits
+    out an exponential backoff with full jitter before connecting again.
+    Every READY or RESUMED resets the backoff, so a resumable session that
+    drops (op 7, zombie close) is retried almost immediately each time.
+    Everything else that wants a reconnect calls restart(), which just
+    closes the current socket and lets the loop take over, so there is never
+    more than one connection feeding on_message.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.ws = None
+        self.thread = None
+        self.watchdog = None
+        self.failures = 0
+        self.counters = {"connects": 0, "restarts": 0}
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.thread = Thread(target=self._run, name="gateway", daemon=True)
+            self.thread.start()
+            if self.watchdog is None or not self.watchdog.is_alive():
+                self.watchdog = Thread(target=monitor_connection, name="gateway-watchdog", daemon=True)
+                self.watchdog.start()
+
+    def _run(self):
+        global current_ws
+        while not stop_event.is_set():
+            ws = WebSocketApp(
+                gateway.url(),
+                on_open=on_open,
+                on_message=on_message,
+                on_error=on_error,
+                on_close=on_close
+            )
+            with self.lock:
+                self.ws = current_ws = ws
+                self.counters["connects"] += 1
+            opened_at = time.monotonic()
+            try:
+                ws.run_forever(ping_interval=20, ping_timeout=10)
+            except Exception as e:
+                print(f"❌ Gateway connection error: {e}")
+            gateway.closed(ws)
+            with self.lock:
+                self.ws = current_ws = None
+
+            if stop_event.is_set():
+                break
+            if time.monotonic() - opened_at > GATEWAY_STABLE_AFTER:
+                self.failures = 0
+            delay = self.backoff()
+            self.failures += 1
+            print(f"🔄 Reconnecting in {delay:.1f}s (attempt {self.failures})")
+            stop_event.wait(delay)
+
+    def established(self):
+        """READY or RESUMED: the connection worked, so the next drop starts the backoff over"""
+        self.failures = 0
+
+    def backoff(self):
+        if self.failures == 0 and gateway.can_resume():
+            return random.uniform(0.0, 0.5)
+        return random.uniform(0.0, min(GATEWAY_BACKOFF_MAX, GATEWAY_BACKOFF_BASE * 2 ** self.failures))
+
+    def restart(self, reason):
+        """Close the current socket (resumably); the connection loop reconnects"""
+        with self.lock:
+            ws = self.ws
+            self.counters["restarts"] += 1
+        print(f"🔍 Restarting gateway connection: {reason}")
+        if ws is not None:
+            drop_connection(ws)
+        else:
+            self.start()
+
+    def stop(self):
+        with self.lock:
+            ws = self.ws
+        if ws is not None:
+            ws.close()
+
+    def is_connected(self):
+        ws = self.ws
+        return bool(ws is not None and ws.sock is not None and ws.sock.connected)
 
-    def run_ws():
-        current_ws.run_forever(ping_interval=20, ping_timeout=10)
+    def stats(self):
+        threads = {}
+        for thread in threading.enumerate():
+            name = re.sub(r"[-_]\d+( \(.*\))?$", "", thread.name)  # "discord-io_1" -> "discord-io"
+            threads[name] = threads.get(name, 0) + 1
+        return dict(self.counters, live_connections=int(self.is_connected()), backoff_failures=self.failures,
+                    threads=threading.active_count(), thread_names=threads)
 
-    Thread(target=run_ws, daemon=True).start()
-    return current_ws
+gateway_connection = GatewayConnection()
 
 # Connection monitoring
 def monitor_connection():
-    global current_ws, last_heartbeat
-    while True:
+    """Watchdog: if heartbeats stopped being ACKed, ask the connection loop to reconnect"""
+    global last_heartbeat
+    while not stop_event.is_set():
         try:
             now = time.time()
-            if current_ws is None or (now - last_heartbeat > 120):  # Reduced to 120 seconds for faster detection
+            if now - last_heartbeat > 120:  # No heartbeat ACK for 120 seconds
                 print(f"🔍 Connection issue detected, restarting at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
-                current_ws = run_websocket()
+                gateway_connection.restart("no heartbeat ACK for 120s")
                 last_heartbeat = now
-            time.sleep(15)  # Reduced to 15 seconds for more frequent checks
+            stop_event.wait(15)  # Reduced to 15 seconds for more frequent checks
         except Exception as e:
             print(f"🔍 Monitor error at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}: {e}")
-            time.sleep(15)
+            stop_event.wait(15)
 
 # Command queue system
 command_queue = queue.Queue()
 stop_event = Event()
+session_ready = Event()  # Set by READY; startup waits on it instead of polling session_id
+last_command_at = 0.0
+lifecycle_stats = {"adventures": 0, "wake_ms_last": None, "wake_ms_max": 0.0}
+
+def wait_for_adventure(max_wait):
+    """Block until the adventure started by the last command ends; False on timeout"""
+    started = time.monotonic()
+    next_report = started + 60
+    with adventure_session.cond:
+        while adventure_session.active and not stop_event.is_set():
+            now = time.monotonic()
+            if now - started >= max_wait:
+                return False
+            adventure_session.cond.wait(timeout=min(next_report, started + max_wait) - now)
+            if adventure_session.active and time.monotonic() >= next_report:
+                print(f"🕐 Adventure running ({adventure_session.state.value})... {int(time.monotonic() - started)}/{max_wait}s")
+                next_report += 60
+    return True
 
 def command_worker():
-    global waiting_for_interaction, waiting_for_navigation, waiting_for_start_button, adventure_start_time
+    global last_command_at
 
     while not stop_event.is_set():
         try:
             command = command_queue.get(timeout=1)
             if command:
                 print(f"🎯 Executing: {command} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
-                if remaining_cooldown <= 0:  # Check cooldown before sending
+                if adventure_session.remaining_cooldown <= 0:  # Check cooldown before sending
+                    spacing = last_command_at + COMMAND_DELAY - time.monotonic()
+                    if spacing > 0:
+                        stop_event.wait(spacing)  # Keep COMMAND_DELAY between commands
                     success = send_message(command)
+                    last_command_at = time.monotonic()
                     if success and command in INTERACTIVE_COMMANDS:
-                        waited = 0
-                        max_wait = ADVENTURE_TIMEOUT
-                        while (waiting_for_interaction or waiting_for_navigation or waiting_for_start_button):
-                            time.sleep(5)
-                            waited += 5
-
-                            if waited % 60 == 0:
-                                status = "interaction" if waiting_for_interaction else ("navigation" if waiting_for_navigation else "start_button")
-                                print(f"🕐 Adventure running ({status})... {waited}/{max_wait}s")
-
-                            if waited >= max_wait:
-                                print(f"⏰ Interaction timeout ({max_wait}s) - Retrying pls adv at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
-                                send_webhook(f"⏰ Interaction timeout - Retrying pls adv")
-                                waiting_for_interaction = False
-                                waiting_for_navigation = False
-                                waiting_for_start_button = False
-                                adventure_start_time = None
-                                command_queue.put("pls adv")  # Infinite retry
-                                break
-
-                        if not (waiting_for_interaction or waiting_for_navigation or waiting_for_start_button):
-                            print(f"✅ Adventure completed in {waited}s at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
+                        started = time.monotonic()
+                        if not wait_for_adventure(ADVENTURE_TIMEOUT) and not stop_event.is_set():
+                            print(f"⏰ Interaction timeout ({ADVENTURE_TIMEOUT}s) - Retrying pls adv at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
+                            send_webhook(f"⏰ Interaction timeout - Retrying pls adv")
+                            adventure_session.reset()
+                            command_queue.put("pls adv")  # Infinite retry
+                        elif not adventure_session.active:
+                            ended = adventure_session.idle_since or time.monotonic()
+                            wake_ms = (time.monotonic() - ended) * 1000
+                            lifecycle_stats["adventures"] += 1
+                            lifecycle_stats["wake_ms_last"] = round(wake_ms, 2)
+                            lifecycle_stats["wake_ms_max"] = round(max(lifecycle_stats["wake_ms_max"], wake_ms), 2)
+                            print(f"✅ Adventure completed in {int(ended - started)}s at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')} (noticed after {wake_ms:.1f}ms)")
                 else:
-                    print(f"⏰ Cooldown active ({remaining_cooldown}s), skipping command")
-                time.sleep(COMMAND_DELAY)
+                    print(f"⏰ Cooldown active ({adventure_session.remaining_cooldown}s), skipping command")
                 command_queue.task_done()
 
         except queue.Empty:
@@ -1426,26 +3246,168 @@ def command_worker():
         except Exception as e:
             print(f"❌ Command worker error at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}: {e}")
 
-def start_adventure_farming():
-    global current_ws, last_heartbeat, remaining_cooldown
+# --- SHUTDOWN ---
+stop_reason = None
 
-    load_choice_memory()
+def request_stop(reason):
+    """Ask every loop to wind down now: the cooldown wait, command_worker, the gateway"""
+    global stop_reason
+    if stop_event.is_set():
+        return
+    stop_reason = reason
+    print(f"🛑 Stop requested ({reason}) at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
+    stop_event.set()
+    with adventure_session.cond:
+        adventure_session.cond.notify_all()
+    with command_queue.all_tasks_done:
+        command_queue.all_tasks_done.notify_all()
+    with session_cond:
+        session_cond.notify_all()
+
+def handle_stop_signal(signum, frame):
+    if stop_event.is_set() and signum == signal.SIGINT:
+        raise KeyboardInterrupt  # Second Ctrl-C: stop right away
+    request_stop(signal.Signals(signum).name)
+
+def install_signal_handlers():
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, handle_stop_signal)
+
+class StopFileWatcher:
+    """Requests a stop the moment STOP_FILE appears.
+
+    On Linux the file's directory is watched with inotify (through libc, no
+    extra package) on a small blocking thread; anywhere else, or if inotify
+    can't be set up, the file is polled every STOP_POLL_INTERVAL on the
+    scheduler.
+    """
+
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.mode = None
+
+    def start(self):
+        if self.mode is not None:
+            return
+        if self._start_inotify():
+            self.mode = "inotify"
+        else:
+            self.mode = "polling"
+            scheduler.call_every(STOP_POLL_INTERVAL, self.check)
+        self.check()  # It may already exist (or have appeared before the watch was set)
 
-    keep_alive()  # Start Flask server to keep Replit awake
+    def check(self):
+        if os.path.exists(self.path):
+            request_stop("stop file")
 
-    current_ws = run_websocket()
+    def _start_inotify(self):
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+            if fd < 0:
+                return False
+            mask = self.IN_CREATE | self.IN_MOVED_TO | self.IN_CLOSE_WRITE
+            if libc.inotify_add_watch(fd, os.path.dirname(self.path).encode(), mask) < 0:
+                os.close(fd)
+                return False
+        except (OSError, AttributeError):
+            return False
+        Thread(target=self._read_events, args=(fd,), name="stop-file-watch", daemon=True).start()
+        return True
 
-    Thread(target=monitor_connection, daemon=True).start()
+    def _read_events(self, fd):
+        name = os.path.basename(self.path).encode()
+        while not stop_event.is_set():
+            try:
+                data = os.read(fd, 4096)
+            except OSError:
+                return
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = struct.unpack_from("iIII", data, offset)
+                event_name = data[offset + 16:offset + 16 + length].rstrip(b"\0")
+                offset += 16 + length
+                if event_name == name:
+                    request_stop("stop file")
+
+stop_file_watcher = StopFileWatcher(STOP_FILE)
+
+def wait_for_commands():
+    """command_queue.join() that also returns as soon as a stop is requested"""
+    with command_queue.all_tasks_done:
+        while command_queue.unfinished_tasks and not stop_event.is_set():
+            command_queue.all_tasks_done.wait()
+
+def wait_for_cooldown(delay):
+    """Sleep until an absolute monotonic deadline `delay` seconds away; True if a stop came first.
+
+    The wait is one Event.wait on stop_event, so a signal or the stop file
+    ends it immediately and the round starts right at the deadline. A
+    COUNTDOWN_TICK scheduler entry only keeps the remaining cooldown and the
+    progress logs up to date.
+    """
+    deadline = time.monotonic() + delay
+
+    def tick():
+        remaining = max(0, math.ceil(deadline - time.monotonic()))
+        adventure_session.count_down(remaining)  # Update remaining cooldown in real-time
+        if remaining <= 0:
+            return
 
-    wait_count = 0
-    while not session_id and wait_count < 60:
-        print(f"⌛ Waiting for session_id at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}...")
-        time.sleep(1)
-        wait_count += 1
+        remaining_minutes = remaining // 60
+        remaining_seconds = remaining % 60
+        if remaining_minutes > 0:
+            print(f"⏰ {remaining_minutes}m {remaining_seconds}s remaining...")
+            if remaining_minutes % 2 == 0:
+                send_webhook(f"⏰ {remaining_minutes}m remaining until next adventure")
+        else:
+            print(f"⏰ {remaining_seconds}s remaining...")
+
+    ticker = scheduler.call_every(COUNTDOWN_TICK, tick)
+    try:
+        while not stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            stop_event.wait(timeout=remaining)
+    finally:
+        ticker.cancel()
+    return stop_event.is_set()
+
+def shut_down():
+    print(f"🛑 Bot stopping ({stop_reason}) at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
+    send_webhook(f"🛑 Bot stopped ({stop_reason})")
+    gateway_connection.stop()
+    close_choice_memory()
+    webhook_dispatcher.drain()
+
+def start_adventure_farming():
+    global last_heartbeat
 
-    if not session_id:
+    load_choice_memory()
+
+    keep_alive()  # Start Flask server to keep Replit awake (no-op if already running)
+
+    stop_file_watcher.start()
+    gateway_connection.start()
+
+    print(f"⌛ Waiting for session_id at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}...")
+    while True:
+        with session_cond:
+            session_cond.wait_for(lambda: stop_event.is_set() or session_ready.is_set(), timeout=60)
+        if stop_event.is_set():
+            shut_down()
+            return
+        if session_ready.is_set():
+            break
         print("❌ No session_id, restarting...")
-        return start_adventure_farming()
+        gateway_connection.restart("no session_id after 60s")
 
     Thread(target=command_worker, daemon=True).start()
 
@@ -1453,63 +3415,46 @@ def start_adventure_farming():
     count = 0
 
     while True:
-        if os.path.exists(STOP_FILE):
-            print("🛑 Stop file detected at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
-            send_webhook("🛑 Bot stopped")
-            stop_event.set()
+        if stop_event.is_set():
+            shut_down()
             break
 
         count += 1
         print(f"\n🚀 Adventure Round #{count} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
         send_webhook(f"🚀 Round #{count} starting at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
 
+        remaining_cooldown = adventure_session.remaining_cooldown
         if remaining_cooldown > 0:
             print(f"⏳ Resuming cooldown: {remaining_cooldown} seconds remaining...")
             send_webhook(f"⏳ Resuming cooldown: {remaining_cooldown // 60}m {(remaining_cooldown % 60)}s remaining")
         else:
             command_queue.put("pls adv")
-            command_queue.join()
+            wait_for_commands()
+            if stop_event.is_set():
+                continue
 
-        current_delay = max(remaining_cooldown, dynamic_round_delay + 120)
+        if adventure_session.cooldown_ready_at:
+            current_delay = max(0, math.ceil(adventure_session.cooldown_ready_at - time.time()))  # Parsed cooldown: no extra padding
+        else:
+            current_delay = max(adventure_session.remaining_cooldown, adventure_session.round_delay + 120)
         delay_minutes = current_delay // 60
         delay_seconds = current_delay % 60
 
-        if remaining_cooldown <= 0:
+        if adventure_session.remaining_cooldown <= 0:
             print(f"⏳ Waiting {delay_minutes}m {delay_seconds}s for next round...")
             send_webhook(f"⏳ Next round in {delay_minutes}m {delay_seconds}s")
-        remaining_cooldown = current_delay  # Reset remaining cooldown to full delay
+        adventure_session.count_down(current_delay)  # Reset remaining cooldown to full delay
 
-        remaining = remaining_cooldown
-        last_update = time.time()
-
-        while remaining > 0:
-            time.sleep(10)
-            remaining -= 10
-            remaining_cooldown = remaining  # Update remaining cooldown in real-time
-
-            if remaining > 0 and int(time.time() - last_update) >= 60:
-                remaining_minutes = remaining // 60
-                remaining_seconds = remaining % 60
-
-                if remaining_minutes > 0:
-                    print(f"⏰ {remaining_minutes}m {remaining_seconds}s remaining...")
-                    if remaining_minutes % 2 == 0:
-                        send_webhook(f"⏰ {remaining_minutes}m remaining until next adventure")
-                else:
-                    print(f"⏰ {remaining_seconds}s remaining...")
-
-                last_update = time.time()
-
-            if os.path.exists(STOP_FILE):
-                print("🛑 Stop file detected during wait")
-                return
+        if current_delay > 0 and wait_for_cooldown(current_delay):
+            continue
 
-        remaining_cooldown = 0  # Reset remaining cooldown after wait
+        adventure_session.cooldown_over()  # Reset remaining cooldown after wait
         save_choice_memory()
 
 def main():
     restart_count = 0
     max_restarts = 15
+    install_signal_handlers()
 
     while restart_count < max_restarts:
         try:
@@ -1530,10 +3475,13 @@ def main():
             send_webhook(f"✅ Enhanced Bot started (Attempt #{restart_count + 1}) with choice memory and keep-alive at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
 
             start_adventure_farming()
+            if stop_event.is_set():
+                break
 
         except KeyboardInterrupt:
             print("🛑 Stopped by user at {datetime.now().strftime('%Y-%m-%d %H:%M:%S CET')}")
-            save_choice_memory()
+            close_choice_memory()
+            webhook_dispatcher.drain()
             sys.exit(0)
         except Exception as e:
             restart_count += 1
@@ -1547,7 +3495,9 @@ def main():
 
             wait_time = min(60 * restart_count, 300)
             print(f"🔄 Restarting in {wait_time}s...")
-            time.sleep(wait_time)
+            if stop_event.wait(wait_time):
+                shut_down()
+                break
 
 if __name__ == "__main__":
     main()